@@ -9,17 +9,24 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from chat.routing import websocket_urlpatterns
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ani_Tinder.settings')
+
+# Initialise Django before importing consumers so models are ready in every worker process
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from core.presence import PresenceListenerMiddleware
+from core.ws_auth import TokenAuthMiddlewareStack
+from chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns
+from notifications.routing import websocket_urlpatterns as notification_websocket_urlpatterns
 
 application = ProtocolTypeRouter({
-    'http': get_asgi_application(),
-    'websocket': AuthMiddlewareStack(
+    # REST views report presence too, so HTTP-only workers need a listener as well
+    'http': PresenceListenerMiddleware(django_asgi_app),
+    'websocket': TokenAuthMiddlewareStack(
         URLRouter(
-            websocket_urlpatterns
+            chat_websocket_urlpatterns + notification_websocket_urlpatterns
         )
     ),
 })
\ No newline at end of file
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +52,8 @@ INSTALLED_APPS = [
     'chat.apps.ChatConfig',
     'friends.apps.FriendsConfig',
     'follow.apps.FollowConfig',
+    'notifications.apps.NotificationsConfig',
+    'blocks.apps.BlocksConfig',
     'core.apps.CoreConfig'
 ]
 
@@ -81,6 +84,78 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Multi-worker mode: point every ASGI worker and `manage.py run_channel_broker` at the
+# same Unix socket so chat groups span all worker processes on this host.
+CHANNEL_BROKER_SOCKET = os.environ.get('CHANNEL_BROKER_SOCKET')
+if CHANNEL_BROKER_SOCKET:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'core.channel_layers.BrokerChannelLayer',
+            'CONFIG': {
+                'path': CHANNEL_BROKER_SOCKET,
+            },
+        },
+    }
+
+# Blocklists, seen bitmaps and taste scores are cached and invalidated when they
+# change, so every worker process must read the same cache: a per-process LocMem
+# cache would keep serving stale entries in the workers that did not handle the
+# write. The file cache is shared by all workers on this host; with workers on
+# several hosts, use Redis:
+# 'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+# 'LOCATION': 'redis://127.0.0.1:6379',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ani_tinder_cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+# Chat message persistence.
+# 'sync' saves each message before broadcasting it. 'buffered' broadcasts first and
+# writes in batches, so a crash can lose up to CHAT_FLUSH_INTERVAL seconds of messages.
+CHAT_MESSAGE_DURABILITY = 'buffered'
+CHAT_FLUSH_BATCH_SIZE = 100
+CHAT_FLUSH_INTERVAL = 0.05
+
+# Messages older than this are moved into compressed per-chat segment files
+# by `manage.py archive_chat_messages`.
+CHAT_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'chat_archive')
+CHAT_ARCHIVE_AFTER_DAYS = 90
+
+# Websocket limits for the chat consumers. Rates are (frames per second, burst),
+# per connection and per user across their sockets in one worker.
+CHAT_MAX_FRAME_BYTES = 16 * 1024
+CHAT_CONNECTION_RATE = (10, 20)
+CHAT_USER_RATE = (20, 40)
+# Frames waiting to be written to one client; when full, 'drop' discards new frames
+# and 'close' disconnects the client
+CHAT_OUTBOUND_QUEUE_SIZE = 256
+CHAT_SLOW_CONSUMER_POLICY = 'drop'
+
+# Binary (msgpack subprotocol) clients get events coalesced into one frame for up
+# to this many seconds or events. A window of 0 sends every event immediately.
+CHAT_BATCH_WINDOW = 0.01
+CHAT_BATCH_MAX_EVENTS = 64
+
+# Most messages replayed to a socket reconnecting with resume_from; past this the
+# client is told the replay is incomplete and should refetch the history instead
+CHAT_RESUME_LIMIT = 1000
+
+# Message seqs are reserved this many at a time per chat and handed out in memory,
+# so sending a message never waits on a database write. Unused reservations leave
+# gaps, and with several workers writing to one chat seqs can arrive out of order.
+# A block is abandoned CHAT_SEQ_BLOCK_TTL seconds after it was reserved, which bounds
+# how late a lower seq can still show up (see chat.persistence.seq_settle_delay).
+CHAT_SEQ_BLOCK_SIZE = 32
+CHAT_SEQ_BLOCK_TTL = 2
+
+# Largest group chat, creator included
+CHAT_GROUP_MAX_MEMBERS = 300
+
 
 TEMPLATES = [
     {
@@ -110,6 +185,20 @@ DATABASES = {
     }
 }
 
+# Deleted accounts are purged by purge_deleted_accounts, at most this many rows
+# per transaction so no single delete holds the write lock for long
+ACCOUNT_PURGE_BATCH_SIZE = 500
+
+# Anime adds are counted in memory and written to the trending counters once this
+# many are pending or this many seconds have passed; a crash loses at most those.
+# With TRENDING_BUFFER_ADDS off each add is written as it commits (the test runner
+# turns it off, so no flush outlives the test database).
+TRENDING_BUFFER_ADDS = True
+TRENDING_FLUSH_BATCH_SIZE = 200
+TRENDING_FLUSH_INTERVAL = 5
+
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
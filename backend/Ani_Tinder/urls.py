@@ -27,6 +27,8 @@ urlpatterns = [
     path('api/chat/', include('chat.urls')),
     path('api/friends/', include('friends.urls')),
     path('api/follow/', include('follow.urls')),
+    path('api/notifications/', include('notifications.urls')),
+    path('api/blocks/', include('blocks.urls')),
 ]
 
 # Serve media files in development
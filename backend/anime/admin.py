@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Genre, Anime, AnimeQuotes, AnimeListGenres
+from .models import Genre, Anime, AnimeQuotes, AnimeListGenres, GenrePopularity, TrendingAnime
 
 
 @admin.register(Genre)
@@ -27,4 +27,16 @@ class AnimeAdmin(admin.ModelAdmin):
 class AnimeQuotesAdmin(admin.ModelAdmin):
     list_display = ['anime', 'character', 'quote']
     search_fields = ['anime', 'character', 'quote']
-    list_filter = ['anime', 'character']
\ No newline at end of file
+    list_filter = ['anime', 'character']
+
+@admin.register(TrendingAnime)
+class TrendingAnimeAdmin(admin.ModelAdmin):
+    list_display = ['window', 'rank', 'mal_id', 'adds', 'computed_at']
+    list_filter = ['window']
+
+
+@admin.register(GenrePopularity)
+class GenrePopularityAdmin(admin.ModelAdmin):
+    list_display = ['genre', 'anime', 'watch_count']
+    list_filter = ['genre']
+    raw_id_fields = ['anime']
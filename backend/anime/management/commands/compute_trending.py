@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from anime.trending import compute_trending
+
+
+class Command(BaseCommand):
+    help = "Roll up the anime add counters and recompute the trending rankings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Keep running, recomputing this often')
+
+    def handle(self, *args, **options):
+        while True:
+            rankings = compute_trending()
+            self.stdout.write(self.style.SUCCESS(
+                ', '.join(f"{window}: {len(rows)} titles" for window, rows in rankings.items())
+            ))
+            if options['watch'] is None:
+                return
+            time.sleep(options['watch'])
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from anime.popularity import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recount the per-genre watch counts from the anime lists and repair any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Keep running, reconciling this often')
+
+    def handle(self, *args, **options):
+        while True:
+            created, updated, deleted = reconcile()
+            self.stdout.write(self.style.SUCCESS(
+                f"Genre popularity: {created} created, {updated} corrected, {deleted} removed"
+            ))
+            if options['watch'] is None:
+                return
+            time.sleep(options['watch'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='anime',
+            name='mal_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
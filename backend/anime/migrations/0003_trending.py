@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0002_anime_mal_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimeAddCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mal_id', models.IntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('hours', models.PositiveSmallIntegerField(default=1)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hours', 'bucket'], name='anime_add_count_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('mal_id', 'bucket', 'hours'), name='anime_add_count_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingAnime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=8)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('mal_id', models.IntegerField()),
+                ('adds', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['window', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('window', 'rank'), name='trending_anime_rank_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0003_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenrePopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watch_count', models.PositiveIntegerField(default=0)),
+                ('anime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genre_popularity', to='anime.anime')),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='anime.animelistgenres')),
+            ],
+            options={
+                'verbose_name_plural': 'Genre popularity',
+                'indexes': [models.Index(fields=['genre', '-watch_count', 'anime'], name='genre_popularity_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('genre', 'anime'), name='genre_popularity_unique')],
+            },
+        ),
+    ]
@@ -34,7 +34,7 @@ class Anime(models.Model):
     image_url = models.URLField(blank=True, null=True)
     synopsis = models.TextField(blank=True, null=True)
     trailer_url = models.URLField(blank=True, null=True)
-    mal_id = models.IntegerField(blank=True, null=True)
+    mal_id = models.IntegerField(blank=True, null=True, db_index=True)
 
     def __str__(self):
         return self.title
@@ -56,4 +56,65 @@ class AnimeQuotes(models.Model):
 
     class Meta:
         verbose_name = "Anime Quote"
-        verbose_name_plural = "Anime Quotes"
\ No newline at end of file
+        verbose_name_plural = "Anime Quotes"
+
+class AnimeAddCount(models.Model):
+    """
+    How many times a title was added to anime lists in one time bucket.
+    Buckets start hourly and are rolled up into daily ones as they age (see anime.trending).
+    """
+    mal_id = models.IntegerField()
+    bucket = models.DateTimeField()
+    hours = models.PositiveSmallIntegerField(default=1)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.mal_id} @ {self.bucket:%Y-%m-%d %H:00} +{self.hours}h: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mal_id', 'bucket', 'hours'], name='anime_add_count_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['hours', 'bucket'], name='anime_add_count_bucket_idx'),
+        ]
+
+
+class TrendingAnime(models.Model):
+    """One precomputed row of a trending ranking; rewritten whole by compute_trending"""
+    window = models.CharField(max_length=8)
+    rank = models.PositiveSmallIntegerField()
+    mal_id = models.IntegerField()
+    adds = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.window} #{self.rank}: {self.mal_id} ({self.adds} adds)"
+
+    class Meta:
+        ordering = ['window', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'rank'], name='trending_anime_rank_unique'),
+        ]
+
+
+class GenrePopularity(models.Model):
+    """
+    How many users marked a title watched, per genre of the title.
+    Kept up to date as entries change (see anime.popularity) so top-N per genre is an index scan.
+    """
+    genre = models.ForeignKey(AnimeListGenres, on_delete=models.CASCADE, related_name='popularity')
+    anime = models.ForeignKey(Anime, on_delete=models.CASCADE, related_name='genre_popularity')
+    watch_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.genre}: {self.anime} ({self.watch_count} watched)"
+
+    class Meta:
+        verbose_name_plural = "Genre popularity"
+        constraints = [
+            models.UniqueConstraint(fields=['genre', 'anime'], name='genre_popularity_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['genre', '-watch_count', 'anime'], name='genre_popularity_rank_idx'),
+        ]
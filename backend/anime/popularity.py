@@ -0,0 +1,81 @@
+"""
+Most-watched anime per genre, from a maintained count table.
+
+Counting watched list entries per title and joining them to every title's
+genres is a three-way aggregate too heavy for a request, so GenrePopularity
+keeps one (genre, anime, watch_count) row per genre of each watched title.
+Rows move by one as entries are created or deleted watched (see users.signals)
+and as `watched` flips in UserAnimeUpdateView, inside the same transaction, and
+top_watched() reads them in index order. Genre or mal_id edits on Anime are not
+tracked incrementally; `manage.py reconcile_genre_popularity`, run on a
+schedule, recounts from the list table and repairs any drift.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from users.models import UserAnimeList
+
+from .models import Anime, GenrePopularity
+
+AnimeGenre = Anime.genres.through
+
+
+def adjust_watch_count(mal_id, delta):
+    """Add delta to the watch count of every title with this mal_id, in each of its genres"""
+    if mal_id is None or not delta:
+        return
+    with transaction.atomic():
+        if delta > 0:
+            pairs = AnimeGenre.objects.filter(anime__mal_id=mal_id).values_list('animelistgenres_id', 'anime_id')
+            GenrePopularity.objects.bulk_create(
+                [GenrePopularity(genre_id=genre_id, anime_id=anime_id) for genre_id, anime_id in pairs],
+                ignore_conflicts=True,
+            )
+            rows = GenrePopularity.objects.filter(anime__mal_id=mal_id)
+        else:
+            # Never below zero, even if the table drifted before the next reconciliation
+            rows = GenrePopularity.objects.filter(anime__mal_id=mal_id, watch_count__gte=-delta)
+        rows.update(watch_count=F('watch_count') + delta)
+
+
+def top_watched(genre, limit):
+    """The genre's most watched titles, as GenrePopularity rows with their anime loaded"""
+    return (
+        GenrePopularity.objects.filter(genre=genre, watch_count__gt=0)
+        .order_by('-watch_count', 'anime_id')
+        .select_related('anime').prefetch_related('anime__genres')[:limit]
+    )
+
+
+def reconcile():
+    """Recount every row from the list table; returns (created, updated, deleted)"""
+    with transaction.atomic():
+        watches = dict(
+            UserAnimeList.objects.filter(watched=True, mal_id__isnull=False)
+            .values('mal_id').annotate(watches=Count('id')).values_list('mal_id', 'watches')
+        )
+        expected = {}
+        pairs = AnimeGenre.objects.filter(anime__mal_id__isnull=False).values_list(
+            'animelistgenres_id', 'anime_id', 'anime__mal_id'
+        )
+        for genre_id, anime_id, mal_id in pairs.iterator():
+            if mal_id in watches:
+                expected[(genre_id, anime_id)] = watches[mal_id]
+
+        stale, changed = [], []
+        for row in GenrePopularity.objects.iterator():
+            count = expected.pop((row.genre_id, row.anime_id), 0)
+            if not count:
+                stale.append(row.pk)
+            elif row.watch_count != count:
+                row.watch_count = count
+                changed.append(row)
+        GenrePopularity.objects.bulk_create(
+            [GenrePopularity(genre_id=genre_id, anime_id=anime_id, watch_count=count)
+             for (genre_id, anime_id), count in expected.items()],
+            batch_size=500,
+        )
+        GenrePopularity.objects.bulk_update(changed, ['watch_count'], batch_size=500)
+        for start in range(0, len(stale), 500):
+            GenrePopularity.objects.filter(pk__in=stale[start:start + 500]).delete()
+    return len(expected), len(changed), len(stale)
@@ -1,3 +1,34 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from users.models import UserAnimeList
+
+from .models import AnimeAddCount
+from .trending import add_buffer, compute_trending, reset_add_buffer
+
+
+class TrendingAddTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+
+    def add(self, *mal_ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            for mal_id in mal_ids:
+                UserAnimeList.objects.create(author=self.user, title=f'Anime {mal_id}', mal_id=mal_id)
+
+    def test_adds_are_written_as_they_commit_under_tests(self):
+        self.add(1, 1)
+
+        self.assertEqual(AnimeAddCount.objects.get(mal_id=1).count, 2)
+
+    @override_settings(TRENDING_BUFFER_ADDS=True)
+    def test_buffered_adds_reach_the_ranking(self):
+        self.addCleanup(reset_add_buffer)
+        self.add(1, 1, 2)
+        self.assertFalse(AnimeAddCount.objects.exists())
+        self.assertEqual(add_buffer().pending_adds, 3)
+
+        rankings = compute_trending()
+
+        self.assertEqual([(row.mal_id, row.adds) for row in rankings['24h']], [(1, 2), (2, 1)])
+        self.assertEqual(add_buffer().pending_adds, 0)
@@ -0,0 +1,189 @@
+"""
+Trending titles from time-bucketed add counters.
+
+Each new UserAnimeList entry counts one add for its mal_id in the current hour.
+Adds are buffered per process and written as increments on AnimeAddCount once
+TRENDING_FLUSH_BATCH_SIZE are pending or TRENDING_FLUSH_INTERVAL seconds have
+passed, so a burst of swipes costs one small transaction instead of a write
+each. A process that dies without flushing loses at most that many adds, which
+only nudges a ranking. With TRENDING_BUFFER_ADDS off (as under tests) each add is
+written straight away and nothing is left to flush at exit.
+
+compute_trending() (``manage.py compute_trending``, on a schedule) rolls hourly
+buckets older than HOURLY_RETENTION into daily ones, drops buckets older than
+the longest window and rewrites each window's TrendingAnime rows, so the
+endpoint only ever reads TRENDING_SIZE precomputed rows. Windows are counted in
+whole buckets: the last 24 hourly ones for 24h, and whole days at the far end
+of 7d.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from .models import AnimeAddCount, TrendingAnime
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+}
+HOUR = timedelta(hours=1)
+HOURLY_RETENTION = timedelta(hours=48)
+TRENDING_SIZE = 50
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def write_counts(counts):
+    """Add {(mal_id, hour): adds} onto the hourly counters"""
+    with transaction.atomic():
+        AnimeAddCount.objects.bulk_create(
+            [AnimeAddCount(mal_id=mal_id, bucket=hour, hours=1) for mal_id, hour in counts],
+            ignore_conflicts=True,
+        )
+        for (mal_id, hour), adds in counts.items():
+            AnimeAddCount.objects.filter(mal_id=mal_id, bucket=hour, hours=1).update(count=F('count') + adds)
+
+
+class AddCounterBuffer:
+    """Per-process buffer of adds, flushed by size, by a timer, or at exit"""
+
+    def __init__(self, batch_size, interval):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = Counter()
+        self.pending_adds = 0
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, mal_id, when=None):
+        with self.lock:
+            self.pending[(mal_id, hour_of(when or timezone.now()))] += 1
+            self.pending_adds += 1
+            full = self.pending_adds >= self.batch_size
+            if not full and self.timer is None:
+                self.timer = threading.Timer(self.interval, self._flush_later)
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.flush()
+
+    def _flush_later(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread opened its own connection
+            connection.close()
+
+    def flush(self):
+        with self.lock:
+            batch = self.discard()
+        if not batch:
+            return
+        try:
+            write_counts(batch)
+        except Exception:
+            # Merge the batch back so the next flush retries it
+            logger.exception("Failed to write %d trending counters", len(batch))
+            with self.lock:
+                self.pending.update(batch)
+                self.pending_adds += sum(batch.values())
+
+    def discard(self):
+        """Cancel the timer and take the pending adds out unwritten; call with the lock held"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, Counter()
+        self.pending_adds = 0
+        return batch
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def add_buffer():
+    """The process's add buffer, flushed at exit if adds are being buffered"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = AddCounterBuffer(settings.TRENDING_FLUSH_BATCH_SIZE, settings.TRENDING_FLUSH_INTERVAL)
+            if settings.TRENDING_BUFFER_ADDS:
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def reset_add_buffer():
+    """Drop the process's buffer with its timer and exit hook, unwritten; for test teardown"""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        atexit.unregister(buffer.flush)
+        with buffer.lock:
+            buffer.discard()
+
+
+def record_add(mal_id):
+    """Count one add of a title towards the current hour"""
+    if settings.TRENDING_BUFFER_ADDS:
+        add_buffer().add(mal_id)
+    else:
+        write_counts(Counter({(mal_id, hour_of(timezone.now())): 1}))
+
+
+def roll_up(now):
+    """Fold hourly buckets older than HOURLY_RETENTION into daily ones and drop expired buckets"""
+    day_cutoff = (now - HOURLY_RETENTION).replace(hour=0, minute=0, second=0, microsecond=0)
+    with transaction.atomic():
+        old = AnimeAddCount.objects.filter(hours=1, bucket__lt=day_cutoff)
+        days = list(
+            old.annotate(day=TruncDay('bucket')).values('mal_id', 'day').annotate(adds=Sum('count'))
+            .values_list('mal_id', 'day', 'adds')
+        )
+        if days:
+            write_days = {(mal_id, day): adds for mal_id, day, adds in days}
+            AnimeAddCount.objects.bulk_create(
+                [AnimeAddCount(mal_id=mal_id, bucket=day, hours=24) for mal_id, day in write_days],
+                ignore_conflicts=True,
+            )
+            for (mal_id, day), adds in write_days.items():
+                AnimeAddCount.objects.filter(mal_id=mal_id, bucket=day, hours=24).update(count=F('count') + adds)
+            old.delete()
+        expired = now - max(WINDOWS.values()) - timedelta(days=1)
+        AnimeAddCount.objects.filter(bucket__lt=expired).delete()
+
+
+def compute_trending(now=None):
+    """Roll the counters forward and rewrite every window's ranking; returns {window: rows}"""
+    now = now or timezone.now()
+    add_buffer().flush()
+    roll_up(now)
+    rankings = {}
+    for window, span in WINDOWS.items():
+        since = hour_of(now) - span + HOUR
+        top = (
+            AnimeAddCount.objects.filter(bucket__gte=since).values('mal_id').annotate(adds=Sum('count'))
+            .filter(adds__gt=0).order_by('-adds', 'mal_id').values_list('mal_id', 'adds')[:TRENDING_SIZE]
+        )
+        rows = [
+            TrendingAnime(window=window, rank=rank, mal_id=mal_id, adds=adds, computed_at=now)
+            for rank, (mal_id, adds) in enumerate(top, start=1)
+        ]
+        with transaction.atomic():
+            TrendingAnime.objects.filter(window=window).delete()
+            TrendingAnime.objects.bulk_create(rows)
+        rankings[window] = rows
+    return rankings
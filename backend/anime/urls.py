@@ -9,5 +9,8 @@ urlpatterns = [
     path('data/json/', views.read_json_file_view, name='read_json'),
     path('quotes/', views.AnimeQuotesView.as_view(), name='quotes'),
     path('all/', views.AnimeAllView.as_view(), name='all'),
+    path('deck/', views.AnimeDeckView.as_view(), name='deck'),
+    path('trending/', views.AnimeTrendingView.as_view(), name='trending'),
+    path('popular/', views.GenrePopularView.as_view(), name='genre_popular'),
     path('import/', views.import_anime_data, name='import_anime'),
 ]
\ No newline at end of file
@@ -1,11 +1,16 @@
 
 from django.db.models.functions import Lower, Substr
-from rest_framework import generics
+from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from core.permissions import IsOwnerOrReadOnly
+from users.seen import unseen_sample
 
-from .models import Genre, Anime, AnimeQuotes
+from .models import Genre, Anime, AnimeQuotes, AnimeListGenres, TrendingAnime
+from .popularity import top_watched
 from .serializers import GenreSerializer, AnimeSerializer, QuoteSerializer
+from .trending import WINDOWS
 
 import json
 import os
@@ -121,4 +126,74 @@ class AnimeAllView(generics.ListAPIView):
     def get_queryset(self):
         return Anime.objects.annotate(
             first_letter=Lower(Substr('title', 1, 1))
-        ).order_by('first_letter')
\ No newline at end of file
+        ).order_by('first_letter')
+
+
+class AnimeDeckView(APIView):
+    """Random anime the current user has neither listed nor skipped, for the swipe deck"""
+    permission_classes = [IsAuthenticated]
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), self.max_limit))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        mal_ids = unseen_sample(request.user.id, limit)
+        anime = {item.mal_id: item for item in Anime.objects.filter(mal_id__in=mal_ids).prefetch_related('genres')}
+        serializer = AnimeSerializer([anime[mal_id] for mal_id in mal_ids if mal_id in anime], many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+
+class AnimeTrendingView(APIView):
+    """Most-added anime over the last 24h or 7d, from the precomputed rankings"""
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        window = request.query_params.get('window', '24h')
+        if window not in WINDOWS:
+            return Response(
+                {'error': f"window must be one of {', '.join(WINDOWS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ranking = list(TrendingAnime.objects.filter(window=window))
+        anime = {
+            item.mal_id: item
+            for item in Anime.objects.filter(mal_id__in=[row.mal_id for row in ranking]).prefetch_related('genres')
+        }
+        results = [
+            {'rank': row.rank, 'adds': row.adds, 'anime': AnimeSerializer(anime[row.mal_id]).data}
+            for row in ranking if row.mal_id in anime
+        ]
+        return Response({
+            'window': window,
+            'computed_at': ranking[0].computed_at if ranking else None,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
+class GenrePopularView(APIView):
+    """Most watched anime in one genre, e.g. ?genre=Action&limit=20"""
+    permission_classes = [AllowAny]
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        name = request.query_params.get('genre')
+        if not name:
+            return Response({'error': 'genre is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), self.max_limit))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        genre = AnimeListGenres.objects.filter(name__iexact=name).first()
+        if genre is None:
+            return Response({'error': 'Genre not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        results = [
+            {'rank': rank, 'watch_count': row.watch_count, 'anime': AnimeSerializer(row.anime).data}
+            for rank, row in enumerate(top_watched(genre, limit), start=1)
+        ]
+        return Response({'genre': genre.name, 'results': results}, status=status.HTTP_200_OK)
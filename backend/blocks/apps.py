@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class BlocksConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'blocks'
+
+    def ready(self):
+        import blocks.signals  # Import signals when app is ready
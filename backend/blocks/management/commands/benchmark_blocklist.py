@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import setup_databases, teardown_databases
+
+from blocks.blocklist import invalidate_blocklists, request_blocklist
+from blocks.models import Block
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request cost of blocklist checks and fail if it exceeds the budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='0,10,100,1000,5000', help='Blocklist sizes to measure')
+        parser.add_argument('--requests', type=int, default=2000, help='Simulated requests per size')
+        parser.add_argument('--checks', type=int, default=50, help='Membership checks per request, e.g. a page of users')
+        parser.add_argument('--budget-ms', type=float, default=1.0, help='Allowed p99 added latency per request')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            others = self.create_users(max(sizes))
+            factory = RequestFactory()
+            over_budget = []
+            for size in sizes:
+                user = User.objects.create_user(f'bench_blocker_{size}')
+                # Half blocked by the user, half blocking them: both directions count
+                Block.objects.bulk_create(
+                    [Block(blocker=user, blocked_id=other) for other in others[:size // 2]]
+                    + [Block(blocker_id=other, blocked=user) for other in others[size // 2:size]]
+                )
+                invalidate_blocklists(user.id)
+                candidates = others[:options['checks']]
+
+                def serve():
+                    request = factory.get('/')
+                    request.user = user
+                    started = time.perf_counter()
+                    blocked = request_blocklist(request)
+                    visible = [other for other in candidates if other not in blocked]
+                    request_blocklist(request)
+                    return time.perf_counter() - started, visible
+
+                cold = []
+                for _ in range(20):
+                    invalidate_blocklists(user.id)
+                    cold.append(serve()[0])
+                warm = sorted(serve()[0] for _ in range(options['requests']))
+                p99 = warm[int(len(warm) * 0.99) - 1]
+                if p99 * 1000 > options['budget_ms']:
+                    over_budget.append(size)
+                self.stdout.write(
+                    f"{size:6d} blocked: warm p50 {statistics.median(warm) * 1e6:7.1f}us  "
+                    f"p99 {p99 * 1e6:7.1f}us | cold (cache miss) p50 {statistics.median(cold) * 1e6:7.1f}us"
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        if over_budget:
+            raise CommandError(
+                f"p99 over {options['budget_ms']}ms for blocklists of {', '.join(map(str, over_budget))}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"All sizes within {options['budget_ms']}ms per request"))
+
+    def create_users(self, count):
+        User.objects.bulk_create([User(username=f'bench_blocked_{i}') for i in range(count)], batch_size=1000)
+        return list(User.objects.filter(username__startswith='bench_blocked_').values_list('id', flat=True))
@@ -0,0 +1,67 @@
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.db.models import Q
+
+from follow.models import Follow
+from friends.models import FriendList, FriendRequest
+
+
+class BlockManager(models.Manager):
+    """Blocking and unblocking, keeping the rest of the social graph consistent"""
+
+    def block(self, blocker, blocked):
+        """
+        Block a user and cut every tie between the two: friendship, pending
+        friend requests and follows in both directions. Returns False if the
+        block already existed.
+        """
+        with transaction.atomic():
+            _, created = self.get_or_create(blocker=blocker, blocked=blocked)
+            if not created:
+                return False
+            blocker_friends = FriendList.objects.get(user=blocker)
+            if blocker_friends.is_mutual_friend(blocked):
+                blocker_friends.unfriend(blocked)
+            FriendRequest.objects.filter(
+                Q(sender=blocker, receiver=blocked) | Q(sender=blocked, receiver=blocker), is_active=True
+            ).update(is_active=False)
+            Follow.objects.get_or_create(user=blocker)[0].remove_following(blocked)
+            Follow.objects.get_or_create(user=blocked)[0].remove_following(blocker)
+        return True
+
+    def unblock(self, blocker, blocked):
+        """Lift a block; returns False if there was none"""
+        deleted, _ = self.filter(blocker=blocker, blocked=blocked).delete()
+        return bool(deleted)
+
+    def exists_between(self, user_ids, joining_ids):
+        """True if a user joining (joining_ids) and a user in user_ids blocked each other, either way"""
+        return self.filter(
+            Q(blocker_id__in=joining_ids, blocked_id__in=user_ids) | Q(blocker_id__in=user_ids, blocked_id__in=joining_ids)
+        ).exists()
+
+
+class Block(models.Model):
+    """
+    A single blocker -> blocked relation. A block in either direction hides the
+    two users from each other; see blocks.blocklist for how checks are served.
+    Indexed in both directions so a user's blocklist is two range scans.
+    """
+    blocker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocking_edges')
+    blocked = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocked_by_edges')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlockManager()
+
+    def __str__(self):
+        return f"{self.blocker_id} blocks {self.blocked_id}"
+
+    class Meta:
+        verbose_name = "Block"
+        verbose_name_plural = "Blocks"
+        constraints = [
+            models.UniqueConstraint(fields=['blocker', 'blocked'], name='block_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['blocked', 'blocker'], name='block_blocked_idx'),
+        ]
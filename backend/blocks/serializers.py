@@ -0,0 +1,12 @@
+from rest_framework import serializers
+from .models import Block
+
+
+class BlockedUserSerializer(serializers.ModelSerializer):
+    """A user the current user has blocked, read from a block edge"""
+    id = serializers.IntegerField(source='blocked.id', read_only=True)
+    username = serializers.CharField(source='blocked.username', read_only=True)
+
+    class Meta:
+        model = Block
+        fields = ['id', 'username', 'created_at']
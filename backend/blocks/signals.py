@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .blocklist import refresh_blocklists
+from .models import Block
+
+
+@receiver(post_save, sender=Block)
+@receiver(post_delete, sender=Block)
+def refresh_cached_blocklists(sender, instance, **kwargs):
+    """Both users' cached sets change; rewrite them for every worker once the edge is committed"""
+    blocker_id, blocked_id = instance.blocker_id, instance.blocked_id
+    transaction.on_commit(lambda: refresh_blocklists(blocker_id, blocked_id))
@@ -0,0 +1,178 @@
+import tempfile
+import time
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from Ani_Tinder.asgi import application
+from chat.models import Chat
+from follow.models import Follow
+from friends.models import FriendList, FriendRequest
+
+from .blocklist import blocked_ids, refresh_blocklists, request_blocklist
+from .models import Block
+
+# Every worker reads blocklists from the shared file cache; give each test run its own
+SHARED_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(prefix='blocks-tests-'),
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class BlockEnforcementTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.carol = User.objects.create_user('carol', password='x')
+
+    def block(self, blocker, blocked):
+        self.client.force_authenticate(blocker)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/blocks/user/{blocked.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_block_cuts_friendship_requests_and_follows(self):
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob).accept()
+        Follow.objects.get(user=self.alice).add_following(self.bob)
+        Follow.objects.get(user=self.bob).add_following(self.alice)
+
+        self.block(self.bob, self.alice)
+
+        self.assertFalse(FriendList.objects.get(user=self.alice).is_mutual_friend(self.bob))
+        self.assertFalse(Follow.objects.get(user=self.alice).is_following(self.bob))
+        self.assertFalse(Follow.objects.get(user=self.bob).is_following(self.alice))
+
+    def test_blocked_user_cannot_friend_request_or_follow_either_way(self):
+        self.block(self.bob, self.alice)
+
+        for user, other in ((self.alice, self.bob), (self.bob, self.alice)):
+            self.client.force_authenticate(user)
+            self.assertEqual(self.client.post(f'/api/friends/requests/add/{other.id}/').status_code, 403)
+            self.assertEqual(self.client.post(f'/api/follow/user/{other.id}/').status_code, 403)
+
+    def test_blocked_users_are_hidden_from_the_directory(self):
+        self.block(self.bob, self.alice)
+
+        self.client.force_authenticate(self.alice)
+        usernames = {user['username'] for user in self.client.get('/api/users/all/').data}
+        self.assertIn('carol', usernames)
+        self.assertNotIn('bob', usernames)
+
+    def test_block_change_is_written_through_to_the_shared_cache(self):
+        self.assertEqual(blocked_ids(self.alice.id), frozenset())
+
+        self.block(self.bob, self.alice)
+        # Another worker reading the cache sees the block without loading it from the table
+        with self.assertNumQueries(0):
+            self.assertEqual(blocked_ids(self.alice.id), {self.bob.id})
+            self.assertEqual(blocked_ids(self.bob.id), {self.alice.id})
+
+        self.client.force_authenticate(self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/blocks/unblock/{self.alice.id}/')
+        with self.assertNumQueries(0):
+            self.assertEqual(blocked_ids(self.alice.id), frozenset())
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.post(f'/api/follow/user/{self.bob.id}/').status_code, 200)
+
+    def test_inactive_users_lists_are_dropped_not_recomputed(self):
+        self.block(self.bob, self.alice)
+        self.alice.is_active = False
+        self.alice.save()
+
+        refresh_blocklists(self.alice.id, self.bob.id)
+
+        self.assertIsNone(cache.get(f'blocks:set:{self.alice.id}'))
+        self.assertEqual(blocked_ids(self.bob.id), {self.alice.id})
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class BlockedChatTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.chat, _ = Chat.objects.get_or_create_pair(self.alice.id, self.bob.id)
+        self.token = Token.objects.create(user=self.alice).key
+        Block.objects.block(self.bob, self.alice)
+
+    def test_pair_socket_is_refused(self):
+        async def connect():
+            socket = WebsocketCommunicator(application, f'/ws/chat/{self.alice.id}_{self.bob.id}/?token={self.token}')
+            connected, _ = await socket.connect()
+            await socket.disconnect()
+            return connected
+
+        self.assertFalse(async_to_sync(connect)())
+
+    def test_messages_are_refused_on_the_user_socket(self):
+        async def send():
+            socket = WebsocketCommunicator(application, f'/ws/chat/user/{self.alice.id}/?token={self.token}')
+            await socket.connect()
+            await socket.send_json_to({'type': 'message', 'chat': self.chat.id, 'content': 'hi'})
+            reply = await socket.receive_json_from()
+            await socket.disconnect()
+            return reply
+
+        self.assertEqual(async_to_sync(send)()['error'], 'You cannot message this user')
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class BlocklistLatencyTests(APITestCase):
+    """Blocklist checks should add well under BUDGET_MS to a request, however long the list"""
+    BUDGET_MS = 1.0
+    BLOCKED = 5000
+    CHECKS = 50
+    REQUESTS = 500
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('blocker', password='x')
+        User.objects.bulk_create([User(username=f'blocked_{i}') for i in range(self.BLOCKED)], batch_size=1000)
+        self.others = list(User.objects.filter(username__startswith='blocked_').values_list('id', flat=True))
+        # Half blocked by the user, half blocking them
+        half = self.BLOCKED // 2
+        Block.objects.bulk_create(
+            [Block(blocker=self.user, blocked_id=other) for other in self.others[:half]]
+            + [Block(blocker_id=other, blocked=self.user) for other in self.others[half:]]
+        )
+        refresh_blocklists(self.user.id)
+        self.factory = RequestFactory()
+
+    def p99_ms(self):
+        candidates = self.others[:self.CHECKS]
+        timings = []
+        for _ in range(self.REQUESTS):
+            request = self.factory.get('/')
+            request.user = self.user
+            started = time.perf_counter()
+            blocked = request_blocklist(request)
+            [other for other in candidates if other not in blocked]
+            request_blocklist(request)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[int(len(timings) * 0.99) - 1] * 1000
+
+    def test_checks_stay_within_budget(self):
+        p99 = self.p99_ms()
+        self.assertLess(p99, self.BUDGET_MS)
+
+    def test_checks_stay_within_budget_right_after_a_block(self):
+        newcomer = User.objects.create_user('newcomer', password='x')
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/blocks/user/{newcomer.id}/')
+
+        with self.assertNumQueries(0):
+            self.assertIn(newcomer.id, blocked_ids(self.user.id))
+        p99 = self.p99_ms()
+        self.assertLess(p99, self.BUDGET_MS)
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'blocks'
+
+urlpatterns = [
+    path('', views.BlockedUsersView.as_view(), name='blocked_users'),
+    path('user/<int:user_id>/', views.BlockUserView.as_view(), name='block_user'),
+    path('unblock/<int:user_id>/', views.UnblockUserView.as_view(), name='unblock_user'),
+]
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import User
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.pagination import IdCursorPagination
+
+from .blocklist import MAX_BLOCKS
+from .models import Block
+from .serializers import BlockedUserSerializer
+
+
+class BlockedCursorPagination(IdCursorPagination):
+    """Keyset pagination over the users someone blocked, served by the (blocker, blocked) index"""
+    ordering = 'blocked_id'
+
+
+class BlockUserView(APIView):
+    """Block a user"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        user = request.user
+        user_to_block_id = self.kwargs.get('user_id')
+
+        if user.id == user_to_block_id:
+            return Response(
+                {'error': 'You cannot block yourself'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            user_to_block = User.objects.get(id=user_to_block_id)
+        except User.DoesNotExist:
+            return Response(
+                {'error': f'User with ID {user_to_block_id} not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if Block.objects.filter(blocker=user).count() >= MAX_BLOCKS:
+            return Response(
+                {'error': f'You can block at most {MAX_BLOCKS} users'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not Block.objects.block(user, user_to_block):
+            return Response(
+                {'message': 'You have already blocked this user.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {'message': 'User blocked successfully'},
+            status=status.HTTP_200_OK
+        )
+
+
+class UnblockUserView(APIView):
+    """Unblock a user"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        if not Block.objects.unblock(request.user, self.kwargs.get('user_id')):
+            return Response(
+                {'message': 'You have not blocked this user'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {'message': 'Unblocked successfully'},
+            status=status.HTTP_200_OK
+        )
+
+
+class BlockedUsersView(generics.ListAPIView):
+    """Get the users the current user has blocked, keyset-paginated"""
+    serializer_class = BlockedUserSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = BlockedCursorPagination
+
+    def get_queryset(self):
+        return Block.objects.filter(blocker=self.request.user).select_related('blocked').only(
+            'blocked_id', 'created_at', 'blocked__id', 'blocked__username'
+        )
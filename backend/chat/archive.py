@@ -0,0 +1,261 @@
+"""
+Cold-message archival.
+
+Messages older than CHAT_ARCHIVE_AFTER_DAYS are moved out of chat_chatmessage
+into one append-only segment file per chat under CHAT_ARCHIVE_ROOT. Each batch
+is appended as a zlib-compressed block and recorded in ChatArchiveSegment with
+its byte offset, so reads seek straight to the blocks they need. Blocks of
+format 2 keep each message's seq; format 1 blocks, written before that, decode
+with a null seq.
+
+A block is written and fsynced before its index row is committed and the rows
+deleted, so a crash leaves at worst an unreferenced block at the end of the file.
+Archived messages leave the full-text index together with their rows.
+
+Blocks are never edited in place. To drop messages from them (for an account
+purge), copy_without_senders() appends a filtered copy with its own index row
+and, once the original's row is deleted, zeroes the superseded bytes.
+"""
+import json
+import os
+import zlib
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Chat, ChatArchiveSegment, ChatMessage
+from .pagination import EPOCH, MICROSECOND
+
+ARCHIVE_BATCH_SIZE = 1000
+COMPRESSION_LEVEL = 6
+# 1: [id, sender, micros, content]; 2: [id, sender, micros, content, seq]
+BLOCK_FORMAT = 2
+
+
+@dataclass
+class ArchiveStats:
+    messages: int = 0
+    segments: int = 0
+    raw_bytes: int = 0
+    compressed_bytes: int = 0
+
+    def __iadd__(self, other):
+        self.messages += other.messages
+        self.segments += other.segments
+        self.raw_bytes += other.raw_bytes
+        self.compressed_bytes += other.compressed_bytes
+        return self
+
+
+def archive_cutoff(days=None):
+    return timezone.now() - timedelta(days=settings.CHAT_ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def segment_path(chat_id):
+    """Segment file of a chat, fanned out so no directory holds more than 1000 files"""
+    return os.path.join(settings.CHAT_ARCHIVE_ROOT, str(chat_id // 1000), f'{chat_id}.seg')
+
+
+def encode_block(rows):
+    """rows of (id, sender_id, timestamp, content, seq) -> (compressed block in BLOCK_FORMAT, raw size)"""
+    raw = json.dumps(
+        [[message_id, sender_id, (timestamp - EPOCH) // MICROSECOND, content, seq]
+         for message_id, sender_id, timestamp, content, seq in rows],
+        separators=(',', ':'), ensure_ascii=False,
+    ).encode()
+    return zlib.compress(raw, COMPRESSION_LEVEL), len(raw)
+
+
+def block_senders(sender_ids):
+    """The senders column for a block: ',3,7,', so one sender is a substring match"""
+    return ',' + ''.join(f'{sender_id},' for sender_id in sorted(set(sender_ids)))
+
+
+def decode_block(chat_id, data, block_format=BLOCK_FORMAT):
+    """Compressed block -> unsaved ChatMessage instances, oldest first"""
+    rows = json.loads(zlib.decompress(data))
+    if block_format == 1:
+        rows = [row + [None] for row in rows]
+    return [
+        ChatMessage(id=message_id, chat_id=chat_id, sender_id=sender_id, content=content,
+                    timestamp=EPOCH + micros * MICROSECOND, seq=seq)
+        for message_id, sender_id, micros, content, seq in rows
+    ]
+
+
+def archive_chat(chat_id, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move a chat's messages older than cutoff into its segment file, one block per batch"""
+    stats = ArchiveStats()
+    path = segment_path(chat_id)
+    while True:
+        rows = list(
+            ChatMessage.objects.filter(chat_id=chat_id, timestamp__lt=cutoff)
+            .order_by('timestamp', 'id')
+            .values_list('id', 'sender_id', 'timestamp', 'content', 'seq')[:batch_size]
+        )
+        if not rows:
+            return stats
+
+        block, raw_bytes = encode_block(rows)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as segment_file:
+            offset = segment_file.seek(0, os.SEEK_END)
+            segment_file.write(block)
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+
+        with transaction.atomic():
+            ChatArchiveSegment.objects.create(
+                chat_id=chat_id, offset=offset, length=len(block), checksum=zlib.crc32(block),
+                raw_bytes=raw_bytes, message_count=len(rows), block_format=BLOCK_FORMAT,
+                first_message_id=rows[0][0], last_message_id=rows[-1][0],
+                first_timestamp=rows[0][2], last_timestamp=rows[-1][2],
+                min_seq=min(row[4] for row in rows), max_seq=max(row[4] for row in rows),
+                senders=block_senders(row[1] for row in rows),
+            )
+            ChatMessage.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+        stats += ArchiveStats(len(rows), 1, raw_bytes, len(block))
+
+
+def segments_sent_by(user_id):
+    """Index rows of the blocks that may hold messages from user_id, including older blocks in their chats"""
+    chats = Chat.objects.filter(Q(participants=user_id) | Q(user_low_id=user_id) | Q(user_high_id=user_id))
+    return ChatArchiveSegment.objects.filter(
+        Q(senders__contains=f',{user_id},') | Q(senders__isnull=True, chat__in=chats.values('pk'))
+    )
+
+
+def copy_without_senders(segments, sender_ids):
+    """
+    Append a copy of each block without the messages of sender_ids and index it.
+    The caller deletes the original rows in the same transaction; their bytes are
+    zeroed once it commits. Returns {chat_id: messages dropped}.
+    """
+    sender_ids = set(sender_ids)
+    dropped = {}
+    for segment in segments.order_by('chat_id', 'offset'):
+        path = segment_path(segment.chat_id)
+        with open(path, 'rb') as segment_file:
+            segment_file.seek(segment.offset)
+            messages = decode_block(segment.chat_id, segment_file.read(segment.length), segment.block_format)
+        kept = [message for message in messages if message.sender_id not in sender_ids]
+        if len(kept) < len(messages):
+            dropped[segment.chat_id] = dropped.get(segment.chat_id, 0) + len(messages) - len(kept)
+            transaction.on_commit(lambda path=path, offset=segment.offset, length=segment.length:
+                                  _zero_range(path, offset, length))
+        if not kept:
+            continue
+
+        copy = ChatArchiveSegment(
+            chat_id=segment.chat_id, offset=segment.offset, length=segment.length, checksum=segment.checksum,
+            raw_bytes=segment.raw_bytes, message_count=len(kept), block_format=segment.block_format,
+            first_message_id=kept[0].id, last_message_id=kept[-1].id,
+            first_timestamp=kept[0].timestamp, last_timestamp=kept[-1].timestamp,
+            min_seq=segment.min_seq, max_seq=segment.max_seq,
+            senders=block_senders(message.sender_id for message in kept),
+        )
+        if len(kept) < len(messages):
+            rows = [(message.id, message.sender_id, message.timestamp, message.content, message.seq)
+                    for message in kept]
+            block, copy.raw_bytes = encode_block(rows)
+            with open(path, 'ab') as segment_file:
+                copy.offset = segment_file.seek(0, os.SEEK_END)
+                segment_file.write(block)
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+            seqs = [message.seq for message in kept if message.seq is not None]
+            copy.length, copy.checksum, copy.block_format = len(block), zlib.crc32(block), BLOCK_FORMAT
+            copy.min_seq, copy.max_seq = (min(seqs), max(seqs)) if seqs else (None, None)
+        # Unchanged blocks are re-indexed as they are, now with their senders known
+        copy.save()
+    return dropped
+
+
+def _zero_range(path, offset, length):
+    with open(path, 'r+b') as segment_file:
+        segment_file.seek(offset)
+        segment_file.write(bytes(length))
+        segment_file.flush()
+        os.fsync(segment_file.fileno())
+
+
+def read_archived(chat_id, before=None, limit=50):
+    """
+    Up to limit archived messages older than the (timestamp, id) cursor, newest first.
+    Segments are read newest first and only as many as the page needs.
+    """
+    segments = ChatArchiveSegment.objects.filter(chat_id=chat_id)
+    if before is not None:
+        timestamp, message_id = before
+        segments = segments.filter(
+            Q(first_timestamp__lt=timestamp) | Q(first_timestamp=timestamp, first_message_id__lt=message_id)
+        )
+    segments = segments.order_by('-last_timestamp', '-last_message_id').only('offset', 'length', 'block_format')
+
+    messages = []
+    path = segment_path(chat_id)
+    for segment in segments.iterator(chunk_size=16):
+        if len(messages) >= limit:
+            break
+        with open(path, 'rb') as segment_file:
+            segment_file.seek(segment.offset)
+            block = decode_block(chat_id, segment_file.read(segment.length), segment.block_format)
+        for message in reversed(block):
+            if before is None or (message.timestamp, message.id) < before:
+                messages.append(message)
+    messages = messages[:limit]
+
+    # Attach senders in one query; messages from deleted accounts keep a null sender
+    senders = User.objects.only('id', 'username').in_bulk({message.sender_id for message in messages})
+    for message in messages:
+        message.sender = senders.get(message.sender_id)
+    return messages
+
+
+def verify_chat(chat_id):
+    """Problems found in a chat's segment file and index, as readable strings"""
+    problems = []
+    path = segment_path(chat_id)
+    segments = list(ChatArchiveSegment.objects.filter(chat_id=chat_id).order_by('offset'))
+    if not segments:
+        return problems
+    if not os.path.exists(path):
+        return [f'chat {chat_id}: segment file {path} is missing']
+
+    with open(path, 'rb') as segment_file:
+        for segment in segments:
+            segment_file.seek(segment.offset)
+            data = segment_file.read(segment.length)
+            if len(data) != segment.length or zlib.crc32(data) != segment.checksum:
+                problems.append(f'chat {chat_id}: block at {segment.offset} fails its checksum')
+                continue
+            messages = decode_block(chat_id, data, segment.block_format)
+            ids = [message.id for message in messages]
+            if len(messages) != segment.message_count or (ids[0], ids[-1]) != (
+                    segment.first_message_id, segment.last_message_id):
+                problems.append(f'chat {chat_id}: block at {segment.offset} does not match its index entry')
+            if ChatMessage.objects.filter(id__in=ids).exists():
+                problems.append(f'chat {chat_id}: block at {segment.offset} is still present in the table')
+        size = segment_file.seek(0, os.SEEK_END)
+
+    end = max(segment.offset + segment.length for segment in segments)
+    if size > end:
+        problems.append(f'chat {chat_id}: {size - end} unreferenced bytes after the last block')
+    return problems
+
+
+def database_usage():
+    """(allocated bytes, free-list bytes) of the SQLite database; free pages are reclaimed by VACUUM"""
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+        page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+        freelist = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+    return page_count * page_size, freelist * page_size
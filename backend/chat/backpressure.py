@@ -0,0 +1,112 @@
+"""
+Input limits and outbound backpressure for the chat websockets.
+
+Inbound frames are checked against CHAT_MAX_FRAME_BYTES and two token buckets,
+one per connection and one per user shared by all of the user's sockets in this
+process, before they are parsed. Outbound frames go through a bounded queue
+drained by a writer task, so a client that reads slowly cannot stall event
+handling; once the queue is full CHAT_SLOW_CONSUMER_POLICY either drops frames
+or closes the socket.
+"""
+import asyncio
+from collections import Counter
+
+from django.conf import settings
+
+from core.ratelimit import TokenBucket, TokenBucketRegistry
+
+POLICY_DROP = 'drop'
+POLICY_CLOSE = 'close'
+
+# Close codes: 1008 policy violation, 1009 message too big, 1013 try again later
+CLOSE_TOO_BIG = 1009
+CLOSE_SLOW_CONSUMER = 1013
+
+# Process-wide counters: throttled and oversize inbound frames, dropped outbound
+# frames, and sockets closed for being too slow or sending oversize frames
+counters = Counter()
+
+_user_buckets = None
+
+
+def user_buckets():
+    global _user_buckets
+    rate, burst = settings.CHAT_USER_RATE
+    if _user_buckets is None or (_user_buckets.rate, _user_buckets.capacity) != (rate, burst):
+        _user_buckets = TokenBucketRegistry(rate, burst)
+    return _user_buckets
+
+
+class BackpressureMixin:
+    """
+    Put before AsyncWebsocketConsumer in the bases; expects ``send_payload``
+    from ChatMessagingMixin. Subclasses set ``rate_limit_key`` (e.g. the user id)
+    once it is known.
+    """
+    rate_limit_key = None
+
+    async def websocket_connect(self, message):
+        rate, burst = settings.CHAT_CONNECTION_RATE
+        self.connection_bucket = TokenBucket(rate, burst)
+        self.outbound = asyncio.Queue(maxsize=settings.CHAT_OUTBOUND_QUEUE_SIZE)
+        self.writer = None
+        self.throttled = False
+        self.closing = False
+        await super().websocket_connect(message)
+
+    async def websocket_receive(self, message):
+        if self.closing:
+            return
+        data = message.get('text')
+        size = len(data.encode()) if data is not None else len(message.get('bytes') or b'')
+        if size > settings.CHAT_MAX_FRAME_BYTES:
+            counters['oversize'] += 1
+            counters['closed_oversize'] += 1
+            await self.shutdown(CLOSE_TOO_BIG)
+            return
+
+        allowed = self.connection_bucket.allow()
+        if allowed and self.rate_limit_key is not None:
+            allowed = user_buckets().allow(self.rate_limit_key)
+        if not allowed:
+            counters['throttled'] += 1
+            # Tell the client once per burst of throttled frames, not once per frame
+            if not self.throttled:
+                self.throttled = True
+                await self.send_payload({'type': 'error', 'error': 'rate_limited'})
+            return
+        self.throttled = False
+        await super().websocket_receive(message)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        """Queue a frame for the writer task instead of writing inline"""
+        if self.closing:
+            return
+        if self.writer is None:
+            self.writer = asyncio.ensure_future(self.drain_outbound())
+        try:
+            self.outbound.put_nowait((text_data, bytes_data, close))
+        except asyncio.QueueFull:
+            if settings.CHAT_SLOW_CONSUMER_POLICY == POLICY_CLOSE:
+                counters['closed_slow'] += 1
+                await self.shutdown(CLOSE_SLOW_CONSUMER)
+            else:
+                counters['dropped'] += 1
+
+    async def drain_outbound(self):
+        while True:
+            text_data, bytes_data, close = await self.outbound.get()
+            await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def shutdown(self, code):
+        """Close now, discarding anything still queued for the client"""
+        self.closing = True
+        if self.writer is not None:
+            self.writer.cancel()
+        await self.close(code)
+
+    async def websocket_disconnect(self, message):
+        self.closing = True
+        if getattr(self, 'writer', None) is not None:
+            self.writer.cancel()
+        await super().websocket_disconnect(message)
@@ -1,13 +1,223 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 import json
+import time
+from datetime import timedelta
+from urllib.parse import parse_qs
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from channels.db import database_sync_to_async
+from blocks.blocklist import blocked_ids
+from core.presence import presence
+from core.ws_auth import authenticated_user_id
+from friends.models import FriendList
+from .backpressure import BackpressureMixin
 from .models import Chat, ChatMessage
+from .persistence import (
+    DURABILITY_SYNC, get_seq_allocator, get_write_buffer, persist_messages, seq_settle_delay, settled_seq,
+)
+from .wire import WireFormatMixin
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+# Forward at most one typing event per chat and connection this often;
+# clients show the indicator for TYPING_TTL seconds after the last one
+TYPING_INTERVAL = 3
+TYPING_TTL = 5
+
+# Messages fetched per query while replaying; kept below CHAT_OUTBOUND_QUEUE_SIZE
+# so a page always fits in the outbound queue
+RESUME_PAGE_SIZE = 100
+
+
+def user_group_name(user_id):
+    """Per-user channel group, used to push events that are not tied to an open chat"""
+    return f'user_{user_id}'
+
+
+class ChatMessagingMixin:
+    """Message, read-receipt, typing and presence handling shared by the per-chat and per-user sockets"""
+
+    async def go_online(self, user_id):
+        """Count this socket towards the user's presence and tell their friends if they just came online"""
+        if await presence.connect(self.channel_layer, user_id):
+            await self.notify_friends(user_id, True)
+
+    async def go_offline(self, user_id):
+        if await presence.disconnect(self.channel_layer, user_id):
+            await self.notify_friends(user_id, False)
+
+    async def notify_friends(self, user_id, online):
+        for friend_id in await self.get_friend_ids(user_id):
+            await self.channel_layer.group_send(
+                user_group_name(friend_id),
+                {'type': 'presence.changed', 'user': user_id, 'online': online}
+            )
+
+    async def send_typing(self, chat_id, group_name, user_id):
+        """Coalesced typing indicator; kept entirely in the channel layer"""
+        now = time.monotonic()
+        sent = self.__dict__.setdefault('typing_sent', {})
+        if now - sent.get(chat_id, -TYPING_INTERVAL) < TYPING_INTERVAL:
+            return
+        sent[chat_id] = now
+        await self.channel_layer.group_send(
+            group_name,
+            {'type': 'typing', 'chat': chat_id, 'user': user_id, 'expires_in': TYPING_TTL}
+        )
+
+    async def send_chat_message(self, chat, group_name, sender, content):
+        """
+        Persist (now or write-behind, per CHAT_MESSAGE_DURABILITY) and fan out with
+        one group_send to the chat's group, whatever the number of members.
+        Returns False, sending nothing, if either side of a pair chat blocked the other.
+        """
+        recipient_id = chat.recipient_id_for(sender.id)
+        if recipient_id is not None and recipient_id in await self.get_blocked_ids(sender.id):
+            return False
+
+        # Numbered before the broadcast so clients can resume from it, even while the row is buffered.
+        # Timestamped after, so the timestamp is no earlier than the seq's block (see seq_settle_delay).
+        seq = await get_seq_allocator().allocate(chat.id)
+        chat_message = ChatMessage(chat=chat, sender=sender, content=content, timestamp=timezone.now(), seq=seq)
+
+        if settings.CHAT_MESSAGE_DURABILITY == DURABILITY_SYNC:
+            await self.create_chat_message(chat_message)
+
+        # Send message to group
+        await self.channel_layer.group_send(
+            group_name,
+            {
+                'type': 'chat_message',
+                'chat': chat.id,
+                'message': chat_message.content,
+                'sender': sender.id,
+                'receiver': recipient_id,
+                'timestamp': chat_message.timestamp.isoformat(),
+                'ts': int(chat_message.timestamp.timestamp() * 1000),
+                'seq': chat_message.seq
+            }
+        )
+
+        if settings.CHAT_MESSAGE_DURABILITY != DURABILITY_SYNC:
+            await get_write_buffer().add(chat_message)
+        return True
+
+    async def mark_read(self, chat, group_name, user, message_id=None):
+        """Advance the user's read pointer and tell the other participants"""
+        # Buffered messages must be in the table before the pointer can cover them
+        await get_write_buffer().flush()
+        state, advanced = await self.update_read_state(chat, user, message_id)
+        if not advanced:
+            return
+        await self.channel_layer.group_send(
+            group_name,
+            {
+                'type': 'read_receipt',
+                'chat': chat.id,
+                'user': user.id,
+                'message_id': state.last_read_message_id,
+                'read_at': state.updated_at.isoformat()
+            }
+        )
+
+    async def replay(self, chat, resume_from):
+        """
+        Resend the messages after seq `resume_from` through the chat_message handler,
+        then a ``resumed`` frame. ``complete`` is false when messages are missing
+        (over CHAT_RESUME_LIMIT or archived) and the client should refetch the history.
+        Seqs can skip numbers (unused seq blocks), so gaps alone are not missing messages,
+        but another worker may still send or flush a seq inside a recent gap. The frame's
+        ``seq`` therefore stops at the first gap that has not settled (see settled_seq),
+        and a client resuming from it gets that seq however late it arrives.
+        Live messages may overlap the replay; clients drop seqs they already have.
+        """
+        # Buffered messages must be in the table before the scan can see them
+        await get_write_buffer().flush()
+        settled_before = timezone.now() - timedelta(seconds=seq_settle_delay())
+        seq = resumed = resume_from
+        remaining = settings.CHAT_RESUME_LIMIT
+        complete = not await self.has_archived_after(chat, resume_from)
+        while remaining > 0:
+            messages = await self.get_messages_after(chat, seq, min(RESUME_PAGE_SIZE, remaining))
+            if not messages:
+                break
+            for message in messages:
+                await self.chat_message(self.message_event(chat, message))
+            # Only advances past the page's gaps while every earlier one has settled
+            if resumed == seq:
+                resumed = settled_seq(seq, messages, settled_before)
+            seq = messages[-1].seq
+            remaining -= len(messages)
+        if remaining <= 0 and await self.get_messages_after(chat, seq, 1):
+            complete = False
+        await self.send_payload({'type': 'resumed', 'chat': chat.id, 'seq': resumed, 'complete': complete})
+
+    @staticmethod
+    def message_event(chat, message):
+        """A stored message shaped like the chat_message group event"""
+        return {
+            'type': 'chat_message',
+            'chat': chat.id,
+            'message': message.content,
+            'sender': message.sender_id,
+            'receiver': chat.recipient_id_for(message.sender_id),
+            'timestamp': message.timestamp.isoformat(),
+            'ts': int(message.timestamp.timestamp() * 1000),
+            'seq': message.seq
+        }
+
+    async def send_payload(self, payload):
+        await self.send(text_data=json.dumps(payload))
+
+    async def send_error(self, error, chat_id=None):
+        await self.send_payload({'type': 'error', 'chat': chat_id, 'error': error})
+
+    @staticmethod
+    def message_content(data):
+        """The text of a message frame, or None if it has none"""
+        content = data.get('content')
+        return content if isinstance(content, str) else None
+
+    @database_sync_to_async
+    def get_friend_ids(self, user_id):
+        return list(FriendList.friends.through.objects.filter(friendlist__user_id=user_id).values_list('user_id', flat=True))
+
+    @database_sync_to_async
+    def get_blocked_ids(self, user_id):
+        """The user's cached blocklist; only a miss after a block change reads the table"""
+        return blocked_ids(user_id)
+
+    @database_sync_to_async
+    def has_archived_after(self, chat, seq):
+        return chat.archive_segments.filter(max_seq__gt=seq).exists()
+
+    @database_sync_to_async
+    def get_messages_after(self, chat, seq, limit):
+        return list(chat.messages_after(seq, limit).only('seq', 'sender_id', 'content', 'timestamp'))
+
+    @database_sync_to_async
+    def update_read_state(self, chat, user, message_id):
+        """Move the read pointer, ignoring ids from other chats"""
+        try:
+            return chat.mark_read(user, message_id)
+        except (ValidationError, ValueError, TypeError):
+            return None, False
+
+    @database_sync_to_async
+    def create_chat_message(self, chat_message):
+        """Save a single message immediately"""
+        persist_messages([chat_message])
+        return chat_message
+
+
+class ChatConsumer(BackpressureMixin, ChatMessagingMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for handling real-time chat communications.
+    The chat and both participants are resolved once at connect and cached on the consumer.
+    The connecting user comes from the scope (session or ?token=) and must be one of the
+    pair; the order of ids in the URL carries no identity.
+    Connecting with ?resume_from=<seq> replays the messages after that seq first.
     """
 
     async def connect(self):
@@ -15,15 +225,25 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.sender_id = self.scope['url_route']['kwargs'].get('sender_id')
         self.receiver_id = self.scope['url_route']['kwargs'].get('receiver_id')
 
-        if not self.sender_id or not self.receiver_id:
+        self.user_id = authenticated_user_id(self.scope)
+
+        if not self.sender_id or not self.receiver_id or self.user_id not in (self.sender_id, self.receiver_id):
             await self.close()
             return
+        self.other_id = self.receiver_id if self.user_id == self.sender_id else self.sender_id
+        self.rate_limit_key = self.user_id
 
         # Create consistent room name based on sorted participant IDs
         participant_ids = sorted([self.sender_id, self.receiver_id])
         self.room_name_1 = f'{participant_ids[0]}_{participant_ids[1]}'
         self.room_name_2 = f'{participant_ids[1]}_{participant_ids[0]}'
-        self.room_group_name = f'chat_{self.room_name_1}'
+        # Resolve participants and chat once for the lifetime of the connection
+        self.users = await self.get_users(self.sender_id, self.receiver_id)
+        if len(self.users) != 2 or self.other_id in await self.get_blocked_ids(self.user_id):
+            await self.close()
+            return
+        self.chat = await self.get_chat(self.sender_id, self.receiver_id)
+        self.room_group_name = self.chat.channel_group
 
         # Add channel to group
         await self.channel_layer.group_add(
@@ -32,40 +252,50 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
+        await self.go_online(self.user_id)
+
+        resume_from = parse_qs(self.scope.get('query_string', b'').decode()).get('resume_from')
+        if resume_from and resume_from[0].isdigit():
+            await self.replay(self.chat, int(resume_from[0]))
 
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        if not hasattr(self, 'chat'):
+            return
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        await self.go_offline(self.user_id)
+        # Make sure nothing this connection sent is left unwritten
+        await get_write_buffer().flush()
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Handle incoming messages"""
-        data = json.loads(text_data)
-        sender_id = data['sender']
-        receiver_id = data['receiver']
-        message_content = data['content']
-
-        # Get or create chat and users
-        chat = await self.get_chat(sender_id, receiver_id)
-        sender = await self.get_user(sender_id)
-        receiver = await self.get_user(receiver_id)
-
-        # Create and save message
-        chat_message = await self.create_chat_message(chat, sender, message_content)
-
-        # Send message to group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': chat_message.content,
-                'sender': sender.id,
-                'receiver': receiver.id,
-                'timestamp': chat_message.timestamp.isoformat()
-            }
-        )
+        try:
+            data = json.loads(text_data)
+        except (TypeError, ValueError):
+            data = None
+        if not isinstance(data, dict):
+            await self.send_error('Malformed frame')
+            return
+        # Any frame counts as a heartbeat
+        await presence.heartbeat(self.channel_layer, self.user_id)
+        if data.get('type') == 'heartbeat':
+            return
+        # Frames always act as the connected user, whatever 'sender' they carry
+        sender = self.users[self.user_id]
+        if data.get('type') == 'typing':
+            await self.send_typing(self.chat.id, self.room_group_name, sender.id)
+            return
+        if data.get('type') == 'read':
+            await self.mark_read(self.chat, self.room_group_name, sender, data.get('message_id'))
+            return
+        content = self.message_content(data)
+        if content is None:
+            await self.send_error('Message content is required')
+            return
+        await self.send_chat_message(self.chat, self.room_group_name, sender, content)
 
     async def chat_message(self, event):
         """Send message to WebSocket"""
@@ -73,34 +303,207 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message': event['message'],
             'sender': event['sender'],
             'receiver': event['receiver'],
-            'timestamp': event['timestamp']
+            'timestamp': event['timestamp'],
+            'seq': event['seq']
+        }))
+
+    async def read_receipt(self, event):
+        """Send read receipt to WebSocket"""
+        await self.send(text_data=json.dumps({
+            'type': 'read_receipt',
+            'user': event['user'],
+            'message_id': event['message_id'],
+            'read_at': event['read_at']
+        }))
+
+    async def typing(self, event):
+        """Send the other participant's typing indicator to WebSocket"""
+        if event['user'] == self.user_id:
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'typing',
+            'user': event['user'],
+            'expires_in': event['expires_in']
         }))
 
     @database_sync_to_async
     def get_chat(self, sender_id, receiver_id):
         """Get or create a chat between two users"""
-        participant_ids = sorted([sender_id, receiver_id])
-        room_name_1 = '_'.join(map(str, participant_ids))
-        room_name_2 = '_'.join(map(str, participant_ids[::-1]))
+        chat, _ = Chat.objects.get_or_create_pair(sender_id, receiver_id)
+        return chat
 
-        # Look for existing chat
-        chat = Chat.objects.filter(room_name_1=room_name_1).first() or Chat.objects.filter(
-            room_name_2=room_name_2).first()
+    @database_sync_to_async
+    def get_users(self, *user_ids):
+        """Get participants by ID in one query"""
+        return User.objects.in_bulk(user_ids)
 
-        # Create new chat if none exists
-        if not chat:
-            chat = Chat.objects.create()
-            chat.participants.set([sender_id, receiver_id])
-            chat.save()
 
-        return chat
+class UserChatConsumer(BackpressureMixin, WireFormatMixin, ChatMessagingMixin, AsyncWebsocketConsumer):
+    """
+    One socket per user carrying all of their chats.
+    Frames are tagged with the chat id; clients send
+    {"type": "message" | "read" | "typing" | "subscribe" | "unsubscribe", "chat": <id>, ...}
+    and {"type": "heartbeat"} at least every HEARTBEAT_INTERVAL seconds.
+    A subscribe frame with "resume_from": <seq> also replays that chat's missed messages.
+    Only an authenticated user (session or ?token=) may open their own socket.
+    The socket joins every chat's group at connect plus the user's own group,
+    through which it is told about chats created while it is open.
+    Clients offering the msgpack subprotocol get batched binary frames (see chat.wire).
+    """
+
+    async def connect(self):
+        """Handle WebSocket connection"""
+        self.user_id = self.scope['url_route']['kwargs'].get('user_id')
+        # Only the user themselves may open their socket
+        if authenticated_user_id(self.scope) != self.user_id:
+            await self.close()
+            return
+
+        self.user = await self.get_user(self.user_id)
+        if self.user is None:
+            await self.close()
+            return
+        self.rate_limit_key = self.user_id
+
+        # chat id -> (chat, group name)
+        self.chats = {}
+        self.user_group_name = user_group_name(self.user_id)
+        await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        for chat in await self.get_chats():
+            await self.subscribe(chat)
+
+        await self.accept(subprotocol=self.negotiate_subprotocol())
+        await self.go_online(self.user_id)
+
+    async def disconnect(self, close_code):
+        """Handle WebSocket disconnection"""
+        if not hasattr(self, 'chats'):
+            return
+        await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+        for chat_id in list(self.chats):
+            await self.unsubscribe(chat_id)
+        await self.go_offline(self.user_id)
+        self.cancel_pending()
+        # Make sure nothing this connection sent is left unwritten
+        await get_write_buffer().flush()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """Dispatch a client frame by type"""
+        try:
+            data = self.decode_inbound(text_data, bytes_data)
+        except ValueError:
+            await self.send_error('Malformed frame')
+            return
+        frame_type = data.get('type', 'message')
+        # Any frame counts as a heartbeat
+        await presence.heartbeat(self.channel_layer, self.user_id)
+        if frame_type == 'heartbeat':
+            return
+        try:
+            chat_id = int(data['chat'])
+        except (KeyError, TypeError, ValueError):
+            await self.send_error('A chat id is required')
+            return
+
+        if frame_type == 'subscribe':
+            if chat_id not in self.chats:
+                chat = await self.get_chats(chat_id)
+                if not chat:
+                    await self.send_error('Not a participant of this chat', chat_id)
+                    return
+                await self.subscribe(chat[0])
+            await self.send_payload({'type': 'subscribed', 'chat': chat_id})
+            resume_from = data.get('resume_from')
+            if isinstance(resume_from, int) and resume_from >= 0:
+                await self.replay(self.chats[chat_id][0], resume_from)
+            return
+        if frame_type == 'unsubscribe':
+            await self.unsubscribe(chat_id)
+            await self.send_payload({'type': 'unsubscribed', 'chat': chat_id})
+            return
+
+        if chat_id not in self.chats:
+            await self.send_error('Not subscribed to this chat', chat_id)
+            return
+        chat, group_name = self.chats[chat_id]
+        if frame_type == 'typing':
+            await self.send_typing(chat_id, group_name, self.user_id)
+        elif frame_type == 'read':
+            await self.mark_read(chat, group_name, self.user, data.get('message_id'))
+        elif frame_type == 'message':
+            content = self.message_content(data)
+            if content is None:
+                await self.send_error('Message content is required', chat_id)
+            elif not await self.send_chat_message(chat, group_name, self.user, content):
+                await self.send_error('You cannot message this user', chat_id)
+        else:
+            await self.send_error(f'Unknown frame type {frame_type!r}', chat_id)
+
+    async def subscribe(self, chat):
+        self.chats[chat.id] = (chat, chat.channel_group)
+        await self.channel_layer.group_add(chat.channel_group, self.channel_name)
+
+    async def unsubscribe(self, chat_id):
+        subscription = self.chats.pop(chat_id, None)
+        if subscription is not None:
+            await self.channel_layer.group_discard(subscription[1], self.channel_name)
+
+    async def chat_message(self, event):
+        """Send message to WebSocket, tagged with its chat"""
+        await self.send_message_event(event)
+
+    async def read_receipt(self, event):
+        """Send read receipt to WebSocket, tagged with its chat"""
+        await self.send_payload({
+            'type': 'read_receipt',
+            'chat': event['chat'],
+            'user': event['user'],
+            'message_id': event['message_id'],
+            'read_at': event['read_at']
+        })
+
+    async def typing(self, event):
+        """Send another participant's typing indicator to WebSocket"""
+        if event['user'] == self.user_id:
+            return
+        await self.send_payload({
+            'type': 'typing',
+            'chat': event['chat'],
+            'user': event['user'],
+            'expires_in': event['expires_in']
+        })
+
+    async def presence_changed(self, event):
+        """Send a friend's presence change to WebSocket"""
+        await self.send_payload({
+            'type': 'presence',
+            'user': event['user'],
+            'online': event['online']
+        })
+
+    async def chat_subscribe(self, event):
+        """Follow a chat the user was just added to"""
+        if event['chat'] in self.chats:
+            return
+        chat = await self.get_chats(event['chat'])
+        if chat:
+            await self.subscribe(chat[0])
+            await self.send_payload({'type': 'subscribed', 'chat': event['chat']})
+
+    async def chat_unsubscribe(self, event):
+        """Stop following a chat the user was removed from"""
+        if event['chat'] in self.chats:
+            await self.unsubscribe(event['chat'])
+            await self.send_payload({'type': 'unsubscribed', 'chat': event['chat']})
 
     @database_sync_to_async
     def get_user(self, user_id):
-        """Get user by ID"""
-        return User.objects.get(id=user_id)
+        return User.objects.filter(id=user_id).first()
 
     @database_sync_to_async
-    def create_chat_message(self, chat, sender, message):
-        """Create a new chat message"""
-        return ChatMessage.objects.create(chat=chat, sender=sender, content=message)
\ No newline at end of file
+    def get_chats(self, chat_id=None):
+        """The user's chats (or just chat_id if they participate in it), without loading their members"""
+        chats = Chat.objects.filter(participants=self.user_id).only('id', 'is_group', 'user_low', 'user_high')
+        if chat_id is not None:
+            chats = chats.filter(id=chat_id)
+        return list(chats)
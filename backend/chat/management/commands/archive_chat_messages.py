@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from chat.archive import ARCHIVE_BATCH_SIZE, ArchiveStats, archive_chat, archive_cutoff, database_usage, verify_chat
+from chat.models import Chat, ChatArchiveSegment, ChatMessage
+
+
+class Command(BaseCommand):
+    help = "Move cold chat messages into compressed per-chat segment files, or verify existing segments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help=f'Defaults to CHAT_ARCHIVE_AFTER_DAYS ({settings.CHAT_ARCHIVE_AFTER_DAYS})')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Messages per block')
+        parser.add_argument('--chat', type=int, action='append', help='Only these chat ids (repeatable)')
+        parser.add_argument('--verify', action='store_true', help='Check segment files against the index and exit')
+        parser.add_argument('--vacuum', action='store_true', help='VACUUM afterwards to return freed pages to the OS')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['verify']:
+            return self.verify(options['chat'])
+
+        cutoff = archive_cutoff(options['older_than_days'])
+        chat_ids = options['chat'] or ChatMessage.objects.filter(timestamp__lt=cutoff).values_list(
+            'chat_id', flat=True).distinct().order_by('chat_id')
+        before = database_usage()
+
+        total = ArchiveStats()
+        for chat_id in list(chat_ids):
+            stats = archive_chat(chat_id, cutoff, options['batch_size'])
+            if stats.messages:
+                self.stdout.write(f"chat {chat_id}: archived {stats.messages} messages in {stats.segments} blocks")
+            total += stats
+
+        ratio = total.raw_bytes / total.compressed_bytes if total.compressed_bytes else 0
+        self.stdout.write(
+            f"archived {total.messages} messages older than {cutoff:%Y-%m-%d}: "
+            f"{total.raw_bytes / 2 ** 20:.1f} MiB -> {total.compressed_bytes / 2 ** 20:.1f} MiB ({ratio:.1f}x)"
+        )
+
+        if before is None:
+            return
+        if options['vacuum']:
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+        after = database_usage()
+        self.stdout.write(
+            f"database: {before[0] / 2 ** 20:.1f} MiB -> {after[0] / 2 ** 20:.1f} MiB allocated, "
+            f"{after[1] / 2 ** 20:.1f} MiB free for reuse"
+            + ("" if options['vacuum'] else " (run with --vacuum to shrink the file)")
+        )
+
+    def verify(self, chat_ids):
+        if not chat_ids:
+            chat_ids = ChatArchiveSegment.objects.values_list('chat_id', flat=True).distinct().order_by('chat_id')
+        checked, problems = 0, []
+        for chat_id in list(chat_ids):
+            problems += verify_chat(chat_id)
+            checked += 1
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f'{len(problems)} problems in {checked} archived chats')
+        self.stdout.write(f'{checked} archived chats verified')
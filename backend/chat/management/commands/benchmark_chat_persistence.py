@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from chat.models import Chat, ChatMessage
+from chat.persistence import DURABILITY_BUFFERED, DURABILITY_SYNC, get_write_buffer
+from chat.routing import websocket_urlpatterns
+
+UNLIMITED = (float('inf'), float('inf'))
+
+
+class Command(BaseCommand):
+    help = "Measure ChatConsumer messages/sec per worker with sync and write-behind persistence"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--window', type=int, default=50, help='Messages in flight before reading echoes')
+
+    def handle(self, *args, **options):
+        # Run against a throwaway test database so the real one is never touched
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            sender = User.objects.create_user('bench_sender')
+            receiver = User.objects.create_user('bench_receiver')
+            Chat.objects.get_or_create_pair(sender, receiver)
+
+            for mode in (DURABILITY_SYNC, DURABILITY_BUFFERED):
+                ChatMessage.objects.all().delete()
+                # Measure persistence, not the per-connection rate limits
+                with override_settings(CHAT_MESSAGE_DURABILITY=mode, CHAT_CONNECTION_RATE=UNLIMITED,
+                                       CHAT_USER_RATE=UNLIMITED):
+                    elapsed = asyncio.run(self.run_mode(sender, receiver.id, options))
+                stored = ChatMessage.objects.count()
+                rate = options['messages'] / elapsed
+                self.stdout.write(f"{mode:>8}: {rate:8.0f} msg/s  ({elapsed:.2f}s, {stored} rows stored)")
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    async def run_mode(self, sender, receiver_id, options):
+        sender_id = sender.id
+        application = URLRouter(websocket_urlpatterns)
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{sender_id}_{receiver_id}/')
+        # The consumer acts as the authenticated user
+        communicator.scope['user'] = sender
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError('Could not connect to ChatConsumer')
+
+        total, window = options['messages'], options['window']
+        started = time.perf_counter()
+        for offset in range(0, total, window):
+            batch = min(window, total - offset)
+            for i in range(batch):
+                await communicator.send_json_to({
+                    'sender': sender_id, 'receiver': receiver_id, 'content': f'message {offset + i}',
+                })
+            for _ in range(batch):
+                await communicator.receive_json_from(timeout=10)
+        await get_write_buffer().flush()
+        elapsed = time.perf_counter() - started
+
+        await communicator.disconnect()
+        return elapsed
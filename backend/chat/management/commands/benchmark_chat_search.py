@@ -0,0 +1,130 @@
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.search import SNIPPET_TOKENS, build_match_query
+
+SCHEMA_SQL = [
+    "CREATE TABLE chat_chatmessage (id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, content TEXT NOT NULL)",
+    "CREATE INDEX chat_chatmessage_chat_id ON chat_chatmessage (chat_id)",
+]
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE chat_message_fts USING fts5(content, chat_id, "
+    "content='chat_chatmessage', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+LIKE_SQL = (
+    "SELECT id, content FROM chat_chatmessage WHERE chat_id = ? AND content LIKE ? ORDER BY id DESC LIMIT ?"
+)
+FTS_SEARCH_SQL = (
+    "SELECT m.id, snippet(chat_message_fts, 0, '[', ']', '…', ?) FROM chat_message_fts "
+    "JOIN chat_chatmessage m ON m.id = chat_message_fts.rowid "
+    "WHERE chat_message_fts MATCH ? ORDER BY chat_message_fts.rowid DESC LIMIT ?"
+)
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 message search against a LIKE scan on synthetic chat messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10_000_000)
+        parser.add_argument('--chats', type=int, default=50_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--path', help='SQLite file to build (defaults to a temporary file, removed afterwards)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        path = options['path'] or os.path.join(tempfile.mkdtemp(), 'chat_search_bench.sqlite3')
+        db = sqlite3.connect(path)
+        db.execute('PRAGMA journal_mode=OFF')
+        db.execute('PRAGMA synchronous=OFF')
+        try:
+            vocabulary = [self.word(rng) for _ in range(20_000)]
+            # Zipf-like word frequencies, like real chat text
+            weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+            started = time.perf_counter()
+            self.generate(db, rng, vocabulary, weights, options)
+            self.stdout.write(f"generated {options['messages']} messages in {time.perf_counter() - started:.1f}s")
+            base_size = os.path.getsize(path)
+
+            started = time.perf_counter()
+            for statement in FTS_SQL:
+                db.execute(statement)
+            db.commit()
+            self.stdout.write(
+                f"built FTS index in {time.perf_counter() - started:.1f}s, "
+                f"{(os.path.getsize(path) - base_size) / 2 ** 20:.0f} MiB on {base_size / 2 ** 20:.0f} MiB of messages"
+            )
+
+            # Mid-frequency terms: common enough to hit, rare enough that LIKE has to read far
+            terms = vocabulary[200:5000]
+            scopes = {
+                'any chat': lambda: rng.randrange(options['chats']),
+                # The chat of a random message, so busy conversations are searched proportionally more
+                'busy chat': lambda: db.execute(
+                    "SELECT chat_id FROM chat_chatmessage WHERE id = ?", (rng.randint(1, options['messages']),)
+                ).fetchone()[0],
+            }
+            for scope, pick_chat in scopes.items():
+                queries = [(pick_chat(), rng.choice(terms)) for _ in range(options['queries'])]
+                results = {
+                    'LIKE scan': self.time_queries(db, queries, lambda chat_id, term: (
+                        LIKE_SQL, (chat_id, f'%{term}%', options['limit']))),
+                    'FTS5 term': self.time_queries(db, queries, lambda chat_id, term: (
+                        FTS_SEARCH_SQL, (SNIPPET_TOKENS, build_match_query(term, chat_id), options['limit']))),
+                    'FTS5 prefix': self.time_queries(db, queries, lambda chat_id, term: (
+                        FTS_SEARCH_SQL, (SNIPPET_TOKENS, build_match_query(term[:3], chat_id), options['limit']))),
+                }
+                self.stdout.write(f"{scope}:")
+                for label, timings in results.items():
+                    self.stdout.write(
+                        f"  {label:>11}: p50 {statistics.median(timings):7.2f}ms  "
+                        f"p95 {self.percentile(timings, 0.95):7.2f}ms  max {max(timings):7.2f}ms"
+                    )
+        finally:
+            db.close()
+            if not options['path']:
+                os.remove(path)
+
+    @staticmethod
+    def word(rng):
+        return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+
+    def generate(self, db, rng, vocabulary, weights, options):
+        for statement in SCHEMA_SQL:
+            db.execute(statement)
+        batch = []
+        for message_id in range(1, options['messages'] + 1):
+            words = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(3, 15))
+            # Log-uniform chat sizes: a few long-running conversations and many short ones
+            chat_id = int(options['chats'] ** rng.random()) - 1
+            batch.append((message_id, chat_id, ' '.join(words)))
+            if len(batch) == 50_000:
+                db.executemany("INSERT INTO chat_chatmessage VALUES (?, ?, ?)", batch)
+                batch.clear()
+        db.executemany("INSERT INTO chat_chatmessage VALUES (?, ?, ?)", batch)
+        db.commit()
+
+    @staticmethod
+    def time_queries(db, queries, build):
+        timings = []
+        for chat_id, term in queries:
+            sql, params = build(chat_id, term)
+            started = time.perf_counter()
+            db.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    @staticmethod
+    def percentile(values, fraction):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
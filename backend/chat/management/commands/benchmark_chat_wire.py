@@ -0,0 +1,80 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.wire import encode_frame, message_entry, message_payload
+
+WORDS = ('hey', 'did', 'you', 'watch', 'the', 'new', 'episode', 'yet', 'that', 'ending',
+         'was', 'wild', 'lol', 'season', 'two', 'when', 'tonight', 'maybe', 'ok', 'sure')
+
+
+def frame_overhead(length):
+    """Bytes of websocket header on an unmasked server-to-client frame"""
+    if length < 126:
+        return 2
+    if length < 65536:
+        return 4
+    return 10
+
+
+class Command(BaseCommand):
+    help = "Compare bytes on the wire and encode CPU per message for JSON and msgpack chat frames"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=50000)
+        parser.add_argument('--batch', type=int, default=16, help='Events per batched msgpack frame')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        events = self.make_events(options['messages'], options['seed'])
+        batch = options['batch']
+
+        def json_frames():
+            return [json.dumps(message_payload(event)).encode() for event in events]
+
+        def msgpack_frames():
+            return [encode_frame([message_entry(event)]) for event in events]
+
+        def batched_frames():
+            return [
+                encode_frame([message_entry(event) for event in events[i:i + batch]])
+                for i in range(0, len(events), batch)
+            ]
+
+        results = []
+        for name, encode in (('json', json_frames), ('msgpack', msgpack_frames),
+                             (f'msgpack x{batch}', batched_frames)):
+            started = time.process_time()
+            frames = encode()
+            cpu = time.process_time() - started
+            wire = sum(len(frame) + frame_overhead(len(frame)) for frame in frames)
+            results.append((name, len(frames), wire, cpu))
+
+        baseline = results[0][2]
+        count = len(events)
+        for name, frames, wire, cpu in results:
+            self.stdout.write(
+                f"{name:>12}: {frames:7d} frames  {wire / count:6.1f} B/msg  "
+                f"({wire / baseline:4.0%} of json)  {cpu / count * 1e6:5.2f} us/msg"
+            )
+
+    def make_events(self, count, seed):
+        rng = random.Random(seed)
+        now = timezone.now()
+        events = []
+        for i in range(count):
+            sender, receiver = rng.sample(range(1, 5000), 2)
+            timestamp = now + timezone.timedelta(milliseconds=i * 37)
+            events.append({
+                'chat': rng.randrange(1, 20000),
+                'message': ' '.join(rng.choices(WORDS, k=rng.randint(1, 12))),
+                'sender': sender,
+                'receiver': receiver,
+                'timestamp': timestamp.isoformat(),
+                'ts': int(timestamp.timestamp() * 1000),
+                'seq': i + 1,
+            })
+        return events
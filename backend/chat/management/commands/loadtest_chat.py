@@ -0,0 +1,375 @@
+import asyncio
+import json
+import subprocess
+import time
+import tracemalloc
+from urllib.parse import urlparse
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from chat.backpressure import counters
+from chat.models import Chat, ChatMessage
+from chat.persistence import get_write_buffer
+from chat.routing import websocket_urlpatterns
+from core.ws_auth import TokenAuthMiddlewareStack
+
+UNLIMITED = (float('inf'), float('inf'))
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+# Headline metrics shown by --compare; for all of them lower is better except msgs_per_sec
+COMPARED = ('latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms', 'msgs_per_sec',
+            'db_writes_per_sec', 'memory_per_connection_bytes')
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=settings.BASE_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def server_rss(pid):
+    """Resident memory of a local server process in bytes, from /proc"""
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    raise CommandError(f'No VmRSS for pid {pid}')
+
+
+class WriteCounter:
+    """Counts write statements on every database connection, including ones opened by worker threads"""
+
+    def __init__(self):
+        self.count = 0
+        self.wrapped = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if id(connection) not in self.wrapped:
+            self.wrapped.add(id(connection))
+            connection.execute_wrappers.append(self)
+
+
+class InProcessClient:
+    """A socket to the consumers in this process"""
+
+    def __init__(self, application, path):
+        self.communicator = WebsocketCommunicator(application, path)
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect()
+        if not connected:
+            raise CommandError(f'Could not connect to {self.communicator.scope["path"]}')
+
+    async def send(self, payload):
+        await self.communicator.send_to(text_data=json.dumps(payload))
+
+    async def receive(self):
+        return json.loads(await self.communicator.receive_from(timeout=3600))
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class RemoteClient:
+    """A socket to a running ASGI server, using the autobahn client that ships with daphne"""
+
+    def __init__(self, url):
+        self.url = url
+        self.inbox = asyncio.Queue()
+
+    async def connect(self):
+        from autobahn.asyncio.websocket import WebSocketClientFactory
+
+        loop = asyncio.get_running_loop()
+        self.opened = loop.create_future()
+        factory = WebSocketClientFactory(self.url)
+        factory.protocol = remote_protocol()
+        factory.client = self
+        parsed = urlparse(self.url)
+        secure = parsed.scheme == 'wss'
+        await loop.create_connection(factory, parsed.hostname, parsed.port or (443 if secure else 80),
+                                     ssl=secure or None)
+        self.protocol = await self.opened
+
+    async def send(self, payload):
+        self.protocol.sendMessage(json.dumps(payload).encode())
+
+    async def receive(self):
+        frame = await self.inbox.get()
+        if frame is None:
+            raise ConnectionError('Server closed the socket')
+        return json.loads(frame)
+
+    async def close(self):
+        self.protocol.sendClose()
+
+
+def remote_protocol():
+    from autobahn.asyncio.websocket import WebSocketClientProtocol
+
+    class Protocol(WebSocketClientProtocol):
+        def onOpen(self):
+            self.factory.client.opened.set_result(self)
+
+        def onMessage(self, payload, is_binary):
+            self.factory.client.inbox.put_nowait(payload)
+
+        def onClose(self, was_clean, code, reason):
+            client = self.factory.client
+            if not client.opened.done():
+                client.opened.set_exception(ConnectionError(reason or f'closed with {code}'))
+            client.inbox.put_nowait(None)
+
+    return Protocol
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test ChatConsumer with N user pairs sending at a target rate. Runs in process "
+        "against a throwaway database by default, or against a running server with --url."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pairs', type=int, default=50)
+        parser.add_argument('--rate', type=float, default=200, help='Messages/sec across all pairs')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of sending')
+        parser.add_argument('--drain', type=float, default=5, help='Seconds to wait for late deliveries')
+        parser.add_argument('--url', help='Base ws:// URL of a running server, e.g. ws://127.0.0.1:8000')
+        parser.add_argument('--server-pid', type=int, help='Server pid, to report memory per connection with --url')
+        parser.add_argument('--no-rate-limit', action='store_true',
+                            help='Lift the per-connection and per-user limits (in process only)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='A previous JSON result to compare against')
+
+    def handle(self, *args, **options):
+        if options['pairs'] < 1 or options['rate'] <= 0:
+            raise CommandError('--pairs and --rate must be positive')
+        if options['url']:
+            if options['no_rate_limit']:
+                raise CommandError('--no-rate-limit only applies in process')
+            results = self.run_remote(options)
+        else:
+            results = self.run_in_process(options)
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Saved to {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as previous:
+                self.compare(json.load(previous), results)
+
+    def run_in_process(self, options):
+        # Run against a throwaway test database so the real one is never touched
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            pairs = self.create_pairs(options['pairs'])
+            limits = {}
+            if options['no_rate_limit']:
+                limits = {'CHAT_CONNECTION_RATE': UNLIMITED, 'CHAT_USER_RATE': UNLIMITED}
+            application = TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+            with override_settings(**limits):
+                return asyncio.run(self.run(
+                    pairs, options, lambda path: InProcessClient(application, path), in_process=True,
+                ))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def run_remote(self, options):
+        pairs = self.create_pairs(options['pairs'])
+        base = options['url'].rstrip('/')
+        return asyncio.run(self.run(pairs, options, lambda path: RemoteClient(base + path), in_process=False))
+
+    def create_pairs(self, count):
+        """Users loadtest_<n>, paired up, with their chats and API tokens created ahead of the run"""
+        users = []
+        self.tokens = {}
+        for i in range(count * 2):
+            user, _ = User.objects.get_or_create(username=f'loadtest_{i}')
+            users.append(user)
+            self.tokens[user.id] = Token.objects.get_or_create(user=user)[0].key
+        pairs = list(zip(users[::2], users[1::2]))
+        for sender, receiver in pairs:
+            Chat.objects.get_or_create_pair(sender, receiver)
+        return [(sender.id, receiver.id) for sender, receiver in pairs]
+
+    async def run(self, pairs, options, make_client, in_process):
+        results = {
+            'commit': current_commit(),
+            'started_at': timezone.now().isoformat(),
+            'mode': 'in-process' if in_process else 'remote',
+            'url': options['url'],
+            'pairs': len(pairs),
+            'connections': len(pairs) * 2,
+            'target_rate': options['rate'],
+            'duration': options['duration'],
+            'durability': settings.CHAT_MESSAGE_DURABILITY,
+            'rate_limited': not options['no_rate_limit'],
+        }
+
+        # Worker threads open their connections while the sockets connect, so hook in first
+        writes = WriteCounter()
+        if in_process:
+            connection_created.connect(writes.install)
+            writes.install(connection)
+
+        # Memory per connection: Python allocations in process, server RSS otherwise
+        if in_process:
+            tracemalloc.start()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        elif options['server_pid']:
+            memory_before = server_rss(options['server_pid'])
+        senders, receivers = [], []
+        for sender_id, receiver_id in pairs:
+            # Sockets only act as the user their token authenticates
+            senders.append(make_client(f'/ws/chat/{sender_id}_{receiver_id}/?token={self.tokens[sender_id]}'))
+            receivers.append(make_client(f'/ws/chat/{receiver_id}_{sender_id}/?token={self.tokens[receiver_id]}'))
+        await asyncio.gather(*(client.connect() for client in senders + receivers))
+        memory = None
+        if in_process:
+            memory = tracemalloc.get_traced_memory()[0] - memory_before
+            tracemalloc.stop()
+        elif options['server_pid']:
+            memory = server_rss(options['server_pid']) - memory_before
+        results['memory_per_connection_bytes'] = memory and memory // results['connections']
+
+        writes_before = writes.count
+        rows_before = await ChatMessage.objects.acount()
+        counters_before = counters.copy()
+
+        sent_at = {}
+        latencies = []
+        delivered = asyncio.Event()
+        readers = [asyncio.ensure_future(self.read(client, sent_at, latencies, delivered)) for client in receivers]
+        # Senders also get their own messages back; read them so nothing piles up
+        readers += [asyncio.ensure_future(self.read(client)) for client in senders]
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.send(index, client, sender_id, options, sent_at)
+            for index, (client, (sender_id, _)) in enumerate(zip(senders, pairs))
+        ))
+        sending = time.perf_counter() - started
+        try:
+            await asyncio.wait_for(self.wait_delivered(sent_at, latencies, delivered), options['drain'])
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+
+        # A remote server flushes its write-behind buffer on its own schedule, so there
+        # rows_written can trail the messages delivered by up to one flush interval
+        if in_process:
+            await get_write_buffer().flush()
+        db_elapsed = time.perf_counter() - started
+        rows = await ChatMessage.objects.acount() - rows_before
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*(client.close() for client in senders + receivers), return_exceptions=True)
+        if in_process:
+            connection_created.disconnect(writes.install)
+
+        latencies.sort()
+        results.update({
+            'sent': len(sent_at),
+            'delivered': len(latencies),
+            'lost': len(sent_at) - len(latencies),
+            'send_rate': round(len(sent_at) / sending, 1),
+            'msgs_per_sec': round(len(latencies) / elapsed, 1),
+            'latency_p50_ms': percentile(latencies, 0.50),
+            'latency_p95_ms': percentile(latencies, 0.95),
+            'latency_p99_ms': percentile(latencies, 0.99),
+            'latency_max_ms': latencies[-1] if latencies else None,
+            'rows_written': rows,
+            # Statement counts need the database connections, so only in process
+            'db_writes': writes.count - writes_before if in_process else None,
+            'db_writes_per_sec': round((writes.count - writes_before) / db_elapsed, 1) if in_process else None,
+            'backpressure': {key: counters[key] - counters_before[key] for key in counters
+                             if counters[key] != counters_before[key]} if in_process else None,
+        })
+        for key in ('latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms', 'latency_max_ms'):
+            if results[key] is not None:
+                results[key] = round(results[key], 3)
+        return results
+
+    async def send(self, index, client, sender_id, options, sent_at):
+        """Open-loop sending on a fixed schedule, so a slow server shows up as latency"""
+        interval = options['pairs'] / options['rate']
+        # Stagger the pairs evenly across one interval
+        start = time.perf_counter() + interval * index / options['pairs']
+        deadline = start + options['duration']
+        seq = 0
+        while True:
+            due = start + seq * interval
+            if due >= deadline:
+                return
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            key = f'{sender_id}:{seq}'
+            sent_at[key] = time.perf_counter()
+            await client.send({'sender': sender_id, 'content': key})
+            seq += 1
+
+    async def read(self, client, sent_at=None, latencies=None, delivered=None):
+        while True:
+            frame = await client.receive()
+            if sent_at is None or 'message' not in frame:
+                continue
+            sent = sent_at.get(frame['message'])
+            if sent is not None:
+                latencies.append((time.perf_counter() - sent) * 1000)
+                delivered.set()
+
+    async def wait_delivered(self, sent_at, latencies, delivered):
+        while len(latencies) < len(sent_at):
+            delivered.clear()
+            await delivered.wait()
+
+    def report(self, results):
+        self.stdout.write(
+            f"{results['mode']}: {results['pairs']} pairs, {results['sent']} sent, "
+            f"{results['delivered']} delivered ({results['lost']} lost)"
+        )
+        for key in ('send_rate', 'msgs_per_sec', 'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms',
+                    'latency_max_ms', 'rows_written', 'db_writes_per_sec', 'memory_per_connection_bytes'):
+            self.stdout.write(f"  {key:>28}: {results[key]}")
+        if results['backpressure']:
+            self.stdout.write(f"  {'backpressure':>28}: {results['backpressure']}")
+
+    def compare(self, previous, results):
+        self.stdout.write(f"Compared with {previous.get('commit')} ({previous.get('started_at')}):")
+        for key in ('mode', 'pairs', 'target_rate', 'durability', 'rate_limited'):
+            if previous.get(key) != results.get(key):
+                self.stdout.write(f"  warning: {key} differs ({previous.get(key)} vs {results.get(key)})")
+        for key in COMPARED:
+            old, new = previous.get(key), results.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change < 0 if key == 'msgs_per_sec' else change > 0
+            flag = '  regression' if worse and abs(change) > 0.1 else ''
+            self.stdout.write(f"  {key:>28}: {old} -> {new} ({change:+.0%}){flag}")
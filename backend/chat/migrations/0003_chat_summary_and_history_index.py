@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_chat_summaries(apps, schema_editor):
+    Chat = apps.get_model('chat', 'Chat')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    for chat in Chat.objects.iterator():
+        last = ChatMessage.objects.filter(chat_id=chat.pk).order_by('-timestamp', '-id').first()
+        if last is None:
+            continue
+        Chat.objects.filter(pk=chat.pk).update(
+            last_message_preview=last.content[:120],
+            last_message_at=last.timestamp,
+            last_message_sender_id=last.sender_id,
+            message_count=ChatMessage.objects.filter(chat_id=chat.pk).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='unread_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['chat', 'timestamp', 'id'], name='chat_message_history_idx'),
+        ),
+        migrations.RunPython(backfill_chat_summaries, migrations.RunPython.noop),
+    ]
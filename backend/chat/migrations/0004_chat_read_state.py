@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_unread_counts(apps, schema_editor):
+    Chat = apps.get_model('chat', 'Chat')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    ChatReadState = apps.get_model('chat', 'ChatReadState')
+    for chat in Chat.objects.prefetch_related('participants').iterator(chunk_size=500):
+        states = []
+        for user in chat.participants.all():
+            unread = chat.unread_counts.get(str(user.id), 0)
+            # Users with nothing unread have read everything up to the latest message
+            last_read = None
+            if not unread:
+                last_read = ChatMessage.objects.filter(chat_id=chat.pk).order_by('-id').values_list(
+                    'id', flat=True).first()
+            states.append(ChatReadState(chat_id=chat.pk, user_id=user.id, unread_count=unread,
+                                        last_read_message_id=last_read))
+        ChatReadState.objects.bulk_create(states, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chat_summary_and_history_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='chat.chat')),
+                ('last_read_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.chatmessage')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chat Read State',
+                'verbose_name_plural': 'Chat Read States',
+                'constraints': [models.UniqueConstraint(fields=('chat', 'user'), name='chat_read_state_unique')],
+            },
+        ),
+        migrations.RunPython(move_unread_counts, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='chat',
+            name='unread_counts',
+        ),
+    ]
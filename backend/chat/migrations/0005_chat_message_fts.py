@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:05
+
+from django.db import migrations
+
+CREATE_SQL = [
+    # chat_id is indexed as a token so a per-chat search intersects posting lists
+    # instead of filtering every message in the table that matches the terms
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_fts USING fts5(content, chat_id, "
+    "content='chat_chatmessage', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS chat_message_fts_ai AFTER INSERT ON chat_chatmessage BEGIN "
+    "INSERT INTO chat_message_fts(rowid, content, chat_id) VALUES (new.id, new.content, new.chat_id); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_message_fts_ad AFTER DELETE ON chat_chatmessage BEGIN "
+    "INSERT INTO chat_message_fts(chat_message_fts, rowid, content, chat_id) VALUES ('delete', old.id, old.content, old.chat_id); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_message_fts_au AFTER UPDATE OF content, chat_id ON chat_chatmessage BEGIN "
+    "INSERT INTO chat_message_fts(chat_message_fts, rowid, content, chat_id) VALUES ('delete', old.id, old.content, old.chat_id); "
+    "INSERT INTO chat_message_fts(rowid, content, chat_id) VALUES (new.id, new.content, new.chat_id); END",
+    # Index the messages that already exist
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_ai",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_message_fts_au",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite-only; other backends search with icontains
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_chat_read_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SQL), run_sqlite(DROP_SQL)),
+    ]
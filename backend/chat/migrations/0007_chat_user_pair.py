@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:40
+
+import os
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def archive_path(chat_id):
+    # chat.archive.segment_path as of this migration
+    return os.path.join(settings.CHAT_ARCHIVE_ROOT, str(chat_id // 1000), f'{chat_id}.seg')
+
+
+def merge_chat(apps, duplicate, canonical):
+    """Move a duplicate chat's messages, members, read states and archive into the canonical chat, then delete it"""
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    ChatReadState = apps.get_model('chat', 'ChatReadState')
+    ChatArchiveSegment = apps.get_model('chat', 'ChatArchiveSegment')
+
+    ChatMessage.objects.filter(chat_id=duplicate.pk).update(chat_id=canonical.pk)
+    canonical.participants.add(*duplicate.participants.all())
+    for state in ChatReadState.objects.filter(chat_id=duplicate.pk):
+        merged = ChatReadState.objects.filter(chat_id=canonical.pk, user_id=state.user_id)
+        if merged.update(unread_count=F('unread_count') + state.unread_count):
+            state.delete()
+        else:
+            ChatReadState.objects.filter(pk=state.pk).update(chat_id=canonical.pk)
+
+    canonical.message_count += duplicate.message_count
+    if duplicate.last_message_at and (canonical.last_message_at is None
+                                      or duplicate.last_message_at > canonical.last_message_at):
+        canonical.last_message_preview = duplicate.last_message_preview
+        canonical.last_message_at = duplicate.last_message_at
+        canonical.last_message_sender_id = duplicate.last_message_sender_id
+    canonical.save(update_fields=['message_count', 'last_message_preview', 'last_message_at',
+                                  'last_message_sender'])
+
+    # Blocks are appended to the canonical chat's segment file as they are
+    segments = list(ChatArchiveSegment.objects.filter(chat_id=duplicate.pk).order_by('offset'))
+    if segments:
+        source, target = archive_path(duplicate.pk), archive_path(canonical.pk)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(source, 'rb') as source_file, open(target, 'ab') as target_file:
+            for segment in segments:
+                source_file.seek(segment.offset)
+                offset = target_file.seek(0, os.SEEK_END)
+                target_file.write(source_file.read(segment.length))
+                ChatArchiveSegment.objects.filter(pk=segment.pk).update(chat_id=canonical.pk, offset=offset)
+            target_file.flush()
+            os.fsync(target_file.fileno())
+        os.remove(source)
+    duplicate.delete()
+
+
+def backfill_user_pairs(apps, schema_editor):
+    """
+    Derive each chat's pair from its room name, falling back to its participants.
+    A later chat that resolves to a pair already taken is merged into the first one.
+    """
+    Chat = apps.get_model('chat', 'Chat')
+    canonical_ids = {}
+    for chat in Chat.objects.prefetch_related('participants').order_by('id').iterator(chunk_size=500):
+        pair = None
+        try:
+            ids = [int(part) for part in chat.room_name_1.split('_')]
+        except ValueError:
+            ids = []
+        if len(ids) != 2 or ids[0] == ids[1]:
+            ids = [user.id for user in chat.participants.all()]
+        if len(ids) == 2 and ids[0] != ids[1]:
+            pair = (min(ids), max(ids))
+        if pair is None:
+            continue
+        if pair in canonical_ids:
+            merge_chat(apps, chat, Chat.objects.get(pk=canonical_ids[pair]))
+            continue
+        canonical_ids[pair] = chat.pk
+        Chat.objects.filter(pk=chat.pk).update(user_low_id=pair[0], user_high_id=pair[1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_chat_archive_segment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='user_high',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='user_low',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_user_pairs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='chat_user_pair_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.CheckConstraint(condition=models.Q(('user_low__lt', models.F('user_high'))), name='chat_user_pair_ordered'),
+        ),
+    ]
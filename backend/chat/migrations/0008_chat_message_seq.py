@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+def backfill_seqs(apps, schema_editor):
+    """Number each chat's stored messages 1..n in history order and record n as its last seq"""
+    Chat = apps.get_model('chat', 'Chat')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    for chat_id in Chat.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=500):
+        batch = []
+        seq = 0
+        for message in ChatMessage.objects.filter(chat_id=chat_id).order_by('timestamp', 'id').only('id').iterator(chunk_size=2000):
+            seq += 1
+            message.seq = seq
+            batch.append(message)
+            if len(batch) == 2000:
+                ChatMessage.objects.bulk_update(batch, ['seq'])
+                batch = []
+        ChatMessage.objects.bulk_update(batch, ['seq'])
+        Chat.objects.filter(pk=chat_id).update(last_seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_chat_user_pair'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='seq',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.RunPython(backfill_seqs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='seq',
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(fields=('chat', 'seq'), name='chat_message_seq_unique'),
+        ),
+    ]
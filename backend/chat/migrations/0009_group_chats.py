@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_missing_read_states(apps, schema_editor):
+    """Every member needs a read state now that unread counters are bumped chat-wide"""
+    Chat = apps.get_model('chat', 'Chat')
+    ChatReadState = apps.get_model('chat', 'ChatReadState')
+    memberships = Chat.participants.through.objects.values_list('chat_id', 'user_id').order_by('pk')
+    batch = []
+    for chat_id, user_id in memberships.iterator(chunk_size=2000):
+        batch.append(ChatReadState(chat_id=chat_id, user_id=user_id))
+        if len(batch) == 2000:
+            ChatReadState.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ChatReadState.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_chat_message_seq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='is_group',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='chat',
+            name='room_name_1',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='chat',
+            name='room_name_2',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(create_missing_read_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_group_chats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatarchivesegment',
+            name='block_format',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='chatarchivesegment',
+            name='max_seq',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatarchivesegment',
+            name='min_seq',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
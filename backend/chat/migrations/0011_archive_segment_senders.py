@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_archive_segment_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatarchivesegment',
+            name='senders',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# SQLite rebuilds chat_chatmessage for the NOT NULL change and unique (chat, seq)
+# constraint in 0008, which drops the triggers 0005 created. Any later migration
+# that rebuilds the table must restore them the same way.
+RESTORE_SQL = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_ai",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_message_fts_au",
+    "CREATE TRIGGER chat_message_fts_ai AFTER INSERT ON chat_chatmessage BEGIN "
+    "INSERT INTO chat_message_fts(rowid, content, chat_id) VALUES (new.id, new.content, new.chat_id); END",
+    "CREATE TRIGGER chat_message_fts_ad AFTER DELETE ON chat_chatmessage BEGIN "
+    "INSERT INTO chat_message_fts(chat_message_fts, rowid, content, chat_id) VALUES ('delete', old.id, old.content, old.chat_id); END",
+    "CREATE TRIGGER chat_message_fts_au AFTER UPDATE OF content, chat_id ON chat_chatmessage BEGIN "
+    "INSERT INTO chat_message_fts(chat_message_fts, rowid, content, chat_id) VALUES ('delete', old.id, old.content, old.chat_id); "
+    "INSERT INTO chat_message_fts(rowid, content, chat_id) VALUES (new.id, new.content, new.chat_id); END",
+    # Reindex whatever was written, edited or deleted while the triggers were missing
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+
+
+def restore_triggers(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends search with icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in RESTORE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_archive_segment_senders'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
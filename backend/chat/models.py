@@ -1,42 +1,247 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+from blocks.models import Block
 from core.models import TimeStampedModel
+from notifications.delivery import mark_chat_read
+
+
+# Group chats have no stored room names; they are addressed as group_<id>
+GROUP_ROOM_PREFIX = 'group_'
+BLOCKED_MEMBERS_ERROR = "A group can't include two users where one has blocked the other."
+
+
+def room_names_for(user_low_id, user_high_id):
+    """Legacy room names of a pair: ids sorted as strings, then reversed"""
+    ids = sorted([str(user_low_id), str(user_high_id)])
+    return '_'.join(ids), '_'.join(ids[::-1])
+
+
+def parse_room_name(room_name):
+    """(user_low_id, user_high_id) from a pair room name in either order, or None"""
+    try:
+        first, second = (int(part) for part in room_name.split('_'))
+    except (AttributeError, ValueError):
+        return None
+    if first == second:
+        return None
+    return min(first, second), max(first, second)
+
+
+class ChatManager(models.Manager):
+    """Pair lookups over the (user_low, user_high) unique index"""
+
+    def for_room(self, room_name):
+        """Queryset of the chat a room name refers to, resolved through the pair key or the group id"""
+        if room_name.startswith(GROUP_ROOM_PREFIX):
+            group_id = room_name[len(GROUP_ROOM_PREFIX):]
+            if not group_id.isdigit():
+                return self.none()
+            return self.filter(pk=int(group_id), is_group=True)
+        pair = parse_room_name(room_name)
+        if pair is None:
+            return self.none()
+        return self.filter(user_low_id=pair[0], user_high_id=pair[1])
+
+    def get_or_create_pair(self, user_a, user_b):
+        """
+        The chat between two users (instances or ids), creating it if needed.
+        An existing chat costs one indexed SELECT; creation is an INSERT ... ON
+        CONFLICT DO NOTHING, so concurrent creators converge on the same row.
+        """
+        user_a, user_b = getattr(user_a, 'pk', user_a), getattr(user_b, 'pk', user_b)
+        low, high = sorted([int(user_a), int(user_b)])
+        if low == high:
+            raise ValidationError("A chat needs two different users.")
+        chat = self.filter(user_low_id=low, user_high_id=high).first()
+        if chat is not None:
+            return chat, False
+
+        room_name_1, room_name_2 = room_names_for(low, high)
+        with transaction.atomic():
+            self.bulk_create(
+                [Chat(user_low_id=low, user_high_id=high, room_name_1=room_name_1, room_name_2=room_name_2)],
+                ignore_conflicts=True,
+            )
+            chat = self.get(user_low_id=low, user_high_id=high)
+            chat.participants.add(low, high)
+        return chat, True
+
+    def create_group(self, creator, member_ids, name=''):
+        """
+        A group chat of the creator and member_ids, up to CHAT_GROUP_MAX_MEMBERS in all.
+        Refused if any two of them have blocked each other.
+        """
+        member_ids = set(member_ids) | {creator.pk}
+        if len(member_ids) > settings.CHAT_GROUP_MAX_MEMBERS:
+            raise ValidationError(f"A group can have at most {settings.CHAT_GROUP_MAX_MEMBERS} members.")
+        if Block.objects.exists_between(member_ids, member_ids):
+            raise ValidationError(BLOCKED_MEMBERS_ERROR)
+        with transaction.atomic():
+            chat = self.create(is_group=True, name=name, created_by=creator)
+            chat.participants.add(*member_ids)
+        return chat
+
+    def allocate_seqs(self, chat_id, count=1):
+        """
+        Reserve `count` consecutive message sequence numbers in a chat and return the first.
+        The UPDATE holds the row's write lock until commit, so concurrent workers get disjoint ranges.
+        """
+        with transaction.atomic():
+            self.filter(pk=chat_id).update(last_seq=F('last_seq') + count)
+            last_seq = self.filter(pk=chat_id).values_list('last_seq', flat=True).get()
+        return last_seq - count + 1
 
 
 class Chat(models.Model):
     """
     Chat model for conversations between users.
     A chat has multiple participants and uses room names for WebSocket connections.
+    Two-person chats are keyed by their (user_low, user_high) id pair; group chats
+    have neither a pair nor room names. Membership is the participants table,
+    indexed on (chat, user) and on user.
     """
     participants = models.ManyToManyField(User, related_name='chats')
-    room_name_1 = models.CharField(max_length=255, unique=True, blank=True)
-    room_name_2 = models.CharField(max_length=255, unique=True, blank=True)
+    room_name_1 = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    room_name_2 = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    is_group = models.BooleanField(default=False)
+    name = models.CharField(max_length=100, blank=True, default='')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Covered by the leading column of chat_user_pair_unique
+    user_low = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                 db_index=False)
+    user_high = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    # Denormalized summary so the chat list never touches ChatMessage
+    last_message_preview = models.CharField(max_length=120, blank=True, default='')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                            related_name='+')
+    message_count = models.PositiveIntegerField(default=0)
+    # Highest ChatMessage.seq handed out in this chat
+    last_seq = models.PositiveBigIntegerField(default=0)
+
+    objects = ChatManager()
 
     def save(self, *args, **kwargs):
         """
-        Custom save method to generate room names based on participant IDs.
-        Room names are used for WebSocket connections.
+        Keep the pair key and the room names used for WebSocket connections in step.
+        Either one can be given; nothing here touches participants, which don't exist before the first save.
         """
-        if not self.room_name_1 or not self.room_name_2:
-            participant_ids = sorted([str(participant.id) for participant in self.participants.all()])
-            self.room_name_1 = '_'.join(participant_ids)
-            self.room_name_2 = '_'.join(participant_ids[::-1])
-
-            if Chat.objects.filter(room_name_1=self.room_name_1).exists() or Chat.objects.filter(
-                    room_name_2=self.room_name_2).exists():
-                raise ValidationError(
-                    f"Chat with room_name '{self.room_name_1}' or '{self.room_name_2}' already exists.")
-
+        if self.user_low_id is None and self.room_name_1:
+            pair = parse_room_name(self.room_name_1)
+            if pair is not None:
+                self.user_low_id, self.user_high_id = pair
+        if self.user_low_id is not None and (not self.room_name_1 or not self.room_name_2):
+            self.room_name_1, self.room_name_2 = room_names_for(self.user_low_id, self.user_high_id)
         super().save(*args, **kwargs)
 
     def __str__(self):
+        if self.pk is None:
+            return "Unsaved chat"
+        if self.is_group:
+            return f"Group {self.name or self.pk}"
         participants = ", ".join([user.username for user in self.participants.all()])
         return f"Chat between {participants}"
 
+    @property
+    def room_name(self):
+        """Name used in chat URLs"""
+        if self.is_group:
+            return f'{GROUP_ROOM_PREFIX}{self.pk}'
+        return self.room_name_1
+
+    @property
+    def channel_group(self):
+        """Channel group every socket following this chat joins; one group_send reaches all of them"""
+        return f'chat_{self.pk}'
+
+    def recipient_id_for(self, sender_id):
+        """The other user of a two-person chat; group messages have no single recipient"""
+        if self.is_group:
+            return None
+        return self.user_high_id if sender_id == self.user_low_id else self.user_low_id
+
+    def add_members(self, user_ids):
+        """Add users to a group, keeping it within CHAT_GROUP_MAX_MEMBERS and apart from anyone they blocked or who blocked them"""
+        if not self.is_group:
+            raise ValidationError("Members can only be added to group chats.")
+        with transaction.atomic():
+            # Lock the chat so concurrent additions can't overshoot the limit together
+            list(Chat.objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True))
+            member_ids = set(self.participants.values_list('id', flat=True))
+            new_ids = set(user_ids) - member_ids
+            if len(member_ids) + len(new_ids) > settings.CHAT_GROUP_MAX_MEMBERS:
+                raise ValidationError(f"A group can have at most {settings.CHAT_GROUP_MAX_MEMBERS} members.")
+            if new_ids and Block.objects.exists_between(member_ids | new_ids, new_ids):
+                raise ValidationError(BLOCKED_MEMBERS_ERROR)
+            self.participants.add(*new_ids)
+        return new_ids
+
+    def is_managed_by(self, user):
+        """Whether user may manage the group's members: its creator, while still a member"""
+        return (self.is_group and self.created_by_id == user.id
+                and self.participants.filter(id=user.id).exists())
+
+    def hand_over(self, leaving=()):
+        """Pass a group whose creator has left to its longest-standing other member, if any are left"""
+        successor_id = (Chat.participants.through.objects.filter(chat_id=self.pk).exclude(user_id__in=leaving)
+                        .order_by('id').values_list('user_id', flat=True).first())
+        Chat.objects.filter(pk=self.pk).update(created_by_id=successor_id)
+        self.created_by_id = successor_id
+
+    def unread_count_for(self, user):
+        """Unread messages for a participant, read from their maintained counter"""
+        state = self.read_states.filter(user=user).only('unread_count').first()
+        return state.unread_count if state else 0
+
+    def mark_read(self, user, message_id=None):
+        """
+        Advance a participant's read pointer, to the latest message by default.
+        Pointers never move backwards. Reading up to the latest message resets the
+        counter; reading up to an older one subtracts only the messages it newly
+        covers. The latest message is looked up under the read state's row lock,
+        which persist_messages needs for its increment, so a message arriving
+        meanwhile is either seen here or counted after the reset.
+        Once nothing is left unread the chat's message notification is marked read.
+        """
+        if message_id is not None and not self.messages.filter(id=message_id).exists():
+            raise ValidationError("Message does not belong to this chat.")
+
+        with transaction.atomic():
+            state, created = ChatReadState.objects.select_for_update().get_or_create(chat=self, user=user)
+            latest = self.messages.order_by('-id').values_list('id', flat=True).first()
+            if message_id is None:
+                message_id = latest
+            read_up_to = state.last_read_message_id or 0
+            if message_id is None or read_up_to >= message_id:
+                return state, False
+            if message_id == latest:
+                state.unread_count = 0
+            else:
+                newly_read = self.messages.filter(id__gt=read_up_to, id__lte=message_id).exclude(sender=user).count()
+                state.unread_count = max(state.unread_count - newly_read, 0)
+            state.last_read_message_id = message_id
+            state.save(update_fields=['last_read_message', 'unread_count', 'updated_at'])
+            if state.unread_count == 0:
+                # Nothing left unread, so the chat's coalesced message notification is read too
+                mark_chat_read(user.id, self.id)
+        return state, True
+
+    def messages_after(self, seq, limit):
+        """Up to `limit` messages with a sequence number above `seq`, oldest first, from the (chat, seq) index"""
+        return self.messages.filter(seq__gt=seq).order_by('seq')[:limit]
+
     class Meta:
         verbose_name = "Chat"
         verbose_name_plural = "Chats"
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='chat_user_pair_unique'),
+            models.CheckConstraint(condition=models.Q(user_low__lt=models.F('user_high')), name='chat_user_pair_ordered'),
+        ]
 
 
 class ChatMessage(TimeStampedModel):
@@ -47,7 +252,14 @@ class ChatMessage(TimeStampedModel):
     chat = models.ForeignKey(Chat, related_name='messages', on_delete=models.CASCADE)
     sender = models.ForeignKey(User, related_name='sent_messages', on_delete=models.CASCADE)
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Position within the chat, 1, 2, 3, ...; clients resume from the last one they saw
+    seq = models.PositiveBigIntegerField()
+
+    def save(self, *args, **kwargs):
+        if self.seq is None:
+            self.seq = Chat.objects.allocate_seqs(self.chat_id)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.sender.username}: {self.content[:50]}"
@@ -55,4 +267,67 @@ class ChatMessage(TimeStampedModel):
     class Meta:
         verbose_name = "Chat Message"
         verbose_name_plural = "Chat Messages"
-        ordering = ['timestamp']
\ No newline at end of file
+        ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['chat', 'timestamp', 'id'], name='chat_message_history_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['chat', 'seq'], name='chat_message_seq_unique'),
+        ]
+
+
+class ChatReadState(models.Model):
+    """
+    A participant's read pointer in a chat.
+    unread_count is incremented as messages are persisted and reset on read.
+    """
+    chat = models.ForeignKey(Chat, related_name='read_states', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='chat_read_states', on_delete=models.CASCADE)
+    last_read_message = models.ForeignKey(ChatMessage, on_delete=models.SET_NULL, null=True, blank=True,
+                                          related_name='+')
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} read {self.chat_id} up to {self.last_read_message_id}"
+
+    class Meta:
+        verbose_name = "Chat Read State"
+        verbose_name_plural = "Chat Read States"
+        constraints = [
+            models.UniqueConstraint(fields=['chat', 'user'], name='chat_read_state_unique'),
+        ]
+
+class ChatArchiveSegment(models.Model):
+    """
+    Offset index entry for one compressed block of archived messages.
+    Blocks are appended to the chat's segment file and each covers a
+    (timestamp, id) range older than every message still in the table.
+    """
+    chat = models.ForeignKey(Chat, related_name='archive_segments', on_delete=models.CASCADE)
+    offset = models.PositiveBigIntegerField()
+    length = models.PositiveIntegerField()
+    checksum = models.PositiveBigIntegerField()
+    raw_bytes = models.PositiveIntegerField()
+    message_count = models.PositiveIntegerField()
+    first_message_id = models.BigIntegerField()
+    last_message_id = models.BigIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    # Blocks of format 1 carry no seqs, so their range is unknown
+    block_format = models.PositiveSmallIntegerField(default=1)
+    min_seq = models.PositiveBigIntegerField(null=True, blank=True)
+    max_seq = models.PositiveBigIntegerField(null=True, blank=True)
+    # Ids of the block's senders as ',3,7,', so an account purge finds its blocks; null for older blocks
+    senders = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.chat_id} archive @{self.offset} ({self.message_count} messages)"
+
+    class Meta:
+        verbose_name = "Chat Archive Segment"
+        verbose_name_plural = "Chat Archive Segments"
+        indexes = [
+            models.Index(fields=['chat', 'last_timestamp', 'last_message_id'], name='chat_archive_segment_idx'),
+        ]
@@ -0,0 +1,67 @@
+"""
+Keyset pagination for chat history.
+"""
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(message):
+    """Opaque cursor for a message: microsecond timestamp and id"""
+    return f'{(message.timestamp - EPOCH) // MICROSECOND}_{message.id}'
+
+
+def decode_cursor(cursor):
+    try:
+        micros, message_id = cursor.split('_')
+        return EPOCH + int(micros) * MICROSECOND, int(message_id)
+    except (ValueError, OverflowError):
+        raise ValidationError({'before': 'Invalid cursor.'})
+
+
+class MessageHistoryPagination(BasePagination):
+    """
+    ``?before=<cursor>&limit=`` over the (chat, timestamp, id) index.
+    Each page walks backwards from the cursor and is returned oldest first.
+    Once the table runs out, a view with ``archived_messages(before, limit)``
+    continues the page from archived segments.
+    """
+    default_limit = 50
+    max_limit = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        limit = max(1, min(limit, self.max_limit))
+
+        before = request.query_params.get('before')
+        if before:
+            before = decode_cursor(before)
+            timestamp, message_id = before
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+
+        page = list(queryset.order_by('-timestamp', '-id')[:limit + 1])
+        if len(page) <= limit and hasattr(view, 'archived_messages'):
+            oldest = (page[-1].timestamp, page[-1].id) if page else before
+            page += view.archived_messages(oldest, limit + 1 - len(page))
+        self.has_more = len(page) > limit
+        page = page[:limit]
+        page.reverse()
+        self.before = encode_cursor(page[0]) if self.has_more else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'before': self.before,
+            'has_more': self.has_more,
+            'results': data,
+        })
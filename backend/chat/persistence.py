@@ -0,0 +1,274 @@
+"""
+Write-behind persistence for chat messages.
+
+Consumers hand unsaved ChatMessage instances to a per-event-loop buffer that
+writes them with bulk_create once CHAT_FLUSH_BATCH_SIZE messages are pending or
+CHAT_FLUSH_INTERVAL seconds have passed. Flushes are serialized by a FIFO lock
+and each batch is taken in arrival order, so rows are inserted in the order the
+messages were broadcast.
+
+A batch that fails on an operational error (a locked or unreachable database)
+is kept and retried with backoff, up to MAX_FLUSH_RETRIES times. Any other
+failure, or running out of retries, splits the batch: halves are written
+separately and a message that still fails on its own is logged to the
+``chat.persistence.dead_letter`` logger and dropped, so one bad row can never
+hold up every later message.
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+from collections import Counter, OrderedDict, defaultdict
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import F
+
+from notifications.delivery import notify_messages
+
+from .models import Chat, ChatMessage, ChatReadState
+
+logger = logging.getLogger(__name__)
+dead_letter_logger = logging.getLogger(f'{__name__}.dead_letter')
+
+DURABILITY_SYNC = 'sync'
+DURABILITY_BUFFERED = 'buffered'
+
+PREVIEW_LENGTH = 120
+MAX_FLUSH_RETRIES = 5
+# Chats whose seq block one event loop keeps; the least recently used one's leftover becomes a gap
+MAX_SEQ_BLOCKS = 10000
+
+
+def persist_messages(messages):
+    """
+    Insert a batch of messages in order and roll the chat summaries forward.
+    On failure the messages are left as they were passed in, ready to be retried.
+    """
+    unnumbered = [message for message in messages if message.seq is None]
+    try:
+        with transaction.atomic():
+            assign_seqs(messages)
+            created = ChatMessage.objects.bulk_create(messages)
+            update_chat_summaries(created)
+    except Exception:
+        # The rollback undid the seq allocation and the inserts; forget the values they handed out
+        for message in unnumbered:
+            message.seq = None
+        for message in messages:
+            message.pk = None
+            message._state.adding = True
+        raise
+    return created
+
+
+def assign_seqs(messages):
+    """Number any messages that were not given a sequence number before being queued"""
+    unnumbered = defaultdict(list)
+    for message in messages:
+        if message.seq is None:
+            unnumbered[message.chat_id].append(message)
+    for chat_id, chat_messages in unnumbered.items():
+        first = Chat.objects.allocate_seqs(chat_id, len(chat_messages))
+        for offset, message in enumerate(chat_messages):
+            message.seq = first + offset
+
+
+def update_chat_summaries(messages):
+    """
+    Apply a batch to the denormalized chat columns (last-message preview and
+    message count), bump every other member's unread counter and fold the batch
+    into their message notifications.
+    One UPDATE per chat, and one set-based UPDATE over the chat's read states per
+    sender in the batch, however many members the chat has. Read states are
+    created when members join (see chat.signals).
+    """
+    by_chat = defaultdict(list)
+    for message in messages:
+        by_chat[message.chat_id].append(message)
+
+    for chat_id, chat_messages in by_chat.items():
+        last = chat_messages[-1]
+        Chat.objects.filter(pk=chat_id).update(
+            last_message_preview=last.content[:PREVIEW_LENGTH],
+            last_message_at=last.timestamp,
+            last_message_sender_id=last.sender_id,
+            message_count=F('message_count') + len(chat_messages),
+        )
+        for sender_id, count in Counter(message.sender_id for message in chat_messages).items():
+            readers = ChatReadState.objects.filter(chat_id=chat_id).exclude(user_id=sender_id)
+            readers.update(unread_count=F('unread_count') + count)
+            notify_messages(chat_id, sender_id, count, readers.values_list('user_id', flat=True))
+
+
+def persist_salvaging(messages):
+    """
+    Write what can be written of a batch that failed as a whole, keeping its order.
+    Halves are retried recursively; a message failing alone goes to the dead-letter log.
+    Returns the dropped messages.
+    """
+    try:
+        persist_messages(messages)
+        return []
+    except Exception:
+        if len(messages) == 1:
+            message = messages[0]
+            dead_letter_logger.exception("Dropped chat message %s", json.dumps({
+                'chat': message.chat_id,
+                'sender': message.sender_id,
+                'seq': message.seq,
+                'timestamp': message.timestamp.isoformat(),
+                'content': message.content,
+            }))
+            return messages
+    middle = len(messages) // 2
+    return persist_salvaging(messages[:middle]) + persist_salvaging(messages[middle:])
+
+
+class MessageWriteBuffer:
+    """Batches message inserts for one event loop"""
+
+    def __init__(self, batch_size, interval):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []
+        self.failures = 0
+        self._lock = asyncio.Lock()
+        self._timer = None
+
+    async def add(self, message):
+        self.pending.append(message)
+        # While retrying after a failure only the backoff timer flushes
+        if len(self.pending) >= self.batch_size and not self.failures:
+            await self.flush()
+        else:
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            delay = self.interval * 2 ** self.failures
+            self._timer = asyncio.get_running_loop().call_later(delay, self._flush_later)
+
+    def _flush_later(self):
+        self._timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            batch, self.pending = self.pending, []
+            if not batch:
+                return
+            try:
+                await database_sync_to_async(persist_messages)(batch)
+                self.failures = 0
+                return
+            except OperationalError:
+                self.failures += 1
+                if self.failures < MAX_FLUSH_RETRIES:
+                    # Keep the batch at the front so ordering survives the retry
+                    logger.warning("Failed to persist %d chat messages, retry %d", len(batch), self.failures, exc_info=True)
+                    self.pending[:0] = batch
+                    self._schedule()
+                    return
+                logger.exception("Giving up retrying %d chat messages", len(batch))
+            except Exception:
+                logger.exception("Failed to persist %d chat messages", len(batch))
+            self.failures = 0
+            dropped = await database_sync_to_async(persist_salvaging)(batch)
+            if dropped:
+                logger.error("Dropped %d of %d chat messages to the dead-letter log", len(dropped), len(batch))
+            if self.pending:
+                self._schedule()
+
+
+class SeqAllocator:
+    """
+    Hands out message seqs for one event loop from per-chat blocks of
+    CHAT_SEQ_BLOCK_SIZE, each reserved with a single UPDATE, so only one message
+    in a block waits on the database before it can be broadcast.
+    A block is given up once it is `ttl` seconds old, so a seq below one another
+    worker has already used can only be handed out for that long.
+    """
+
+    def __init__(self, block_size, ttl):
+        self.block_size = block_size
+        self.ttl = ttl
+        # chat id -> (next seq, end of block, monotonic expiry)
+        self.blocks = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, chat_id):
+        seq = self._take(chat_id)
+        if seq is None:
+            async with self._lock:
+                seq = self._take(chat_id)
+                if seq is None:
+                    # Timed from before the reservation, which is no later than its commit
+                    expires = time.monotonic() + self.ttl
+                    first = await database_sync_to_async(Chat.objects.allocate_seqs)(chat_id, self.block_size)
+                    # The first seq is ours even if the reservation outlasted the ttl
+                    self.blocks[chat_id] = (first + 1, first + self.block_size, expires)
+                    self.blocks.move_to_end(chat_id)
+                    seq = first
+                    while len(self.blocks) > MAX_SEQ_BLOCKS:
+                        self.blocks.popitem(last=False)
+        return seq
+
+    def _take(self, chat_id):
+        next_seq, end, expires = self.blocks.get(chat_id, (0, 0, 0))
+        if next_seq >= end or time.monotonic() >= expires:
+            return None
+        self.blocks[chat_id] = (next_seq + 1, end, expires)
+        self.blocks.move_to_end(chat_id)
+        return next_seq
+
+
+def seq_settle_delay():
+    """
+    Seconds after a message's timestamp by which every lower seq in its chat is stored
+    or will never be: the lower seq's block was reserved first, so it expired within
+    CHAT_SEQ_BLOCK_TTL, and the write buffer gave up retrying within its backoff.
+    """
+    return settings.CHAT_SEQ_BLOCK_TTL + settings.CHAT_FLUSH_INTERVAL * 2 ** (MAX_FLUSH_RETRIES + 1)
+
+
+def settled_seq(seq, messages, settled_before):
+    """
+    Advance a resume point through `messages` (seq order, all above `seq`) only as far
+    as no lower seq can still arrive: past a seq that follows on directly, or past any
+    gap once the message after it is older than `settled_before`.
+    """
+    for message in messages:
+        if message.seq == seq + 1 or message.timestamp <= settled_before:
+            seq = message.seq
+    return seq
+
+
+_allocators = weakref.WeakKeyDictionary()
+
+
+def get_seq_allocator():
+    """Return the seq allocator bound to the running event loop"""
+    loop = asyncio.get_running_loop()
+    allocator = _allocators.get(loop)
+    if allocator is None:
+        allocator = _allocators[loop] = SeqAllocator(settings.CHAT_SEQ_BLOCK_SIZE, settings.CHAT_SEQ_BLOCK_TTL)
+    return allocator
+
+
+_buffers = weakref.WeakKeyDictionary()
+
+
+def get_write_buffer():
+    """Return the write buffer bound to the running event loop"""
+    loop = asyncio.get_running_loop()
+    buffer = _buffers.get(loop)
+    if buffer is None:
+        buffer = MessageWriteBuffer(settings.CHAT_FLUSH_BATCH_SIZE, settings.CHAT_FLUSH_INTERVAL)
+        _buffers[loop] = buffer
+    return buffer
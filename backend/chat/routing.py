@@ -1,6 +1,8 @@
 from django.urls import re_path, path
-from .consumers import ChatConsumer
+from .consumers import ChatConsumer, UserChatConsumer
 
 websocket_urlpatterns = [
     path('ws/chat/<int:sender_id>_<int:receiver_id>/', ChatConsumer.as_asgi()),
+    # One socket for all of a user's chats
+    path('ws/chat/user/<int:user_id>/', UserChatConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Full-text search over chat messages.
+
+On SQLite messages are indexed in ``chat_message_fts``, an external-content FTS5
+table over ``chat_chatmessage`` kept in sync by triggers, so rows written by the
+consumer, the write-behind buffer or ``bulk_create`` are all indexed without the
+application writing to it. Other backends fall back to ``icontains``.
+"""
+import html
+import re
+
+from django.db import connection
+
+from .models import ChatMessage
+
+# Created with its triggers by migration 0005_chat_message_fts
+FTS_TABLE = 'chat_message_fts'
+
+MAX_TERMS = 8
+SNIPPET_TOKENS = 12
+SNIPPET_LENGTH = 120
+
+# Control characters mark highlights inside SQLite so the snippet can be escaped before adding <mark>
+_OPEN, _CLOSE = '\x02', '\x03'
+_TERM = re.compile(r'\w+')
+
+SEARCH_SQL = f"""
+    SELECT m.id, m.chat_id, m.sender_id, m.content, m.timestamp, u.username AS sender_username,
+           snippet({FTS_TABLE}, 0, '{_OPEN}', '{_CLOSE}', '…', {SNIPPET_TOKENS}) AS snippet
+    FROM {FTS_TABLE}
+    JOIN chat_chatmessage m ON m.id = {FTS_TABLE}.rowid
+    JOIN auth_user u ON u.id = m.sender_id
+    WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid < %s
+    ORDER BY {FTS_TABLE}.rowid DESC
+    LIMIT %s
+"""
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(q, chat_id=None):
+    """
+    Turn user input into an FTS5 query over message content, optionally within one chat.
+    Every term is quoted so operators and column filters in the input are inert;
+    terms are ANDed and the last one matches as a prefix for search-as-you-type.
+    """
+    terms = _TERM.findall(q)[:MAX_TERMS]
+    if not terms:
+        return ''
+    quoted = [f'content:"{term}"' for term in terms]
+    quoted[-1] += '*'
+    if chat_id is not None:
+        quoted.insert(0, f'chat_id:"{int(chat_id)}"')
+    return ' '.join(quoted)
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and wrap matched terms in <mark>"""
+    return html.escape(snippet).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+def search_messages(chat, q, limit=20, before_id=None):
+    """
+    Messages in a chat matching q, newest first, with a highlighted snippet.
+    before_id continues from the last id of a previous page.
+    """
+    match = build_match_query(q, chat.pk)
+    if not match:
+        return []
+    before_id = before_id or 2 ** 63 - 1
+
+    if fts_available():
+        messages = list(ChatMessage.objects.raw(SEARCH_SQL, [match, before_id, limit]))
+        for message in messages:
+            message.snippet = highlight(message.snippet)
+        return messages
+
+    terms = _TERM.findall(q)[:MAX_TERMS]
+    queryset = ChatMessage.objects.filter(chat=chat, id__lt=before_id).select_related('sender')
+    for term in terms:
+        queryset = queryset.filter(content__icontains=term)
+    messages = list(queryset.order_by('-id')[:limit])
+    for message in messages:
+        message.sender_username = message.sender.username
+        message.snippet = html.escape(message.content[:SNIPPET_LENGTH])
+    return messages
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from .models import Chat, ChatMessage
 
 
@@ -9,21 +11,40 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ChatMessage
-        fields = ['id', 'sender', 'sender_username', 'content', 'timestamp']
+        fields = ['id', 'seq', 'sender', 'sender_username', 'content', 'timestamp']
+
+
+class ChatMessageSearchSerializer(serializers.ModelSerializer):
+    """Search hit with an HTML-escaped snippet; matched terms are wrapped in <mark>"""
+    sender_username = serializers.CharField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = ChatMessage
+        fields = ['id', 'sender', 'sender_username', 'timestamp', 'snippet']
+
+
+class ChatParticipantSerializer(serializers.ModelSerializer):
+    """Basic user info for chat participants, with presence passed in through context"""
+    online = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'online']
+
+    def get_online(self, obj):
+        return obj.id in self.context.get('online', ())
 
 
 class ChatSerializer(serializers.ModelSerializer):
-    """Serializer for chats"""
-    participants = serializers.SlugRelatedField(
-        many=True,
-        slug_field='username',
-        queryset=User.objects.all()
-    )
-    messages = ChatMessageSerializer(many=True, read_only=True)
+    """Lightweight chat list entry built from the denormalized summary columns"""
+    participants = ChatParticipantSerializer(many=True, read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Chat
-        fields = ['id', 'participants', 'messages', 'room_name_1']
+        fields = ['id', 'room_name_1', 'room_name', 'is_group', 'name', 'participants', 'last_message_preview',
+                  'last_message_at', 'last_message_sender', 'unread_count']
 
 
 class ChatCreateSerializer(serializers.ModelSerializer):
@@ -43,20 +64,43 @@ class ChatCreateSerializer(serializers.ModelSerializer):
         except User.DoesNotExist:
             raise serializers.ValidationError("Specified user does not exist")
 
-        # Check if chat already exists between these users
-        participant_ids = sorted([str(user.id), str(participant.id)])
-        room_name_1 = '_'.join(participant_ids)
-        room_name_2 = '_'.join(participant_ids[::-1])
+        if participant.id == user.id:
+            raise serializers.ValidationError("You cannot start a chat with yourself")
 
-        existing_chat = Chat.objects.filter(
-            models.Q(room_name_1=room_name_1) |
-            models.Q(room_name_2=room_name_2)
-        ).first()
+        # Returns the existing chat between these users if there is one
+        chat, _ = Chat.objects.get_or_create_pair(user, participant)
+        return chat
 
-        if existing_chat:
-            return existing_chat
 
-        # Create new chat
-        chat = Chat.objects.create()
-        chat.participants.add(user, participant)
-        return chat
\ No newline at end of file
+class ChatGroupMembersSerializer(serializers.Serializer):
+    """User ids to add to a group; they must all exist"""
+    user_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False,
+                                     max_length=settings.CHAT_GROUP_MAX_MEMBERS)
+
+    def validate_user_ids(self, value):
+        user_ids = set(value)
+        if User.objects.filter(id__in=user_ids).count() != len(user_ids):
+            raise serializers.ValidationError("Some of these users do not exist")
+        return user_ids
+
+
+class ChatGroupSerializer(serializers.ModelSerializer):
+    """Serializer for creating a group chat; the requesting user is always a member"""
+    member_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True, allow_empty=False,
+                                       max_length=settings.CHAT_GROUP_MAX_MEMBERS)
+
+    class Meta:
+        model = Chat
+        fields = ['id', 'name', 'room_name', 'member_ids']
+        read_only_fields = ['room_name']
+
+    def validate_member_ids(self, value):
+        return ChatGroupMembersSerializer().validate_user_ids(value)
+
+    def create(self, validated_data):
+        try:
+            return Chat.objects.create_group(
+                self.context['request'].user, validated_data['member_ids'], validated_data.get('name', '')
+            )
+        except ValidationError as e:
+            raise serializers.ValidationError(e.messages)
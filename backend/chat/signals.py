@@ -0,0 +1,72 @@
+import os
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .archive import segment_path
+from .consumers import user_group_name
+from .models import Chat, ChatReadState
+
+
+@receiver(post_delete, sender=Chat)
+def remove_archive_segment(sender, instance, **kwargs):
+    """Delete a chat's segment file once the chat is gone for good"""
+    path = segment_path(instance.pk)
+
+    def remove():
+        if os.path.exists(path):
+            os.remove(path)
+
+    transaction.on_commit(remove)
+
+
+@receiver(m2m_changed, sender=Chat.participants.through)
+def sync_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Give new members a read state, so unread counters can be bumped for the whole
+    chat in one statement, and move open per-user sockets in or out of the chat.
+    Groups whose creator left are handed to their longest-standing member.
+    Changes from either side of the relation, including clear(), are covered.
+    """
+    if action == 'pre_clear':
+        # post_clear has no pk_set, so note who is about to go
+        related = instance.chats if reverse else instance.participants
+        instance._cleared_pks = set(related.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        action, pk_set = 'post_remove', instance.__dict__.pop('_cleared_pks', None)
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    if reverse:
+        memberships = [(chat_id, instance.pk) for chat_id in pk_set]
+    else:
+        memberships = [(instance.pk, user_id) for user_id in pk_set]
+
+    if action == 'post_add':
+        ChatReadState.objects.bulk_create(
+            [ChatReadState(chat_id=chat_id, user_id=user_id) for chat_id, user_id in memberships],
+            ignore_conflicts=True,
+        )
+        event_type = 'chat.subscribe'
+    else:
+        if reverse:
+            ChatReadState.objects.filter(user_id=instance.pk, chat_id__in=pk_set).delete()
+        else:
+            ChatReadState.objects.filter(chat_id=instance.pk, user_id__in=pk_set).delete()
+        orphaned = Q()
+        for chat_id, user_id in memberships:
+            orphaned |= Q(pk=chat_id, created_by_id=user_id)
+        for chat in Chat.objects.filter(orphaned, is_group=True):
+            chat.hand_over()
+        event_type = 'chat.unsubscribe'
+
+    def notify():
+        channel_layer = get_channel_layer()
+        for chat_id, user_id in memberships:
+            async_to_sync(channel_layer.group_send)(user_group_name(user_id), {'type': event_type, 'chat': chat_id})
+
+    transaction.on_commit(notify)
@@ -1,3 +1,258 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from Ani_Tinder.asgi import application
+from blocks.models import Block
+
+from .models import Chat, ChatMessage, ChatReadState
+from .persistence import SeqAllocator, persist_messages
+
+
+class ChatReadTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.chat, _ = Chat.objects.get_or_create_pair(self.alice.id, self.bob.id)
+
+    def send(self, sender, *contents):
+        return persist_messages([ChatMessage(chat=self.chat, sender=sender, content=content) for content in contents])
+
+    def unread(self, user):
+        return ChatReadState.objects.get(chat=self.chat, user=user).unread_count
+
+    def test_partial_reads_subtract_what_they_cover(self):
+        first, _, third, _ = self.send(self.alice, 'a', 'b', 'c', 'd')
+        self.send(self.bob, 'mine')
+        self.assertEqual(self.unread(self.bob), 4)
+
+        self.chat.mark_read(self.bob, first.id)
+        self.assertEqual(self.unread(self.bob), 3)
+        # A drifted counter is never taken below zero
+        ChatReadState.objects.filter(chat=self.chat, user=self.bob).update(unread_count=1)
+        self.chat.mark_read(self.bob, first.id + 1)
+        self.assertEqual(self.unread(self.bob), 0)
+        ChatReadState.objects.filter(chat=self.chat, user=self.bob).update(unread_count=2)
+
+        self.chat.mark_read(self.bob, third.id)
+        self.assertEqual(self.unread(self.bob), 1)
+
+    def test_reading_to_the_latest_resets_the_counter(self):
+        self.send(self.alice, 'a', 'b')
+
+        state, advanced = self.chat.mark_read(self.bob)
+
+        self.assertTrue(advanced)
+        self.assertEqual(self.unread(self.bob), 0)
+
+    def test_pointer_never_moves_backwards(self):
+        first, second = self.send(self.alice, 'a', 'b')
+        self.chat.mark_read(self.bob, second.id)
+
+        state, advanced = self.chat.mark_read(self.bob, first.id)
+
+        self.assertFalse(advanced)
+        self.assertEqual(state.last_read_message_id, second.id)
+
+
+class ChatGroupMembersTests(APITestCase):
+    def setUp(self):
+        self.owner, self.first, self.second, self.outsider = (
+            User.objects.create_user(name) for name in ('owner', 'first', 'second', 'outsider')
+        )
+        self.group = Chat.objects.create_group(self.owner, [self.first.id])
+        self.group.participants.add(self.second)
+
+    def members_url(self, user_id=None):
+        url = f'/api/chat/groups/{self.group.id}/members/'
+        return f'{url}{user_id}/' if user_id else url
+
+    def test_creator_who_left_hands_the_group_over(self):
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.delete(self.members_url(self.owner.id)).status_code, 204)
+
+        response = self.client.post(self.members_url(), {'user_ids': [self.outsider.id]}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.delete(self.members_url(self.first.id)).status_code, 403)
+
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.created_by, self.first)
+        self.client.force_authenticate(self.first)
+        response = self.client.post(self.members_url(), {'user_ids': [self.outsider.id]}, format='json')
+        self.assertEqual(response.data, {'added': [self.outsider.id]})
+
+    def test_creator_who_is_no_longer_a_member_cannot_manage(self):
+        # Left before hand-over existed, so the group still names them
+        Chat.participants.through.objects.filter(chat=self.group, user=self.owner).delete()
+
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(self.members_url(), {'user_ids': [self.outsider.id]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_blocked_pairs_cannot_be_grouped(self):
+        Block.objects.block(self.outsider, self.second)
+        self.client.force_authenticate(self.owner)
+
+        response = self.client.post(self.members_url(), {'user_ids': [self.outsider.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.group.participants.filter(id=self.outsider.id).exists())
+
+        response = self.client.post('/api/chat/groups/', {'member_ids': [self.second.id, self.outsider.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Chat.objects.filter(is_group=True).exclude(pk=self.group.pk).exists())
+
+        response = self.client.post('/api/chat/groups/', {'member_ids': [self.outsider.id]}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_clearing_members_drops_their_read_states(self):
+        self.group.participants.clear()
+
+        self.assertFalse(ChatReadState.objects.filter(chat=self.group).exists())
+        self.group.refresh_from_db()
+        self.assertIsNone(self.group.created_by)
+
+    def test_leaving_from_the_user_side_is_synced(self):
+        self.owner.chats.remove(self.group)
+
+        self.assertFalse(ChatReadState.objects.filter(chat=self.group, user=self.owner).exists())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.created_by, self.first)
+
+
+class ChatSearchTests(APITestCase):
+    """Messages written after every migration has run are searchable, edits and deletes included"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.chat, _ = Chat.objects.get_or_create_pair(self.alice.id, self.bob.id)
+        self.client.force_authenticate(self.alice)
+
+    def search(self, q):
+        response = self.client.get(f'/api/chat/{self.chat.room_name}/search/', {'q': q})
+        return [result['id'] for result in response.data['results']]
+
+    def test_fts_triggers_survive_the_migrations(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Full-text search triggers are SQLite-only')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'chat_message_fts_%'")
+            triggers = {name for (name,) in cursor.fetchall()}
+        self.assertEqual(triggers, {'chat_message_fts_ai', 'chat_message_fts_ad', 'chat_message_fts_au'})
+
+    def test_new_messages_are_searchable(self):
+        message, other = persist_messages([
+            ChatMessage(chat=self.chat, sender=self.bob, content='watching frieren tonight'),
+            ChatMessage(chat=self.chat, sender=self.alice, content='see you later'),
+        ])
+        self.assertEqual(self.search('frieren'), [message.id])
+
+        ChatMessage.objects.filter(pk=message.pk).update(content='watching mushishi tonight')
+        self.assertEqual(self.search('frieren'), [])
+        self.assertEqual(self.search('mushishi'), [message.id])
+
+        other.delete()
+        self.assertEqual(self.search('later'), [])
+
+
+class ChatResumeTests(TransactionTestCase):
+    """Seqs from two workers' blocks interleave; resuming never skips one that is stored late"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.chat, _ = Chat.objects.get_or_create_pair(self.alice.id, self.bob.id)
+        self.token = Token.objects.create(user=self.alice).key
+
+    def store(self, *seqs):
+        persist_messages([ChatMessage(chat=self.chat, sender=self.bob, content=str(seq), seq=seq) for seq in seqs])
+
+    def resume(self, resume_from):
+        """The seqs replayed after `resume_from` and the seq the client is told to resume from next"""
+        async def replay():
+            socket = WebsocketCommunicator(
+                application, f'/ws/chat/{self.alice.id}_{self.bob.id}/?token={self.token}&resume_from={resume_from}'
+            )
+            await socket.connect()
+            frames = [await socket.receive_json_from()]
+            while frames[-1].get('type') != 'resumed':
+                frames.append(await socket.receive_json_from())
+            await socket.disconnect()
+            return [frame['seq'] for frame in frames[:-1]], frames[-1]['seq']
+
+        return async_to_sync(replay)()
+
+    def test_resume_point_waits_for_the_other_workers_block(self):
+        async def allocate():
+            first, second = SeqAllocator(32, ttl=60), SeqAllocator(32, ttl=60)
+            return [await allocator.allocate(self.chat.id) for allocator in (first, second, second, first)]
+
+        low, high, higher, next_low = async_to_sync(allocate)()
+        self.assertEqual((low, high, higher, next_low), (1, 33, 34, 2))
+
+        # The second worker flushed first; the first worker's seqs are still buffered
+        self.store(high, higher)
+        self.assertEqual(self.resume(0), ([33, 34], 0))
+
+        self.store(low)
+        self.assertEqual(self.resume(0), ([1, 33, 34], 1))
+        self.store(next_low)
+        self.assertEqual(self.resume(1), ([2, 33, 34], 2))
+
+        # Long after 33 was sent, nothing below it can still arrive
+        ChatMessage.objects.filter(seq__in=(high, higher)).update(timestamp=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.resume(2), ([33, 34], 34))
+
+    def test_expired_blocks_are_given_up(self):
+        async def allocate():
+            allocator = SeqAllocator(32, ttl=0)
+            return [await allocator.allocate(self.chat.id) for _ in range(2)]
+
+        self.assertEqual(async_to_sync(allocate)(), [1, 33])
+
+
+class ChatConsumerFrameTests(TransactionTestCase):
+    """Malformed frames get an error frame and leave the socket usable"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.chat, _ = Chat.objects.get_or_create_pair(self.alice.id, self.bob.id)
+        self.token = Token.objects.create(user=self.alice).key
+
+    def test_pair_socket_survives_bad_frames(self):
+        async def exchange():
+            socket = WebsocketCommunicator(application, f'/ws/chat/{self.alice.id}_{self.bob.id}/?token={self.token}')
+            await socket.connect()
+            replies = []
+            for frame in ('not json', '[1, 2]', '{"sender": 2}', '{"content": 5}'):
+                await socket.send_to(text_data=frame)
+                replies.append((await socket.receive_json_from())['error'])
+            await socket.send_json_to({'content': 'still here'})
+            message = await socket.receive_json_from()
+            await socket.disconnect()
+            return replies, message
+
+        replies, message = async_to_sync(exchange)()
+        self.assertEqual(replies, ['Malformed frame'] * 2 + ['Message content is required'] * 2)
+        self.assertEqual(message['message'], 'still here')
+
+    def test_user_socket_requires_message_content(self):
+        async def exchange():
+            socket = WebsocketCommunicator(application, f'/ws/chat/user/{self.alice.id}/?token={self.token}')
+            await socket.connect()
+            await socket.send_json_to({'type': 'subscribe', 'chat': self.chat.id})
+            await socket.receive_json_from()
+            await socket.send_json_to({'type': 'message', 'chat': self.chat.id})
+            reply = await socket.receive_json_from()
+            await socket.disconnect()
+            return reply
+
+        self.assertEqual(async_to_sync(exchange)(), {'type': 'error', 'chat': self.chat.id, 'error': 'Message content is required'})
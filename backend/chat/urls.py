@@ -6,5 +6,11 @@ app_name = 'chat'
 urlpatterns = [
     path('', views.ChatListView.as_view(), name='chat_list'),
     path('messages/<str:room_name>/', views.ChatMessageListView.as_view(), name='chat_messages'),
+    path('<str:room_name>/read/', views.ChatReadView.as_view(), name='chat_read'),
+    path('<str:room_name>/search/', views.ChatMessageSearchView.as_view(), name='chat_search'),
+    path('metrics/', views.ChatMetricsView.as_view(), name='chat_metrics'),
     path('create/', views.ChatCreateView.as_view(), name='chat_create'),
+    path('groups/', views.ChatGroupCreateView.as_view(), name='chat_group_create'),
+    path('groups/<int:pk>/members/', views.ChatGroupMembersView.as_view(), name='chat_group_members'),
+    path('groups/<int:pk>/members/<int:user_id>/', views.ChatGroupMembersView.as_view(), name='chat_group_member'),
 ]
\ No newline at end of file
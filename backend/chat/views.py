@@ -1,12 +1,26 @@
-from django.db import models
+from django.db.models import F, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.shortcuts import get_object_or_404
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from core.permissions import IsParticipant
+from core.presence import presence
 
-from .models import Chat, ChatMessage
-from .serializers import ChatSerializer, ChatMessageSerializer, ChatCreateSerializer
+from .archive import read_archived
+from .backpressure import counters as backpressure_counters
+from .models import Chat, ChatMessage, ChatReadState
+from .pagination import MessageHistoryPagination
+from .search import search_messages
+from .serializers import (
+    ChatSerializer, ChatMessageSerializer, ChatMessageSearchSerializer, ChatCreateSerializer, ChatGroupSerializer,
+    ChatGroupMembersSerializer,
+)
 
 
 class ChatListView(generics.ListAPIView):
@@ -15,9 +29,23 @@ class ChatListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        """Get all chats where the current user is a participant"""
+        """Get all chats where the current user is a participant, most recent first"""
         user = self.request.user
-        return Chat.objects.filter(participants=user)
+        unread = ChatReadState.objects.filter(chat=OuterRef('pk'), user=user).values('unread_count')[:1]
+        return Chat.objects.filter(participants=user).defer('message_count').annotate(
+            unread_count=Coalesce(Subquery(unread), Value(0))
+        ).prefetch_related(
+            Prefetch('participants', queryset=User.objects.only('id', 'username'))
+        ).order_by(F('last_message_at').desc(nulls_last=True), '-id')
+
+    def list(self, request, *args, **kwargs):
+        chats = list(self.get_queryset())
+        user_ids = {participant.id for chat in chats for participant in chat.participants.all()}
+        serializer = self.get_serializer(chats, many=True, context={
+            **self.get_serializer_context(),
+            'online': presence.online(user_ids),
+        })
+        return Response(serializer.data)
 
 
 class ChatCreateView(generics.CreateAPIView):
@@ -29,22 +57,143 @@ class ChatCreateView(generics.CreateAPIView):
         serializer.save(user=self.request.user)
 
 
+class ChatGroupCreateView(generics.CreateAPIView):
+    """Create a group chat with the current user as its creator"""
+    serializer_class = ChatGroupSerializer
+    permission_classes = [IsAuthenticated]
+
+
+class ChatGroupMembersView(APIView):
+    """
+    Add members to a group (its creator only) or remove one (the creator, or members leaving).
+    A creator who leaves hands the group to its longest-standing member (see chat.signals).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        chat = get_object_or_404(Chat, pk=pk, is_group=True)
+        if not chat.is_managed_by(request.user):
+            return Response({"error": "Only the group's creator can add members"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = ChatGroupMembersSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            added = chat.add_members(serializer.validated_data['user_ids'])
+        except ValidationError as e:
+            return Response({"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'added': sorted(added)})
+
+    def delete(self, request, pk, user_id):
+        chat = get_object_or_404(Chat, pk=pk, is_group=True)
+        if request.user.id != user_id and not chat.is_managed_by(request.user):
+            return Response({"error": "You can only remove yourself"}, status=status.HTTP_403_FORBIDDEN)
+        if not chat.participants.filter(id=user_id).exists():
+            return Response({"error": "Not a member of this group"}, status=status.HTTP_404_NOT_FOUND)
+        chat.participants.remove(user_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class ChatMessageListView(generics.ListAPIView):
-    """List all messages in a chat"""
+    """List a chat's messages, newest page first, with ?before=<cursor>&limit="""
     serializer_class = ChatMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageHistoryPagination
 
     def get_queryset(self):
-        """Get all messages for a specific chat room"""
+        """Get messages for a specific chat room"""
         room_name = self.kwargs['room_name']
+        self.chat = None
         try:
             # Find the chat by either room name
-            chat = Chat.objects.get(models.Q(room_name_1=room_name) | models.Q(room_name_2=room_name))
+            chat = Chat.objects.for_room(room_name).get()
 
             # Check if the user is a participant
-            if self.request.user not in chat.participants.all():
+            if not chat.participants.filter(id=self.request.user.id).exists():
                 return ChatMessage.objects.none()
 
-            return ChatMessage.objects.filter(chat=chat).order_by('timestamp')
+            # Loading the latest page counts as reading the chat
+            if 'before' not in self.request.query_params:
+                chat.mark_read(self.request.user)
+
+            self.chat = chat
+
+            return ChatMessage.objects.filter(chat=chat).select_related('sender').only(
+                'id', 'seq', 'chat', 'sender', 'content', 'timestamp', 'sender__username'
+            )
         except Chat.DoesNotExist:
-            return ChatMessage.objects.none()
\ No newline at end of file
+            return ChatMessage.objects.none()
+
+    def archived_messages(self, before, limit):
+        """Older messages from the chat's archive once the table runs out"""
+        if self.chat is None:
+            return []
+        return read_archived(self.chat.pk, before, limit)
+
+
+class ChatReadView(APIView):
+    """Mark a chat read up to a message (the latest by default) and broadcast a read receipt"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, room_name):
+        chat = get_object_or_404(Chat.objects.for_room(room_name))
+        if not chat.participants.filter(id=request.user.id).exists():
+            return Response({"error": "You are not a participant of this chat"}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            state, advanced = chat.mark_read(request.user, request.data.get('message_id'))
+        except (ValidationError, ValueError, TypeError):
+            return Response({"error": "Invalid message_id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if advanced:
+            async_to_sync(get_channel_layer().group_send)(
+                chat.channel_group,
+                {
+                    'type': 'read_receipt',
+                    'chat': chat.id,
+                    'user': request.user.id,
+                    'message_id': state.last_read_message_id,
+                    'read_at': state.updated_at.isoformat(),
+                }
+            )
+
+        return Response({
+            'last_read_message_id': state.last_read_message_id,
+            'unread_count': state.unread_count,
+        })
+
+
+class ChatMessageSearchView(APIView):
+    """Full-text search within one of the user's chats with ?q=&before=<id>&limit="""
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request, room_name):
+        chat = get_object_or_404(Chat.objects.for_room(room_name).filter(participants=request.user))
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+            before = int(request.query_params['before']) if 'before' in request.query_params else None
+        except ValueError:
+            return Response({"error": "limit and before must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"error": "limit must be positive"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Fetch one extra row to know whether another page exists
+        messages = search_messages(chat, request.query_params.get('q', ''), limit + 1, before)
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        return Response({
+            'before': messages[-1].id if has_more else None,
+            'has_more': has_more,
+            'results': ChatMessageSearchSerializer(messages, many=True).data,
+        })
+
+
+class ChatMetricsView(APIView):
+    """Websocket backpressure counters for this worker process"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            key: backpressure_counters[key]
+            for key in ('throttled', 'oversize', 'dropped', 'closed_slow', 'closed_oversize')
+        })
@@ -0,0 +1,110 @@
+"""
+Wire formats for the per-user chat socket.
+
+Clients that offer the ``anitinder.msgpack.v1`` subprotocol get binary frames;
+everyone else keeps one JSON object per text frame. A binary frame is a
+MessagePack array of entries, so several events can share one frame:
+
+    [0, chat_id, sender_id, receiver_id, timestamp_ms, text, seq]   chat message
+    [1, {...}]                                                      any other event, as in JSON
+
+Messages are positional and carry integer epoch milliseconds instead of an ISO
+string, which is where most of the JSON size goes. Pending entries are flushed
+after CHAT_BATCH_WINDOW seconds or once CHAT_BATCH_MAX_EVENTS are waiting.
+Binary clients send MessagePack maps shaped like the JSON frames.
+"""
+import asyncio
+import json
+
+import msgpack
+from django.conf import settings
+
+SUBPROTOCOL_MSGPACK = 'anitinder.msgpack.v1'
+
+ENTRY_MESSAGE = 0
+ENTRY_EVENT = 1
+
+
+def message_entry(event):
+    return [ENTRY_MESSAGE, event['chat'], event['sender'], event['receiver'], event['ts'], event['message'],
+            event['seq']]
+
+
+def message_payload(event):
+    return {
+        'type': 'message',
+        'chat': event['chat'],
+        'message': event['message'],
+        'sender': event['sender'],
+        'receiver': event['receiver'],
+        'timestamp': event['timestamp'],
+        'seq': event['seq']
+    }
+
+
+def encode_frame(entries):
+    return msgpack.packb(entries, use_bin_type=True)
+
+
+def decode_frame(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+class WireFormatMixin:
+    """Subprotocol negotiation, encoding and batching for a consumer's outbound events"""
+    binary = False
+
+    def negotiate_subprotocol(self):
+        """The subprotocol to accept, if the client offered one we speak"""
+        if SUBPROTOCOL_MSGPACK in self.scope.get('subprotocols', ()):
+            self.binary = True
+            self.pending = []
+            self.flush_task = None
+            return SUBPROTOCOL_MSGPACK
+        return None
+
+    def decode_inbound(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            data = decode_frame(bytes_data)
+        else:
+            data = json.loads(text_data)
+        if not isinstance(data, dict):
+            raise ValueError('Frames must be objects')
+        return data
+
+    async def send_payload(self, payload):
+        if self.binary:
+            await self.queue_entry([ENTRY_EVENT, payload])
+        else:
+            await self.send(text_data=json.dumps(payload))
+
+    async def send_message_event(self, event):
+        if self.binary:
+            await self.queue_entry(message_entry(event))
+        else:
+            await self.send(text_data=json.dumps(message_payload(event)))
+
+    async def queue_entry(self, entry):
+        self.pending.append(entry)
+        window = settings.CHAT_BATCH_WINDOW
+        if not window or len(self.pending) >= settings.CHAT_BATCH_MAX_EVENTS:
+            await self.flush_pending()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later(window))
+
+    async def flush_later(self, window):
+        await asyncio.sleep(window)
+        self.flush_task = None
+        await self.flush_pending()
+
+    async def flush_pending(self):
+        if self.flush_task is not None and self.flush_task is not asyncio.current_task():
+            self.flush_task.cancel()
+        self.flush_task = None
+        if self.pending:
+            entries, self.pending = self.pending, []
+            await self.send(bytes_data=encode_frame(entries))
+
+    def cancel_pending(self):
+        if self.binary and self.flush_task is not None:
+            self.flush_task.cancel()
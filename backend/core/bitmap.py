@@ -0,0 +1,139 @@
+"""
+Compressed bitmaps of non-negative integer ids, roaring style.
+
+Ids are split into chunks of 2**16 by their high bits. In memory each chunk is a
+Python int used as a bitset, so unions and differences are a handful of big-int
+operations however many ids they cover. When serialized, each chunk is stored
+either as a sorted array of its low 16 bits (2 bytes per id) or as a raw
+8 KiB bitset, whichever is smaller, so a sparse set of a few hundred ids takes a
+few hundred bytes and a dense one never more than 8 KiB per chunk.
+"""
+import struct
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+LOW_MASK = CHUNK_SIZE - 1
+BITSET_BYTES = CHUNK_SIZE // 8
+# Past this many ids a raw bitset is smaller than an array of 16-bit lows
+ARRAY_MAX = BITSET_BYTES // 2
+
+FORMAT_VERSION = 1
+KIND_ARRAY = 0
+KIND_BITSET = 1
+
+_HEADER = struct.Struct('<BI')
+_CHUNK_HEADER = struct.Struct('<IBI')
+
+
+class Bitmap:
+    """A set of ids backed by per-chunk bitsets"""
+
+    __slots__ = ('chunks',)
+
+    def __init__(self, ids=()):
+        # Set bits in per-chunk byte buffers; OR-ing into big ints one id at a time is quadratic
+        buffers = {}
+        for id in ids:
+            high, low = id >> CHUNK_BITS, id & LOW_MASK
+            buffer = buffers.get(high)
+            if buffer is None:
+                buffer = buffers[high] = bytearray(BITSET_BYTES)
+            buffer[low >> 3] |= 1 << (low & 7)
+        self.chunks = {high: int.from_bytes(buffer, 'little') for high, buffer in buffers.items()}
+
+    def add(self, id):
+        """Add an id; returns True if it was not already present"""
+        high, bit = id >> CHUNK_BITS, 1 << (id & LOW_MASK)
+        chunk = self.chunks.get(high, 0)
+        if chunk & bit:
+            return False
+        self.chunks[high] = chunk | bit
+        return True
+
+    def discard(self, id):
+        """Remove an id; returns True if it was present"""
+        high, bit = id >> CHUNK_BITS, 1 << (id & LOW_MASK)
+        chunk = self.chunks.get(high, 0)
+        if not chunk & bit:
+            return False
+        chunk &= ~bit
+        if chunk:
+            self.chunks[high] = chunk
+        else:
+            del self.chunks[high]
+        return True
+
+    def __contains__(self, id):
+        return bool(self.chunks.get(id >> CHUNK_BITS, 0) >> (id & LOW_MASK) & 1)
+
+    def __len__(self):
+        return sum(chunk.bit_count() for chunk in self.chunks.values())
+
+    def __iter__(self):
+        for high in sorted(self.chunks):
+            base = high << CHUNK_BITS
+            for low in _set_bits(self.chunks[high]):
+                yield base | low
+
+    def __eq__(self, other):
+        return isinstance(other, Bitmap) and self.chunks == other.chunks
+
+    def difference(self, other):
+        """Ids in this bitmap and not in `other`, as a new Bitmap"""
+        result = Bitmap()
+        for high, chunk in self.chunks.items():
+            chunk &= ~other.chunks.get(high, 0)
+            if chunk:
+                result.chunks[high] = chunk
+        return result
+
+    def to_bytes(self):
+        parts = [_HEADER.pack(FORMAT_VERSION, len(self.chunks))]
+        for high in sorted(self.chunks):
+            chunk = self.chunks[high]
+            count = chunk.bit_count()
+            if count <= ARRAY_MAX:
+                parts.append(_CHUNK_HEADER.pack(high, KIND_ARRAY, count))
+                parts.append(struct.pack(f'<{count}H', *_set_bits(chunk)))
+            else:
+                parts.append(_CHUNK_HEADER.pack(high, KIND_BITSET, count))
+                parts.append(chunk.to_bytes(BITSET_BYTES, 'little'))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        bitmap = cls()
+        if not data:
+            return bitmap
+        data = bytes(data)
+        version, chunk_count = _HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported bitmap format {version}")
+        offset = _HEADER.size
+        for _ in range(chunk_count):
+            high, kind, count = _CHUNK_HEADER.unpack_from(data, offset)
+            offset += _CHUNK_HEADER.size
+            if kind == KIND_ARRAY:
+                buffer = bytearray(BITSET_BYTES)
+                for low in struct.unpack_from(f'<{count}H', data, offset):
+                    buffer[low >> 3] |= 1 << (low & 7)
+                chunk = int.from_bytes(buffer, 'little')
+                offset += 2 * count
+            else:
+                chunk = int.from_bytes(data[offset:offset + BITSET_BYTES], 'little')
+                offset += BITSET_BYTES
+            if chunk:
+                bitmap.chunks[high] = chunk
+        return bitmap
+
+
+def _set_bits(chunk):
+    """Positions of the set bits of a chunk, ascending"""
+    # Reversed binary digits put bit i at index i; str.find does the scanning in C
+    digits = bin(chunk)[:1:-1]
+    positions = []
+    position = digits.find('1')
+    while position != -1:
+        positions.append(position)
+        position = digits.find('1', position + 1)
+    return positions
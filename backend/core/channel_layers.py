@@ -0,0 +1,352 @@
+"""
+Channel layer that shares groups between ASGI worker processes on one host.
+
+Workers connect to a small broker (``manage.py run_channel_broker``) over a Unix
+socket. Each worker keeps the queues of its own process-specific channels in
+memory; the broker only tracks group membership and forwards ``group_send`` and
+cross-process ``send`` to the worker that owns each channel, one frame per
+worker no matter how many of its channels are in the group.
+
+Frames are a 4-byte length followed by a JSON object, so messages must be JSON
+serializable. Only process-specific (``!``) channels can be received on. A frame
+whose body can't be decoded is logged and skipped; the length prefix keeps the
+stream in step, so it doesn't cost the connection. Frames the broker drops for a
+worker that has fallen too far behind are counted and logged.
+
+Each worker keeps its own record of the groups its channels are in. When the
+receiving connection drops (say the broker restarted) the worker reconnects in
+the background and sends ``hello`` and every ``group_add`` again.
+"""
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+import uuid
+import weakref
+from collections import Counter, defaultdict, deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+_HEADER = struct.Struct('!I')
+
+logger = logging.getLogger(__name__)
+
+# Stop writing to a worker whose socket buffer is this far behind
+MAX_WORKER_BACKLOG = 8 * 1024 * 1024
+# Log a backlogged worker's first dropped frame and then every this many
+DROP_LOG_EVERY = 1000
+# Longest wait between attempts to reach a broker that went away
+RECONNECT_MAX_DELAY = 5
+
+
+class MalformedFrame(ValueError):
+    """A frame whose body was read in full but isn't a valid message"""
+
+
+async def read_frame(reader):
+    """Next frame as a dict; raises MalformedFrame once its body has been consumed"""
+    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    data = await reader.readexactly(length)
+    try:
+        frame = json.loads(data)
+    except ValueError as e:
+        raise MalformedFrame(str(e)) from e
+    if not isinstance(frame, dict):
+        raise MalformedFrame(f'expected an object, got {type(frame).__name__}')
+    return frame
+
+
+def write_frame(writer, payload):
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    writer.write(_HEADER.pack(len(data)) + data)
+
+
+def channel_owner(channel):
+    """Worker prefix of a process-specific channel name, or None for normal channels"""
+    if '!' not in channel:
+        return None
+    return channel[:channel.index('!')].rsplit('.', 1)[-1]
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    """Channel layer client used by each ASGI worker"""
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = path
+        self.group_expiry = group_expiry
+        self.client_prefix = uuid.uuid4().hex[:16]
+        self.queues = {}
+        # group -> this worker's channels in it, replayed to the broker on reconnect
+        self.groups = defaultdict(set)
+        self.frames_malformed = 0
+        self._connections = weakref.WeakKeyDictionary()
+        self._connection_locks = weakref.WeakKeyDictionary()
+
+    # Broker connection
+
+    async def _connection(self, receiving=False):
+        """
+        Connection for the running event loop.
+        Only a loop that receives registers as the owner of this worker's channels,
+        so short-lived loops (e.g. async_to_sync in views) can still send.
+        Registering also re-adds the worker's group memberships, which a restarted
+        broker no longer has.
+        """
+        loop = asyncio.get_running_loop()
+        connection = self._connections.get(loop)
+        if connection is None or connection['writer'].is_closing():
+            lock = self._connection_locks.setdefault(loop, asyncio.Lock())
+            async with lock:
+                connection = self._connections.get(loop)
+                if connection is None or connection['writer'].is_closing():
+                    reader, writer = await asyncio.open_unix_connection(self.path)
+                    connection = {'writer': writer, 'registered': False, 'closed': False, 'acks': deque()}
+                    connection['task'] = asyncio.ensure_future(self._read_frames(reader, connection))
+                    self._connections[loop] = connection
+        if receiving and not connection['registered']:
+            connection['registered'] = True
+            await self._request(connection, {'op': 'hello', 'prefix': self.client_prefix})
+            # Written back to back, so they stay ahead of any later group_discard on this connection
+            await asyncio.gather(*(
+                self._request(connection, {'op': 'group_add', 'group': group, 'channel': channel})
+                for group, channels in list(self.groups.items()) for channel in list(channels)
+            ))
+        return connection
+
+    async def _reconnect(self):
+        """Re-register the receiving loop once the broker is back, so frames routed to this worker reach it"""
+        delay = 0.1
+        while True:
+            try:
+                await self._connection(receiving=True)
+                return
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _send_frame(self, payload):
+        """Fire-and-forget frame; ordering is still preserved per connection"""
+        connection = await self._connection()
+        write_frame(connection['writer'], payload)
+        await connection['writer'].drain()
+
+    async def _request(self, connection, payload):
+        """Frame the broker acknowledges once applied, so later frames on any connection see it"""
+        ack = asyncio.get_running_loop().create_future()
+        connection['acks'].append(ack)
+        write_frame(connection['writer'], payload)
+        await connection['writer'].drain()
+        await ack
+
+    async def _read_frames(self, reader, connection):
+        try:
+            while True:
+                try:
+                    frame = await read_frame(reader)
+                    if 'ack' in frame:
+                        connection['acks'].popleft().set_result(None)
+                        continue
+                    for channel in frame['channels']:
+                        self._put_local(channel, dict(frame['message']), raise_full=False)
+                except (MalformedFrame, KeyError, TypeError, IndexError):
+                    self.frames_malformed += 1
+                    logger.exception("Skipped a malformed frame from the channel broker")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Nothing else would reconnect a loop that is only waiting to receive
+            if connection['registered'] and not connection['closed']:
+                logger.warning("Lost the channel broker connection; reconnecting")
+                asyncio.ensure_future(self._reconnect())
+        finally:
+            # Whatever ended the reader, fail pending requests and let the next call reconnect
+            connection['writer'].close()
+            for ack in connection['acks']:
+                if not ack.done():
+                    ack.set_exception(ConnectionError('Channel broker connection lost'))
+
+    def _queue(self, channel):
+        queue = self.queues.get(channel)
+        if queue is None:
+            queue = self.queues[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _put_local(self, channel, message, raise_full=True):
+        try:
+            self._queue(channel).put_nowait((time.time() + self.expiry, message))
+        except asyncio.QueueFull:
+            if raise_full:
+                raise ChannelFull(channel)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        if channel_owner(channel) == self.client_prefix:
+            self._put_local(channel, dict(message))
+        else:
+            await self._send_frame({'op': 'send', 'channel': channel, 'message': message})
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if channel_owner(channel) != self.client_prefix:
+            raise NotImplementedError("BrokerChannelLayer can only receive on this worker's own channels")
+        await self._connection(receiving=True)
+        queue = self._queue(channel)
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+        finally:
+            if queue.empty():
+                self.queues.pop(channel, None)
+
+    async def new_channel(self, prefix='specific'):
+        await self._connection(receiving=True)
+        return f'{prefix}.{self.client_prefix}!{uuid.uuid4().hex[:12]}'
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self.groups[group].add(channel)
+        await self._request(await self._connection(), {'op': 'group_add', 'group': group, 'channel': channel})
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        channels = self.groups.get(group)
+        if channels is not None:
+            channels.discard(channel)
+            if not channels:
+                del self.groups[group]
+        await self._request(await self._connection(), {'op': 'group_discard', 'group': group, 'channel': channel})
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self._send_frame({'op': 'group_send', 'group': group, 'message': message})
+
+    async def flush(self):
+        self.queues = {}
+        self.groups.clear()
+        await self._request(await self._connection(), {'op': 'flush'})
+
+    async def close(self):
+        connection = self._connections.pop(asyncio.get_running_loop(), None)
+        if connection:
+            connection['closed'] = True
+            connection['task'].cancel()
+            connection['writer'].close()
+
+
+class ChannelBroker:
+    """Routes group and cross-process messages between connected workers"""
+
+    ACKNOWLEDGED = {'hello', 'group_add', 'group_discard', 'flush'}
+
+    def __init__(self, group_expiry=86400):
+        self.group_expiry = group_expiry
+        self.workers = {}
+        self.groups = defaultdict(dict)
+        self.frames_routed = 0
+        self.frames_dropped = Counter()
+        self.frames_malformed = 0
+
+    async def serve(self, path):
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.handle, path=path)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        prefix = None
+        try:
+            while True:
+                try:
+                    frame = await read_frame(reader)
+                except MalformedFrame:
+                    self.frames_malformed += 1
+                    logger.exception("Skipped a malformed frame from worker %s", prefix)
+                    continue
+                op = frame.get('op')
+                try:
+                    if op == 'hello':
+                        prefix = frame['prefix']
+                        self.workers[prefix] = writer
+                    else:
+                        self.apply(frame)
+                except (KeyError, TypeError, ValueError):
+                    self.frames_malformed += 1
+                    logger.exception("Skipped a malformed %s frame from worker %s", op, prefix)
+                # Acknowledged even if it failed, so the worker's pending requests stay in order
+                if op in self.ACKNOWLEDGED:
+                    write_frame(writer, {'ack': True})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if prefix is not None and self.workers.get(prefix) is writer:
+                del self.workers[prefix]
+                self._drop_worker_channels(prefix)
+            writer.close()
+
+    def apply(self, frame):
+        op = frame['op']
+        if op == 'group_add':
+            self.groups[frame['group']][frame['channel']] = time.time()
+        elif op == 'group_discard':
+            members = self.groups.get(frame['group'])
+            if members is not None:
+                members.pop(frame['channel'], None)
+                if not members:
+                    del self.groups[frame['group']]
+        elif op == 'group_send':
+            self.route(self._members(frame['group']), frame['message'])
+        elif op == 'send':
+            self.route([frame['channel']], frame['message'])
+        elif op == 'flush':
+            self.groups.clear()
+        else:
+            raise ValueError(f'unknown op {op!r}')
+
+    def _members(self, group):
+        members = self.groups.get(group)
+        if not members:
+            return []
+        cutoff = time.time() - self.group_expiry
+        for channel, added in list(members.items()):
+            if added < cutoff:
+                del members[channel]
+        return list(members)
+
+    def _drop_worker_channels(self, prefix):
+        for group, members in list(self.groups.items()):
+            for channel in [channel for channel in members if channel_owner(channel) == prefix]:
+                del members[channel]
+            if not members:
+                del self.groups[group]
+
+    def route(self, channels, message):
+        """Forward a message once per owning worker with the list of its target channels"""
+        by_worker = defaultdict(list)
+        for channel in channels:
+            by_worker[channel_owner(channel)].append(channel)
+        for prefix, targets in by_worker.items():
+            writer = self.workers.get(prefix)
+            if writer is None or writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_WORKER_BACKLOG:
+                self.frames_dropped[prefix] += 1
+                dropped = self.frames_dropped[prefix]
+                if dropped == 1 or dropped % DROP_LOG_EVERY == 0:
+                    logger.warning("Worker %s is over %d bytes behind; %d frames dropped for it so far",
+                                   prefix, MAX_WORKER_BACKLOG, dropped)
+                continue
+            write_frame(writer, {'channels': targets, 'message': message})
+            self.frames_routed += 1
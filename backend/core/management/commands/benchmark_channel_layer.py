@@ -0,0 +1,72 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.channel_layers import BrokerChannelLayer
+
+
+class Command(BaseCommand):
+    help = "Measure group fan-out throughput of the broker channel layer against the in-memory layer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Simulated worker processes (broker only)')
+        parser.add_argument('--members', type=int, default=20, help='Channels in the group')
+        parser.add_argument('--messages', type=int, default=2000, help='group_send calls')
+
+    def handle(self, *args, **options):
+        workers, members, messages = options['workers'], options['members'], options['messages']
+
+        elapsed = asyncio.run(self.fan_out([InMemoryChannelLayer(capacity=messages)], members, messages))
+        self.report('in-memory', members, messages, elapsed)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'broker.sock')
+            broker = subprocess.Popen(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'run_channel_broker', '--path', path],
+                stdout=subprocess.DEVNULL,
+            )
+            try:
+                while not os.path.exists(path):
+                    time.sleep(0.05)
+                layers = [BrokerChannelLayer(path=path, capacity=messages) for _ in range(workers)]
+                elapsed = asyncio.run(self.fan_out(layers, members, messages))
+                self.report(f'broker x{workers}', members, messages, elapsed)
+            finally:
+                broker.terminate()
+                broker.wait()
+
+    async def fan_out(self, layers, members, messages):
+        """Spread group members across layers, send from the first one and wait for every delivery"""
+        group = 'benchmark_fanout'
+        channels = []
+        for i in range(members):
+            layer = layers[i % len(layers)]
+            channel = await layer.new_channel()
+            await layer.group_add(group, channel)
+            channels.append((layer, channel))
+
+        async def drain(layer, channel):
+            for _ in range(messages):
+                await layer.receive(channel)
+
+        started = time.perf_counter()
+        receivers = [asyncio.ensure_future(drain(layer, channel)) for layer, channel in channels]
+        for i in range(messages):
+            await layers[0].group_send(group, {'type': 'chat.message', 'message': f'message {i}'})
+        await asyncio.gather(*receivers)
+        elapsed = time.perf_counter() - started
+
+        for layer in layers:
+            await layer.close()
+        return elapsed
+
+    def report(self, name, members, messages, elapsed):
+        self.stdout.write(f"{name:>12}: {messages / elapsed:9.0f} group_send/s  "
+                          f"{messages * members / elapsed:10.0f} deliveries/s")
@@ -0,0 +1,25 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.channel_layers import ChannelBroker
+
+
+class Command(BaseCommand):
+    help = "Run the local channel broker that lets several ASGI workers on one host share channel groups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=getattr(settings, 'CHANNEL_BROKER_SOCKET', None),
+                            help='Unix socket path (defaults to CHANNEL_BROKER_SOCKET)')
+        parser.add_argument('--group-expiry', type=int, default=86400)
+
+    def handle(self, *args, **options):
+        if not options['path']:
+            raise CommandError('Set CHANNEL_BROKER_SOCKET or pass --path')
+        self.stdout.write(f"Channel broker listening on {options['path']}")
+        self.stdout.flush()
+        try:
+            asyncio.run(ChannelBroker(options['group_expiry']).serve(options['path']))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,15 @@
+"""
+Custom pagination classes that can be used across apps.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Cursor pagination ordered by primary key.
+    Ordering on a unique column keeps pages stable while rows are added or removed.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
@@ -0,0 +1,156 @@
+"""
+Online presence kept in memory and shared between workers over the channel layer.
+
+Each worker counts its own connected sockets per user and refreshes their expiry
+on heartbeats. Refreshes are announced to the ``presence`` group, where a
+listener in every worker folds them into a local map of
+user -> {worker: expires_at}. Lookups therefore never touch the database or the
+network. A user is online while any worker holds an unexpired entry for them.
+
+Listeners run on the server's event loop: websocket consumers start one when a
+socket connects, and PresenceListenerMiddleware starts one on the first HTTP
+request, so workers that only serve the REST API see remote presence too.
+
+Announcements are coalesced: a heartbeat is only re-broadcast once the last
+announced expiry is half way through PRESENCE_TTL, so steady heartbeats cost one
+group message per user per TTL/2 rather than one per heartbeat.
+"""
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter, defaultdict
+
+from channels.layers import get_channel_layer
+
+PRESENCE_GROUP = 'presence'
+PRESENCE_TTL = 60
+# Clients should heartbeat at least this often to stay online
+HEARTBEAT_INTERVAL = 20
+# Re-join the presence group well before the layer's group expiry drops the listener
+LISTENER_REFRESH = 3600
+
+
+class PresenceRegistry:
+    """Per-process presence map; use the module-level ``presence`` instance"""
+
+    def __init__(self, ttl=PRESENCE_TTL):
+        self.ttl = ttl
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.entries = defaultdict(dict)
+        self.connections = Counter()
+        self.announced = {}
+        # Views read the map from other threads than the event loop writing it
+        self.lock = threading.Lock()
+        self.listeners = weakref.WeakKeyDictionary()
+
+    # Lookups
+
+    def is_online(self, user_id):
+        return bool(self.online([user_id]))
+
+    def online(self, user_ids):
+        """The subset of user_ids that is online, in a single pass under one lock"""
+        now = time.time()
+        with self.lock:
+            return {
+                user_id for user_id in user_ids
+                if any(expires_at > now for expires_at in self.entries.get(user_id, {}).values())
+            }
+
+    def apply(self, user_id, worker_id, expires_at):
+        """Record a worker's expiry for a user; an expiry of 0 removes it"""
+        with self.lock:
+            if expires_at:
+                self.entries[user_id][worker_id] = expires_at
+                return
+            workers = self.entries.get(user_id)
+            if workers is not None:
+                workers.pop(worker_id, None)
+                if not workers:
+                    del self.entries[user_id]
+
+    # Socket lifecycle
+
+    async def connect(self, channel_layer, user_id):
+        """Register a socket; returns True if this brought the user online"""
+        await self.ensure_listener(channel_layer)
+        was_online = self.is_online(user_id)
+        self.connections[user_id] += 1
+        await self.heartbeat(channel_layer, user_id, force=True)
+        return not was_online
+
+    async def heartbeat(self, channel_layer, user_id, force=False):
+        """Extend a connected user's expiry, announcing it only when due"""
+        if not self.connections[user_id]:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        self.apply(user_id, self.worker_id, expires_at)
+        if force or self.announced.get(user_id, 0) - now < self.ttl / 2:
+            self.announced[user_id] = expires_at
+            await self.announce(channel_layer, user_id, expires_at)
+
+    async def disconnect(self, channel_layer, user_id):
+        """Unregister a socket; returns True if the user has no sockets left anywhere"""
+        self.connections[user_id] -= 1
+        if self.connections[user_id] > 0:
+            return False
+        del self.connections[user_id]
+        self.announced.pop(user_id, None)
+        self.apply(user_id, self.worker_id, 0)
+        await self.announce(channel_layer, user_id, 0)
+        return not self.is_online(user_id)
+
+    async def announce(self, channel_layer, user_id, expires_at):
+        await channel_layer.group_send(PRESENCE_GROUP, {
+            'type': 'presence.update',
+            'user': user_id,
+            'worker': self.worker_id,
+            'expires_at': expires_at,
+        })
+
+    # Cross-worker listener
+
+    async def ensure_listener(self, channel_layer):
+        """Start this event loop's listener for other workers' announcements"""
+        loop = asyncio.get_running_loop()
+        if loop in self.listeners:
+            return
+        # Claimed before awaiting so concurrent requests on the loop start a single listener
+        self.listeners[loop] = None
+        try:
+            channel = await channel_layer.new_channel('presence')
+            await channel_layer.group_add(PRESENCE_GROUP, channel)
+        except BaseException:
+            del self.listeners[loop]
+            raise
+        self.listeners[loop] = loop.create_task(self.listen(channel_layer, channel))
+
+    async def listen(self, channel_layer, channel):
+        joined = time.monotonic()
+        while True:
+            message = await channel_layer.receive(channel)
+            if message.get('type') == 'presence.update' and message['worker'] != self.worker_id:
+                self.apply(message['user'], message['worker'], message['expires_at'])
+            if time.monotonic() - joined > LISTENER_REFRESH:
+                await channel_layer.group_add(PRESENCE_GROUP, channel)
+                joined = time.monotonic()
+
+
+presence = PresenceRegistry()
+
+
+class PresenceListenerMiddleware:
+    """ASGI wrapper that makes sure the serving event loop listens for presence announcements"""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            channel_layer = get_channel_layer()
+            if channel_layer is not None:
+                await presence.ensure_listener(channel_layer)
+        return await self.inner(scope, receive, send)
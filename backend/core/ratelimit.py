@@ -0,0 +1,58 @@
+"""
+Token-bucket rate limiting for long-lived connections.
+"""
+import time
+
+# Drop idle (full) buckets once a registry holds this many
+MAX_IDLE_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average with bursts of up to `capacity`"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def allow(self, cost=1):
+        self.refill()
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+    @property
+    def idle(self):
+        self.refill()
+        return self.tokens >= self.capacity
+
+
+class TokenBucketRegistry:
+    """Buckets keyed by e.g. user id, shared by every connection of that key in this process"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+
+    def allow(self, key, cost=1):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_IDLE_BUCKETS:
+                self.prune()
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.capacity)
+        return bucket.allow(cost)
+
+    def prune(self):
+        """Forget full buckets; a missing bucket behaves exactly like a full one"""
+        for key in [key for key, bucket in self.buckets.items() if bucket.idle]:
+            del self.buckets[key]
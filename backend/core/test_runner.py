@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Writes trending adds synchronously during tests, so no buffered flush (timer or
+    atexit) runs after the test database is gone. Tests of the buffer opt back in
+    with override_settings and drop it with anime.trending.reset_add_buffer.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.TRENDING_BUFFER_ADDS = False
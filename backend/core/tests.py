@@ -1,3 +1,212 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core.channel_layers import _HEADER, MAX_WORKER_BACKLOG, BrokerChannelLayer, ChannelBroker, write_frame
+
+WORKER_SCRIPT = """
+import asyncio, json, sys
+from core.channel_layers import BrokerChannelLayer
+
+async def main():
+    layer = BrokerChannelLayer(path=sys.argv[1])
+    channel = await layer.new_channel()
+    await layer.group_add('chat_broker_test', channel)
+    print(json.dumps({'ready': channel}), flush=True)
+    message = await layer.receive(channel)
+    print(json.dumps(message), flush=True)
+    await layer.send(message['reply_to'], {'type': 'chat.reply', 'text': 'pong'})
+    await asyncio.sleep(0.2)
+
+asyncio.run(main())
+"""
+
+
+class BrokerChannelLayerTests(SimpleTestCase):
+    """The broker-backed layer delivers group and direct messages across worker processes"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'broker.sock')
+        self.env = {**os.environ, 'PYTHONPATH': str(settings.BASE_DIR)}
+        self.broker = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'run_channel_broker', '--path', self.path],
+            env=self.env, stdout=subprocess.DEVNULL,
+        )
+        deadline = time.time() + 10
+        while not os.path.exists(self.path):
+            if time.time() > deadline:
+                self.fail('Channel broker did not start')
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.broker.terminate()
+        self.broker.wait(timeout=5)
+        self.tmpdir.cleanup()
+
+    def test_group_send_reaches_both_worker_processes(self):
+        worker = subprocess.Popen(
+            [sys.executable, '-c', WORKER_SCRIPT, self.path],
+            env=self.env, stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            self.assertIn('ready', json.loads(worker.stdout.readline()))
+
+            async def exchange():
+                layer = BrokerChannelLayer(path=self.path)
+                channel = await layer.new_channel()
+                await layer.group_add('chat_broker_test', channel)
+                await layer.group_send('chat_broker_test', {
+                    'type': 'chat.message', 'text': 'ping', 'reply_to': channel,
+                })
+                local = await layer.receive(channel)
+                reply = await layer.receive(channel)
+                await layer.close()
+                return local, reply
+
+            local, reply = async_to_sync(exchange)()
+            remote = json.loads(worker.stdout.readline())
+
+            self.assertEqual(local['text'], 'ping')
+            self.assertEqual(remote['text'], 'ping')
+            self.assertEqual(reply, {'type': 'chat.reply', 'text': 'pong'})
+        finally:
+            worker.wait(timeout=10)
+
+
+class FakeWriter:
+    def __init__(self, backlog=0):
+        self.frames = []
+        self.transport = self
+        self.backlog = backlog
+
+    def get_write_buffer_size(self):
+        return self.backlog
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.frames.append(json.loads(data[_HEADER.size:]))
+
+
+class MalformedFrameTests(SimpleTestCase):
+    """A bad frame costs only itself, on either side of the broker connection"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'broker.sock')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_broker_skips_malformed_frames(self):
+        broker = ChannelBroker()
+
+        async def exchange():
+            server = await asyncio.start_unix_server(broker.handle, path=self.path)
+            async with server:
+                layer = BrokerChannelLayer(path=self.path)
+                channel = await layer.new_channel()
+                connection = await layer._connection()
+                connection['writer'].write(_HEADER.pack(5) + b'{nope')
+                await layer._request(connection, {'op': 'group_add'})
+                await layer.group_add('chat_malformed_test', channel)
+                await layer.group_send('chat_malformed_test', {'type': 'chat.message', 'text': 'still here'})
+                message = await asyncio.wait_for(layer.receive(channel), 5)
+                await layer.close()
+                # Let the broker see the connection close before the loop goes away
+                await asyncio.sleep(0.1)
+                return message
+
+        with self.assertLogs('core.channel_layers', 'ERROR') as logs:
+            self.assertEqual(async_to_sync(exchange)()['text'], 'still here')
+        self.assertEqual(broker.frames_malformed, 2)
+        self.assertEqual(len(logs.records), 2)
+
+    def test_layer_skips_malformed_frames(self):
+        layer = BrokerChannelLayer(path=self.path)
+
+        async def fake_broker(reader, writer):
+            writer.write(_HEADER.pack(2) + b'[]')
+            writer.write(_HEADER.pack(3) + b'\xff\xfe{')
+            write_frame(writer, {'channels': ['specific.x!1']})
+            write_frame(writer, {'channels': ['specific.x!1'], 'message': {'type': 'chat.message'}})
+            await writer.drain()
+
+        async def exchange():
+            server = await asyncio.start_unix_server(fake_broker, path=self.path)
+            async with server:
+                await layer._connection()
+                await asyncio.sleep(0.2)
+                _, message = layer.queues['specific.x!1'].get_nowait()
+                await layer.close()
+                return message
+
+        with self.assertLogs('core.channel_layers', 'ERROR'):
+            self.assertEqual(async_to_sync(exchange)(), {'type': 'chat.message'})
+        self.assertEqual(layer.frames_malformed, 3)
+
+    def test_frames_for_a_backlogged_worker_are_counted(self):
+        broker = ChannelBroker()
+        broker.workers = {'slow': FakeWriter(MAX_WORKER_BACKLOG + 1), 'fast': FakeWriter()}
+
+        with self.assertLogs('core.channel_layers', 'WARNING') as logs:
+            for _ in range(3):
+                broker.route(['specific.slow!1', 'specific.fast!1'], {'type': 'chat.message'})
+
+        self.assertEqual(broker.frames_dropped, {'slow': 3})
+        self.assertEqual(broker.frames_routed, 3)
+        self.assertEqual(len(broker.workers['fast'].frames), 3)
+        self.assertEqual(len(logs.records), 1)
+
+
+class BrokerRestartTests(SimpleTestCase):
+    """A worker that lost its broker registers again, groups included, once one is back"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'broker.sock')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_group_send_after_a_broker_restart(self):
+        async def exchange():
+            broker = ChannelBroker()
+            server = await asyncio.start_unix_server(broker.handle, path=self.path)
+            layer = BrokerChannelLayer(path=self.path)
+            channel = await layer.new_channel()
+            await layer.group_add('chat_restart_test', channel)
+            receiving = asyncio.ensure_future(layer.receive(channel))
+
+            # The old broker goes away with everything it knew
+            server.close()
+            for writer in broker.workers.values():
+                writer.close()
+            await server.wait_closed()
+            broker = ChannelBroker()
+            server = await asyncio.start_unix_server(broker.handle, path=self.path)
+            async with server:
+                deadline = time.time() + 5
+                while 'chat_restart_test' not in broker.groups and time.time() < deadline:
+                    await asyncio.sleep(0.05)
+
+                sender = BrokerChannelLayer(path=self.path)
+                await sender.group_send('chat_restart_test', {'type': 'chat.message', 'text': 'back'})
+                message = await asyncio.wait_for(receiving, 5)
+                await layer.close()
+                await sender.close()
+                await asyncio.sleep(0.1)
+                return message
+
+        with self.assertLogs('core.channel_layers', 'WARNING'):
+            self.assertEqual(async_to_sync(exchange)()['text'], 'back')
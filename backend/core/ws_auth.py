@@ -0,0 +1,47 @@
+"""
+Websocket authentication by API token.
+
+Browsers cannot set an Authorization header on a websocket handshake, so the
+frontend passes its DRF token as ``?token=<key>``. TokenAuthMiddlewareStack
+resolves it into scope['user'] and otherwise leaves the session user that
+AuthMiddlewareStack found. Consumers must still check that the scope user is
+the one the URL names (see authenticated_user_id).
+"""
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework.authtoken.models import Token
+
+
+@database_sync_to_async
+def get_token_user(key):
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """Sets scope['user'] from a ?token= query parameter when it names an active user"""
+
+    async def __call__(self, scope, receive, send):
+        key = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if key:
+            user = await get_token_user(key[0])
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
+
+
+def TokenAuthMiddlewareStack(inner):
+    return AuthMiddlewareStack(TokenAuthMiddleware(inner))
+
+
+def authenticated_user_id(scope):
+    """Id of the user the socket authenticated as, or None for anonymous sockets"""
+    user = scope.get('user')
+    if user is None or not user.is_authenticated:
+        return None
+    return user.id
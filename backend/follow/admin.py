@@ -1,13 +1,17 @@
 from django.contrib import admin
-from .models import Follow
+from .models import Follow, FollowEdge
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
-    list_display = ['user', 'following_count']
-    search_fields = ['user__username', 'following__username']
-    filter_horizontal = ['following']
+    list_display = ['user', 'following_count', 'follower_count']
+    search_fields = ['user__username']
+    readonly_fields = ['following_count', 'follower_count']
 
-    def following_count(self, obj):
-        return obj.following.count()
-    following_count.short_description = 'Following Count'
\ No newline at end of file
+
+@admin.register(FollowEdge)
+class FollowEdgeAdmin(admin.ModelAdmin):
+    list_display = ['follower', 'followee', 'created_at']
+    search_fields = ['follower__username', 'followee__username']
+    raw_id_fields = ['follower', 'followee']
+    readonly_fields = ['created_at']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FollowConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'follow'
+
+    def ready(self):
+        import follow.signals  # Import signals when app is ready
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_following_to_edges(apps, schema_editor):
+    """Move M2M follow rows into the edge table, merge duplicate Follow rows, add missing ones and fill counters"""
+    Follow = apps.get_model('follow', 'Follow')
+    FollowEdge = apps.get_model('follow', 'FollowEdge')
+    Through = Follow.following.through
+
+    edges = set(Through.objects.values_list('follow__user_id', 'user_id'))
+    FollowEdge.objects.bulk_create(
+        [FollowEdge(follower_id=follower_id, followee_id=followee_id)
+         for follower_id, followee_id in edges if follower_id != followee_id],
+        batch_size=1000,
+    )
+
+    seen = set()
+    for follow in Follow.objects.order_by('id').iterator():
+        if follow.user_id in seen:
+            follow.delete()
+        else:
+            seen.add(follow.user_id)
+
+    # Rows were never created on sign-up, so many followed users have none to hold their counts
+    involved = {user_id for edge in edges for user_id in edge}
+    Follow.objects.bulk_create([Follow(user_id=user_id) for user_id in involved - seen], batch_size=1000)
+
+    following = dict(FollowEdge.objects.values_list('follower_id').annotate(total=models.Count('id')))
+    followers = dict(FollowEdge.objects.values_list('followee_id').annotate(total=models.Count('id')))
+    for follow in Follow.objects.iterator():
+        Follow.objects.filter(pk=follow.pk).update(
+            following_count=following.get(follow.user_id, 0),
+            follower_count=followers.get(follow.user_id, 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('follow', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('followee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_edges', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Follow Edge',
+                'verbose_name_plural': 'Follow Edges',
+                'indexes': [models.Index(fields=['followee', 'follower'], name='follow_edge_followee_idx')],
+                'constraints': [models.UniqueConstraint(fields=('follower', 'followee'), name='follow_edge_unique')],
+            },
+        ),
+        migrations.AddField(
+            model_name='follow',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='follow',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(copy_following_to_edges, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='follow',
+            name='following',
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='follow', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
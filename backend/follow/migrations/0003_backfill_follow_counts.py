@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def backfill_follow_counts(apps, schema_editor):
+    """
+    Give every user a Follow row and recount both counters from the edge table.
+    Databases that ran 0002 before it created missing rows lost the counts of
+    users who had none.
+    """
+    User = apps.get_model('auth', 'User')
+    Follow = apps.get_model('follow', 'Follow')
+    FollowEdge = apps.get_model('follow', 'FollowEdge')
+
+    missing = User.objects.exclude(id__in=Follow.objects.values('user_id')).values_list('id', flat=True)
+    Follow.objects.bulk_create([Follow(user_id=user_id) for user_id in missing.iterator()], batch_size=1000)
+
+    following = dict(FollowEdge.objects.values_list('follower_id').annotate(total=models.Count('id')))
+    followers = dict(FollowEdge.objects.values_list('followee_id').annotate(total=models.Count('id')))
+    for follow in Follow.objects.iterator():
+        counts = (following.get(follow.user_id, 0), followers.get(follow.user_id, 0))
+        if counts != (follow.following_count, follow.follower_count):
+            Follow.objects.filter(pk=follow.pk).update(following_count=counts[0], follower_count=counts[1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('follow', '0002_follow_edges'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+    ]
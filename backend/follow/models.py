@@ -1,35 +1,76 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from core.models import TimeStampedModel
+from notifications.delivery import notify
+from notifications.models import FOLLOW
 
 
 class Follow(models.Model):
     """
-    User following model.
-    Each user can follow multiple other users.
+    Per-user follow record.
+    Holds denormalized follower/following counters; the relations themselves live in FollowEdge.
     """
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following_users')
-    following = models.ManyToManyField(User, related_name='followers', blank=True)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='follow')
+    following_count = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.user.username} follows {self.following.count()} users"
+        return f"{self.user.username} follows {self.following_count} users"
 
     def add_following(self, account):
-        """Add a user to the following list"""
-        if not self.is_following(account):
-            self.following.add(account)
-            self.save()
+        """Follow a user, updating both users' counters in the same transaction and notifying them"""
+        with transaction.atomic():
+            _, created = FollowEdge.objects.get_or_create(follower=self.user, followee=account)
+            if created:
+                Follow.objects.get_or_create(user=account)
+                Follow.objects.filter(pk=self.pk).update(following_count=F('following_count') + 1)
+                Follow.objects.filter(user=account).update(follower_count=F('follower_count') + 1)
+                self.refresh_from_db(fields=['following_count', 'follower_count'])
+                notify(account.id, FOLLOW, actor_id=self.user_id)
 
     def remove_following(self, account):
-        """Remove a user from the following list"""
-        if self.is_following(account):
-            self.following.remove(account)
-            self.save()
+        """Unfollow a user, updating both users' counters in the same transaction"""
+        with transaction.atomic():
+            deleted, _ = FollowEdge.objects.filter(follower=self.user, followee=account).delete()
+            if deleted:
+                Follow.objects.filter(pk=self.pk).update(following_count=F('following_count') - 1)
+                Follow.objects.filter(user=account).update(follower_count=F('follower_count') - 1)
+                self.refresh_from_db(fields=['following_count', 'follower_count'])
 
     def is_following(self, account):
         """Check if a user is being followed"""
-        return self.following.filter(id=account.id).exists()
+        return FollowEdge.objects.filter(follower=self.user, followee=account).exists()
+
+    def refresh_counts(self):
+        """Recompute both counters from the edge table"""
+        self.following_count = FollowEdge.objects.filter(follower=self.user).count()
+        self.follower_count = FollowEdge.objects.filter(followee=self.user).count()
+        self.save(update_fields=['following_count', 'follower_count'])
 
     class Meta:
         verbose_name = "Follow"
-        verbose_name_plural = "Follows"
\ No newline at end of file
+        verbose_name_plural = "Follows"
+
+
+class FollowEdge(models.Model):
+    """
+    A single follower -> followee relation.
+    Indexed in both directions so followers and following lists are range scans.
+    """
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following_edges')
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follower_edges')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.follower_id} -> {self.followee_id}"
+
+    class Meta:
+        verbose_name = "Follow Edge"
+        verbose_name_plural = "Follow Edges"
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='follow_edge_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['followee', 'follower'], name='follow_edge_followee_idx'),
+        ]
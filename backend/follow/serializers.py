@@ -1,6 +1,6 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import Follow
+from .models import Follow, FollowEdge
 
 
 class FollowUserSerializer(serializers.ModelSerializer):
@@ -10,29 +10,30 @@ class FollowUserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username']
 
 
-class FollowListSerializer(serializers.ModelSerializer):
-    """Serializer for users being followed by a user"""
-    username = serializers.CharField(source='user.username', read_only=True)
-    following = FollowUserSerializer(many=True, read_only=True)
-    user_id = serializers.IntegerField(source='user.id', read_only=True)
+class FollowerSerializer(serializers.ModelSerializer):
+    """A user following someone, read from a follow edge"""
+    id = serializers.IntegerField(source='follower.id', read_only=True)
+    username = serializers.CharField(source='follower.username', read_only=True)
 
     class Meta:
-        model = Follow
-        fields = ['username', 'user_id', 'following']
+        model = FollowEdge
+        fields = ['id', 'username', 'created_at']
 
 
-class FollowersListSerializer(serializers.ModelSerializer):
-    """Serializer for users following a user"""
-    username = serializers.CharField(source='user.username', read_only=True)
-    followers = serializers.SerializerMethodField()
-    user_id = serializers.IntegerField(source='user.id', read_only=True)
+class FollowingSerializer(serializers.ModelSerializer):
+    """A user being followed by someone, read from a follow edge"""
+    id = serializers.IntegerField(source='followee.id', read_only=True)
+    username = serializers.CharField(source='followee.username', read_only=True)
 
     class Meta:
-        model = Follow
-        fields = ['username', 'followers', 'user_id']
+        model = FollowEdge
+        fields = ['id', 'username', 'created_at']
+
 
-    def get_followers(self, obj):
-        """Get the followers of a user"""
-        # Find users who have this user in their following list
-        followers = User.objects.filter(following_users__following=obj.user)
-        return FollowUserSerializer(followers, many=True).data
\ No newline at end of file
+class FollowCountSerializer(serializers.ModelSerializer):
+    """Denormalized follower and following counters of a user"""
+    user_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Follow
+        fields = ['user_id', 'follower_count', 'following_count']
@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
 
-# Create your tests here.
+
+class FollowEdgeMigrationTests(TransactionTestCase):
+    """Counts copied from the old M2M table reach users who had no Follow row"""
+    before = [('follow', '0001_initial')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_followed_users_without_a_row_get_their_counts(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        Follow = apps.get_model('follow', 'Follow')
+        alice, bob, carol = (User.objects.create(username=name) for name in ('alice', 'bob', 'carol'))
+        Follow.objects.create(user=alice).following.add(bob, carol)
+        Follow.objects.create(user=carol).following.add(bob)
+
+        apps = self.migrate([('follow', '0002_follow_edges')])
+
+        Follow = apps.get_model('follow', 'Follow')
+        counts = {follow.user_id: (follow.following_count, follow.follower_count) for follow in Follow.objects.all()}
+        self.assertEqual(counts, {alice.id: (2, 0), bob.id: (0, 2), carol.id: (1, 1)})
+
+    def test_repair_recounts_databases_migrated_before_the_fix(self):
+        apps = self.migrate([('follow', '0002_follow_edges')])
+        User = apps.get_model('auth', 'User')
+        Follow = apps.get_model('follow', 'Follow')
+        FollowEdge = apps.get_model('follow', 'FollowEdge')
+        alice, bob = (User.objects.create(username=name) for name in ('alice', 'bob'))
+        Follow.objects.create(user=alice, following_count=1)
+        FollowEdge.objects.create(follower=alice, followee=bob)
+
+        apps = self.migrate([('follow', '0003_backfill_follow_counts')])
+
+        Follow = apps.get_model('follow', 'Follow')
+        self.assertEqual(Follow.objects.get(user_id=bob.id).follower_count, 1)
@@ -8,4 +8,5 @@ urlpatterns = [
     path('unfollow/<int:user_id>/', views.UnfollowUserView.as_view(), name='unfollow_user'),
     path('followers/<int:id>/', views.FollowersListByIdView.as_view(), name='followers'),
     path('following/<int:id>/', views.FollowingListByIdView.as_view(), name='following'),
+    path('counts/<int:id>/', views.FollowCountView.as_view(), name='follow_counts'),
 ]
\ No newline at end of file
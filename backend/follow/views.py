@@ -5,8 +5,21 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Follow
-from .serializers import FollowListSerializer, FollowersListSerializer
+from blocks.blocklist import request_blocklist
+from core.pagination import IdCursorPagination
+
+from .models import Follow, FollowEdge
+from .serializers import FollowerSerializer, FollowingSerializer, FollowCountSerializer
+
+
+class FollowerCursorPagination(IdCursorPagination):
+    """Keyset pagination over a user's followers, served by the (followee, follower) index"""
+    ordering = 'follower_id'
+
+
+class FollowingCursorPagination(IdCursorPagination):
+    """Keyset pagination over the users someone follows, served by the (follower, followee) index"""
+    ordering = 'followee_id'
 
 
 class FollowUserView(APIView):
@@ -32,6 +45,12 @@ class FollowUserView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        if user_to_follow.id in request_blocklist(request):
+            return Response(
+                {'error': 'You cannot follow this user'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
         # Get or create the Follow instance for the current user
         follow_instance, created = Follow.objects.get_or_create(user=user)
 
@@ -90,37 +109,44 @@ class UnfollowUserView(APIView):
         )
 
 
-class FollowingListByIdView(generics.RetrieveAPIView):
-    """Get the list of users a user is following"""
-    serializer_class = FollowListSerializer
+class FollowingListByIdView(generics.ListAPIView):
+    """Get the users a user is following, keyset-paginated"""
+    serializer_class = FollowingSerializer
     permission_classes = [AllowAny]
-    lookup_field = 'user__id'
-    lookup_url_kwarg = 'id'
+    pagination_class = FollowingCursorPagination
 
-    def get_object(self):
+    def get_queryset(self):
         id = self.kwargs.get('id')
-        try:
-            user = User.objects.get(id=id)
-            # Get or create the Follow instance
-            follow, created = Follow.objects.get_or_create(user=user)
-            return follow
-        except User.DoesNotExist:
+        if not User.objects.filter(id=id).exists():
             raise NotFound("User not found")
+        return FollowEdge.objects.filter(follower_id=id).select_related('followee').only(
+            'followee_id', 'created_at', 'followee__id', 'followee__username'
+        )
 
 
-class FollowersListByIdView(generics.RetrieveAPIView):
-    """Get the list of users following a user"""
-    serializer_class = FollowersListSerializer
+class FollowersListByIdView(generics.ListAPIView):
+    """Get the users following a user, keyset-paginated"""
+    serializer_class = FollowerSerializer
+    permission_classes = [AllowAny]
+    pagination_class = FollowerCursorPagination
+
+    def get_queryset(self):
+        id = self.kwargs.get('id')
+        if not User.objects.filter(id=id).exists():
+            raise NotFound("User not found")
+        return FollowEdge.objects.filter(followee_id=id).select_related('follower').only(
+            'follower_id', 'created_at', 'follower__id', 'follower__username'
+        )
+
+
+class FollowCountView(generics.RetrieveAPIView):
+    """Get the follower and following counts of a user"""
+    serializer_class = FollowCountSerializer
     permission_classes = [AllowAny]
-    lookup_field = 'user__id'
-    lookup_url_kwarg = 'id'
 
     def get_object(self):
         id = self.kwargs.get('id')
-        try:
-            user = User.objects.get(id=id)
-            # Get or create the Follow instance
-            follow, created = Follow.objects.get_or_create(user=user)
-            return follow
-        except User.DoesNotExist:
-            raise NotFound("User not found")
\ No newline at end of file
+        if not User.objects.filter(id=id).exists():
+            raise NotFound("User not found")
+        follow, created = Follow.objects.get_or_create(user_id=id)
+        return follow
@@ -7,12 +7,12 @@ class FriendListAdmin(admin.ModelAdmin):
     list_display = ['user', 'friend_count']
     search_fields = ['user__username']
     filter_horizontal = ['friends']
-    readonly_fields = ['user']
+    readonly_fields = ['user', 'friend_count']
 
-    def friend_count(self, obj):
-        return obj.friends.count()
-
-    friend_count.short_description = 'Friends Count'
+    def save_related(self, request, form, formsets, change):
+        """Keep the denormalized counter in sync with edits made through the admin"""
+        super().save_related(request, form, formsets, change)
+        form.instance.refresh_friend_count()
 
 
 @admin.register(FriendRequest)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:43
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_friend_count(apps, schema_editor):
+    FriendList = apps.get_model('friends', 'FriendList')
+    for friend_list in FriendList.objects.annotate(total=Count('friends')).iterator():
+        if friend_list.total:
+            FriendList.objects.filter(pk=friend_list.pk).update(friend_count=friend_list.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='friendlist',
+            name='friend_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_friend_count, migrations.RunPython.noop),
+    ]
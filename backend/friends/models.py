@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from core.models import TimeStampedModel
 
 
@@ -10,38 +11,52 @@ class FriendList(models.Model):
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='friend_list')
     friends = models.ManyToManyField(User, related_name='friend_lists', blank=True)
+    friend_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.user.username}'s friends"
 
     def add_friend(self, account):
-        """Add a user to the friend list"""
-        if account not in self.friends.all():
-            self.friends.add(account)
-            self.save()
+        """Add a user to the friend list and bump the friend counter"""
+        with transaction.atomic():
+            if not self.is_mutual_friend(account):
+                self.friends.add(account)
+                self._adjust_friend_count(1)
 
     def remove_friend(self, account):
-        """Remove a user from the friend list"""
-        if account in self.friends.all():
-            self.friends.remove(account)
-            self.save()
+        """Remove a user from the friend list and decrement the friend counter"""
+        with transaction.atomic():
+            if self.is_mutual_friend(account):
+                self.friends.remove(account)
+                self._adjust_friend_count(-1)
+
+    def _adjust_friend_count(self, delta):
+        """Apply a counter delta in the database so concurrent updates don't clobber each other"""
+        FriendList.objects.filter(pk=self.pk).update(friend_count=F('friend_count') + delta)
+        self.refresh_from_db(fields=['friend_count'])
+
+    def refresh_friend_count(self):
+        """Recompute the friend counter from the M2M table"""
+        self.friend_count = self.friends.count()
+        self.save(update_fields=['friend_count'])
 
     def unfriend(self, removee):
         """
         Remove friend from both users' friend lists.
         This ensures friendship is reciprocal.
         """
-        # Remove friend from this user's friend list
-        self.remove_friend(removee)
+        with transaction.atomic():
+            # Remove friend from this user's friend list
+            self.remove_friend(removee)
 
-        # Remove this user from the friend's friend list
-        friend_friend_list = FriendList.objects.get(user=removee)
-        friend_friend_list.remove_friend(self.user)
+            # Remove this user from the friend's friend list
+            friend_friend_list = FriendList.objects.get(user=removee)
+            friend_friend_list.remove_friend(self.user)
         return True
 
     def is_mutual_friend(self, friend):
         """Check if a user is in the friend list"""
-        return friend in self.friends.all()
+        return self.friends.filter(id=friend.id).exists()
 
     class Meta:
         verbose_name = "Friend List"
@@ -66,20 +81,21 @@ class FriendRequest(TimeStampedModel):
         Accept a friend request.
         Adds each user to the other's friend list.
         """
-        # Get both users' friend lists
-        sender_friend_list = FriendList.objects.get(user=self.sender)
-        receiver_friend_list = FriendList.objects.get(user=self.receiver)
-
-        if sender_friend_list and receiver_friend_list:
-            # Add each user to the other's friend list
-            sender_friend_list.add_friend(self.receiver)
-            receiver_friend_list.add_friend(self.sender)
-
-            # Update request status
-            self.is_accepted = True
-            self.is_active = False
-            self.save()
-            return True
+        with transaction.atomic():
+            # Get both users' friend lists
+            sender_friend_list = FriendList.objects.get(user=self.sender)
+            receiver_friend_list = FriendList.objects.get(user=self.receiver)
+
+            if sender_friend_list and receiver_friend_list:
+                # Add each user to the other's friend list
+                sender_friend_list.add_friend(self.receiver)
+                receiver_friend_list.add_friend(self.sender)
+
+                # Update request status
+                self.is_accepted = True
+                self.is_active = False
+                self.save()
+                return True
         return False
 
     def decline(self):
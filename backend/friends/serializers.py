@@ -97,12 +97,25 @@ class FriendUserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username']
 
 
-class FriendListSerializer(serializers.ModelSerializer):
-    """Serializer for friend lists"""
-    user = serializers.CharField(source='user.username', read_only=True)
-    friends = FriendUserSerializer(many=True, read_only=True)
-    user_id = serializers.IntegerField(source='user.id', read_only=True)
+class FriendCompatibilitySerializer(FriendUserSerializer):
+    """Friend info annotated with taste compatibility and presence passed in through context"""
+    compatibility = serializers.SerializerMethodField()
+    online = serializers.SerializerMethodField()
+
+    class Meta(FriendUserSerializer.Meta):
+        fields = FriendUserSerializer.Meta.fields + ['compatibility', 'online']
+
+    def get_compatibility(self, obj):
+        return self.context.get('compatibility', {}).get(obj.id, 0.0)
+
+    def get_online(self, obj):
+        return obj.id in self.context.get('online', ())
+
+
+class FriendCountSerializer(serializers.ModelSerializer):
+    """Lightweight serializer exposing only the friend counter, for profile headers"""
+    user_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = FriendList
-        fields = ['user', 'user_id', 'friends']
\ No newline at end of file
+        fields = ['user_id', 'friend_count']
\ No newline at end of file
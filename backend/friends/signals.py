@@ -1,7 +1,8 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from django.db import models
+from notifications.delivery import notify
+from notifications.models import FRIEND_ACCEPT, FRIEND_REQUEST
 from .models import FriendList, FriendRequest
 
 # Import Chat model from chat app
@@ -28,18 +29,14 @@ def create_chat_room(sender, instance, **kwargs):
         user2 = instance.receiver
 
         # Create a chat room if one doesn't already exist
-        participant_ids = sorted([str(user1.id), str(user2.id)])
-        room_name_1 = '_'.join(participant_ids)
-        room_name_2 = '_'.join(participant_ids[::-1])
-
-        # Check if chat already exists
-        existing_chat = Chat.objects.filter(
-            models.Q(room_name_1=room_name_1) |
-            models.Q(room_name_2=room_name_2)
-        ).first()
-
-        if not existing_chat:
-            # Create new chat
-            chat = Chat.objects.create()
-            chat.participants.add(user1, user2)
-            chat.save()
\ No newline at end of file
+        Chat.objects.get_or_create_pair(user1, user2)
+
+
+@receiver(post_save, sender=FriendRequest)
+def notify_friend_request(sender, instance, created, **kwargs):
+    """Notify the receiver of a new request, and the sender when it is accepted"""
+    if created:
+        notify(instance.receiver_id, FRIEND_REQUEST, actor_id=instance.sender_id)
+    elif instance.is_accepted and not instance.is_active:
+        # accept() is the only save that sets is_accepted, and it only runs on active requests
+        notify(instance.sender_id, FRIEND_ACCEPT, actor_id=instance.receiver_id)
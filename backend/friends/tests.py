@@ -1,3 +1,22 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .models import FriendRequest
+
+
+class FriendCountTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob).accept()
+
+    def test_own_count_needs_a_login(self):
+        self.assertEqual(self.client.get('/api/friends/count/').status_code, 401)
+
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get('/api/friends/count/').data, {'user_id': self.alice.id, 'friend_count': 1})
+
+    def test_anyone_can_read_a_users_count_by_id(self):
+        response = self.client.get(f'/api/friends/{self.bob.id}/count/')
+
+        self.assertEqual(response.data, {'user_id': self.bob.id, 'friend_count': 1})
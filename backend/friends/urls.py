@@ -7,6 +7,9 @@ urlpatterns = [
     # Friend lists
     path('', views.FriendListView.as_view(), name='friend_list'),
     path('<int:id>/', views.FriendListByIdView.as_view(), name='friend_list_by_id'),
+    path('count/', views.FriendCountView.as_view(), name='friend_count'),
+    path('<int:id>/count/', views.FriendCountByIdView.as_view(), name='friend_count_by_id'),
+    path('compatibility/', views.FriendCompatibilityView.as_view(), name='friend_compatibility'),
 
     # Friend requests
     path('requests/', views.FriendRequestListView.as_view(), name='friend_requests'),
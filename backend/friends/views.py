@@ -6,11 +6,18 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from blocks.blocklist import request_blocklist
+from core.pagination import IdCursorPagination
+from core.presence import presence
+from users.taste import compatibility_scores
+
 from .models import FriendList, FriendRequest
 from .serializers import (
     FriendRequestSerializer,
     FriendRequestAcceptDeclineSerializer,
-    FriendListSerializer,
+    FriendUserSerializer,
+    FriendCompatibilitySerializer,
+    FriendCountSerializer,
     UnfriendSerializer
 )
 
@@ -64,6 +71,12 @@ class FriendRequestCreateView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        if friend.id in request_blocklist(request):
+            return Response(
+                {"error": "You cannot send a friend request to this user."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
         # Check if already friends
         user_friend_list = FriendList.objects.get(user=user)
         if user_friend_list.is_mutual_friend(friend):
@@ -218,28 +231,67 @@ class UnfriendView(APIView):
 
 
 class FriendListView(generics.ListAPIView):
-    """Get the current user's friend list"""
-    serializer_class = FriendListSerializer
+    """Get the current user's friends with taste compatibility, cursor-paginated by user ID"""
+    serializer_class = FriendCompatibilitySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        return FriendList.objects.filter(user=user)
+        return User.objects.filter(friend_lists__user=user).only('id', 'username')
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        friend_ids = [friend.id for friend in page]
+        serializer = self.get_serializer(page, many=True, context={
+            **self.get_serializer_context(),
+            'compatibility': compatibility_scores(request.user.id, friend_ids),
+            'online': presence.online(friend_ids),
+        })
+        return self.get_paginated_response(serializer.data)
 
 
-class FriendListByIdView(generics.RetrieveAPIView):
-    """Get a user's friend list by their ID"""
-    serializer_class = FriendListSerializer
+class FriendCompatibilityView(APIView):
+    """Rank all of the current user's friends by taste compatibility"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        friends = list(User.objects.filter(friend_lists__user=request.user).only('id', 'username'))
+        scores = compatibility_scores(request.user.id, [friend.id for friend in friends])
+        friends.sort(key=lambda friend: (-scores.get(friend.id, 0.0), friend.id))
+        serializer = FriendCompatibilitySerializer(friends, many=True, context={
+            'compatibility': scores,
+            'online': presence.online([friend.id for friend in friends]),
+        })
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class FriendListByIdView(generics.ListAPIView):
+    """Get a user's friends by their ID, cursor-paginated by user ID"""
+    serializer_class = FriendUserSerializer
     permission_classes = [AllowAny]
-    lookup_field = 'user__id'
-    lookup_url_kwarg = 'id'
+    pagination_class = IdCursorPagination
 
-    def get_object(self):
+    def get_queryset(self):
         id = self.kwargs.get('id')
+        if not FriendList.objects.filter(user__id=id).exists():
+            raise NotFound("Friend list not found")
+        return User.objects.filter(friend_lists__user__id=id).only('id', 'username')
+
+
+class FriendCountView(generics.RetrieveAPIView):
+    """Get only the current user's friend count, for profile headers"""
+    serializer_class = FriendCountSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        id = self.kwargs.get('id', self.request.user.id)
         try:
-            user = User.objects.get(id=id)
-            return FriendList.objects.get(user=user)
-        except User.DoesNotExist:
-            raise NotFound("User not found")
+            return FriendList.objects.only('user_id', 'friend_count').get(user__id=id)
         except FriendList.DoesNotExist:
-            raise NotFound("Friend list not found")
\ No newline at end of file
+            raise NotFound("Friend list not found")
+
+
+class FriendCountByIdView(FriendCountView):
+    """Get only the friend count of a user by their ID, for profile headers"""
+    permission_classes = [AllowAny]
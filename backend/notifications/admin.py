@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import Notification, NotificationInbox
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'kind', 'actor', 'chat', 'count', 'created_at', 'read_at']
+    list_filter = ['kind']
+    search_fields = ['recipient__username', 'actor__username']
+    raw_id_fields = ['recipient', 'actor', 'chat']
+
+
+@admin.register(NotificationInbox)
+class NotificationInboxAdmin(admin.ModelAdmin):
+    list_display = ['user', 'unread_count']
+    search_fields = ['user__username']
+    readonly_fields = ['unread_count']
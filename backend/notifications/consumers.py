@@ -0,0 +1,58 @@
+import json
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from chat.backpressure import BackpressureMixin
+from core.ws_auth import authenticated_user_id
+from .delivery import notification_group_name, unread_count
+
+
+class NotificationConsumer(BackpressureMixin, AsyncWebsocketConsumer):
+    """
+    Push-only socket for a user's notifications, open only to that user (session or ?token=).
+    Sends {"type": "unread", "unread": <n>} on connect and whenever the count drops,
+    and {"type": "notification", "notification": {...}, "unread": <n>} for each new one.
+    Anything missed while disconnected is fetched from the list endpoint.
+    """
+
+    async def connect(self):
+        """Handle WebSocket connection"""
+        self.user_id = self.scope['url_route']['kwargs'].get('user_id')
+        # Only the user themselves may listen to their notifications
+        if authenticated_user_id(self.scope) != self.user_id:
+            await self.close()
+            return
+        self.rate_limit_key = self.user_id
+
+        self.group_name = notification_group_name(self.user_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_payload({'type': 'unread', 'unread': await self.get_unread_count()})
+
+    async def disconnect(self, close_code):
+        """Handle WebSocket disconnection"""
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """Clients only listen; notifications are marked read over HTTP"""
+
+    async def notification(self, event):
+        """Send a new notification to WebSocket"""
+        await self.send_payload({
+            'type': 'notification',
+            'notification': event['notification'],
+            'unread': event['unread']
+        })
+
+    async def notification_unread(self, event):
+        """Send the new unread count to WebSocket"""
+        await self.send_payload({'type': 'unread', 'unread': event['unread']})
+
+    async def send_payload(self, payload):
+        await self.send(text_data=json.dumps(payload))
+
+    @database_sync_to_async
+    def get_unread_count(self):
+        return unread_count(self.user_id)
@@ -0,0 +1,115 @@
+"""
+Writing notifications and pushing them to the recipient's sockets.
+
+Every notification is stored first and pushed to the recipient's
+``notifications_<id>`` channel group once the surrounding transaction commits,
+together with their unread count, so a client keeps its list and badge current
+without polling and falls back to the list endpoint after a reconnect.
+Message notifications are coalesced: a chat has at most one unread notification
+per recipient, and further messages only bump its count, so a busy chat costs
+an UPDATE per batch rather than a row and a push per message.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MESSAGE, Notification, NotificationInbox
+from .serializers import NotificationSerializer
+
+
+def notification_group_name(user_id):
+    """Per-user channel group the notification sockets join"""
+    return f'notifications_{user_id}'
+
+
+def notify(recipient_id, kind, actor_id=None, chat_id=None):
+    """Store a notification and bump the recipient's unread counter"""
+    with transaction.atomic():
+        notification = Notification.objects.create(
+            recipient_id=recipient_id, kind=kind, actor_id=actor_id, chat_id=chat_id
+        )
+        NotificationInbox.objects.filter(user_id=recipient_id).update(unread_count=F('unread_count') + 1)
+    transaction.on_commit(lambda: push([notification.id]))
+    return notification
+
+
+def notify_messages(chat_id, sender_id, count, recipient_ids):
+    """
+    Fold `count` messages from one sender into each recipient's unread message
+    notification for the chat, creating it where there is none. Only new
+    notifications are pushed; bumped ones are already on the client's badge.
+    """
+    recipient_ids = list(recipient_ids)
+    if not recipient_ids:
+        return []
+    with transaction.atomic():
+        unread = Notification.objects.filter(
+            kind=MESSAGE, chat_id=chat_id, read_at__isnull=True, recipient_id__in=recipient_ids
+        )
+        bumped = set(unread.values_list('recipient_id', flat=True))
+        if bumped:
+            unread.update(count=F('count') + count, actor_id=sender_id, updated_at=timezone.now())
+        created = Notification.objects.bulk_create([
+            Notification(recipient_id=recipient_id, kind=MESSAGE, actor_id=sender_id, chat_id=chat_id, count=count)
+            for recipient_id in recipient_ids if recipient_id not in bumped
+        ])
+        if created:
+            NotificationInbox.objects.filter(
+                user_id__in=[notification.recipient_id for notification in created]
+            ).update(unread_count=F('unread_count') + 1)
+    if created:
+        ids = [notification.id for notification in created]
+        transaction.on_commit(lambda: push(ids))
+    return created
+
+
+def mark_read(user_id, up_to=None):
+    """Mark the user's unread notifications (up to an id) read; returns (marked, unread left)"""
+    unread = Notification.objects.filter(recipient_id=user_id, read_at__isnull=True)
+    if up_to is not None:
+        unread = unread.filter(id__lte=up_to)
+    return _mark_read(user_id, unread)
+
+
+def mark_chat_read(user_id, chat_id):
+    """Mark the user's message notification for a chat read once they have read the chat"""
+    unread = Notification.objects.filter(recipient_id=user_id, kind=MESSAGE, chat_id=chat_id, read_at__isnull=True)
+    return _mark_read(user_id, unread)
+
+
+def _mark_read(user_id, unread):
+    with transaction.atomic():
+        marked = unread.update(read_at=timezone.now())
+        if marked:
+            NotificationInbox.objects.filter(user_id=user_id).update(unread_count=F('unread_count') - marked)
+        remaining = unread_count(user_id)
+    if marked:
+        # Other tabs and devices of the user update their badge
+        transaction.on_commit(lambda: send(user_id, {'type': 'notification.unread', 'unread': remaining}))
+    return marked, remaining
+
+
+def unread_count(user_id):
+    return NotificationInbox.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first() or 0
+
+
+def push(notification_ids):
+    """Send stored notifications to their recipients' sockets with each recipient's unread count"""
+    notifications = list(Notification.objects.filter(pk__in=notification_ids).select_related('actor'))
+    unread = dict(NotificationInbox.objects.filter(
+        user_id__in={notification.recipient_id for notification in notifications}
+    ).values_list('user_id', 'unread_count'))
+    for notification in notifications:
+        send(notification.recipient_id, {
+            'type': 'notification',
+            'notification': NotificationSerializer(notification).data,
+            'unread': unread.get(notification.recipient_id, 0),
+        })
+
+
+def send(user_id, event):
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(notification_group_name(user_id), event)
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_inboxes(apps, schema_editor):
+    """Give every existing user an inbox; new users get one from the post_save signal"""
+    User = apps.get_model('auth', 'User')
+    NotificationInbox = apps.get_model('notifications', 'NotificationInbox')
+    NotificationInbox.objects.bulk_create(
+        [NotificationInbox(user_id=user_id) for user_id in User.objects.values_list('id', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('chat', '0009_group_chats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_inbox', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('friend_request', 'Friend request'), ('friend_accept', 'Friend request accepted'), ('follow', 'New follower'), ('message', 'New messages')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('chat', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat.chat')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipient', 'id'], name='notification_recipient_id')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('kind', 'message'), ('read_at__isnull', True)), fields=('recipient', 'chat'), name='notification_unread_chat_unique')],
+            },
+        ),
+        migrations.RunPython(create_inboxes, migrations.RunPython.noop),
+    ]
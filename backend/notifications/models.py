@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import Q
+
+
+FRIEND_REQUEST = 'friend_request'
+FRIEND_ACCEPT = 'friend_accept'
+FOLLOW = 'follow'
+MESSAGE = 'message'
+
+KIND_CHOICES = [
+    (FRIEND_REQUEST, 'Friend request'),
+    (FRIEND_ACCEPT, 'Friend request accepted'),
+    (FOLLOW, 'New follower'),
+    (MESSAGE, 'New messages'),
+]
+
+
+class Notification(models.Model):
+    """
+    One thing that happened to a user, kept compact: a kind, who did it and, for
+    messages, the chat. Messages are coalesced into a single unread notification
+    per chat whose count grows until the user reads it.
+    """
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    chat = models.ForeignKey('chat.Chat', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.recipient_id}"
+
+    @property
+    def is_read(self):
+        return self.read_at is not None
+
+    class Meta:
+        indexes = [
+            # Newest-first keyset pages of one user's notifications
+            models.Index(fields=['recipient', 'id'], name='notification_recipient_id'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'chat'],
+                condition=Q(kind=MESSAGE, read_at__isnull=True),
+                name='notification_unread_chat_unique',
+            ),
+        ]
+
+
+class NotificationInbox(models.Model):
+    """Per-user denormalized count of unread notifications"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_inbox')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_count} unread"
+
+    def refresh_unread_count(self):
+        """Recompute the counter from the notification table"""
+        self.unread_count = Notification.objects.filter(recipient_id=self.user_id, read_at__isnull=True).count()
+        self.save(update_fields=['unread_count'])
@@ -0,0 +1,18 @@
+from rest_framework import serializers
+from .models import Notification
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    """Serializer for notifications; also the payload pushed over the websocket"""
+    actor_username = serializers.CharField(source='actor.username', read_only=True, default=None)
+    is_read = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'kind', 'actor', 'actor_username', 'chat', 'count', 'created_at', 'updated_at', 'is_read']
+        read_only_fields = fields
+
+
+class NotificationReadSerializer(serializers.Serializer):
+    """Mark notifications read up to an id (all of them by default)"""
+    up_to = serializers.IntegerField(required=False, min_value=1)
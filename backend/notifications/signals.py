@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from .models import NotificationInbox
+
+
+@receiver(post_save, sender=User)
+def create_notification_inbox(sender, instance, created, **kwargs):
+    """Create a NotificationInbox for each new User"""
+    if created:
+        NotificationInbox.objects.create(user=instance)
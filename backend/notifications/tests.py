@@ -0,0 +1,96 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from chat.models import Chat, ChatMessage
+from chat.persistence import persist_messages
+from friends.models import FriendRequest
+
+from .delivery import unread_count
+from .models import FOLLOW, FRIEND_ACCEPT, FRIEND_REQUEST, MESSAGE, Notification
+
+
+class NotificationHookTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+
+    def test_friend_request_notifies_recipient(self):
+        self.client.force_authenticate(self.alice)
+        response = self.client.post(f'/api/friends/requests/add/{self.bob.id}/')
+
+        self.assertEqual(response.status_code, 201)
+        notification = Notification.objects.get(recipient=self.bob)
+        self.assertEqual((notification.kind, notification.actor), (FRIEND_REQUEST, self.alice))
+        self.assertEqual(unread_count(self.bob.id), 1)
+
+    def test_accepting_a_friend_request_notifies_sender(self):
+        self.client.force_authenticate(self.alice)
+        self.client.post(f'/api/friends/requests/add/{self.bob.id}/')
+        friend_request = FriendRequest.objects.get(sender=self.alice, receiver=self.bob)
+
+        self.client.force_authenticate(self.bob)
+        response = self.client.post('/api/friends/requests/accept/', {'request_id': friend_request.id})
+
+        self.assertEqual(response.status_code, 200)
+        notification = Notification.objects.get(recipient=self.alice)
+        self.assertEqual((notification.kind, notification.actor), (FRIEND_ACCEPT, self.bob))
+
+    def test_follow_notifies_followed_user(self):
+        self.client.force_authenticate(self.alice)
+        self.client.post(f'/api/follow/user/{self.bob.id}/')
+
+        notification = Notification.objects.get(recipient=self.bob)
+        self.assertEqual((notification.kind, notification.actor), (FOLLOW, self.alice))
+
+    def test_messages_are_coalesced_per_chat(self):
+        chat, _ = Chat.objects.get_or_create_pair(self.alice.id, self.bob.id)
+        persist_messages([ChatMessage(chat=chat, sender=self.alice, content='hi')])
+        persist_messages([ChatMessage(chat=chat, sender=self.alice, content=str(i)) for i in range(3)])
+
+        notification = Notification.objects.get(recipient=self.bob)
+        self.assertEqual((notification.kind, notification.chat_id, notification.count), (MESSAGE, chat.id, 4))
+        self.assertEqual(unread_count(self.bob.id), 1)
+        self.assertFalse(Notification.objects.filter(recipient=self.alice).exists())
+
+    def test_reading_the_chat_reads_its_message_notification(self):
+        chat, _ = Chat.objects.get_or_create_pair(self.alice.id, self.bob.id)
+        first, second = persist_messages([ChatMessage(chat=chat, sender=self.alice, content=str(i)) for i in range(2)])
+
+        chat.mark_read(self.bob, first.id)
+        self.assertEqual(unread_count(self.bob.id), 1)
+
+        chat.mark_read(self.bob, second.id)
+        self.assertEqual(unread_count(self.bob.id), 0)
+        self.assertIsNotNone(Notification.objects.get(recipient=self.bob).read_at)
+
+
+class NotificationReadViewTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.client.force_authenticate(self.alice)
+        for user in User.objects.bulk_create([User(username=f'fan{i}') for i in range(3)]):
+            self.client.force_authenticate(user)
+            self.client.post(f'/api/follow/user/{self.bob.id}/')
+        self.client.force_authenticate(self.bob)
+
+    def test_read_up_to_an_id(self):
+        first = Notification.objects.filter(recipient=self.bob).order_by('id').first()
+        response = self.client.post('/api/notifications/read/', {'up_to': first.id})
+
+        self.assertEqual(response.data, {'marked': 1, 'unread': 2})
+        self.assertEqual(self.client.get('/api/notifications/unread/').data, {'unread': 2})
+
+    def test_read_all(self):
+        response = self.client.post('/api/notifications/read/', {})
+
+        self.assertEqual(response.data, {'marked': 3, 'unread': 0})
+        response = self.client.get('/api/notifications/', {'unread': 'true'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_read_only_touches_own_notifications(self):
+        self.client.force_authenticate(self.alice)
+        response = self.client.post('/api/notifications/read/', {})
+
+        self.assertEqual(response.data, {'marked': 0, 'unread': 0})
+        self.assertEqual(unread_count(self.bob.id), 3)
@@ -0,0 +1,49 @@
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.pagination import IdCursorPagination
+
+from .delivery import mark_read, unread_count
+from .models import Notification
+from .serializers import NotificationReadSerializer, NotificationSerializer
+
+
+class NotificationCursorPagination(IdCursorPagination):
+    """Newest first, served by the (recipient, id) index"""
+    ordering = '-id'
+
+
+class NotificationListView(generics.ListAPIView):
+    """The current user's notifications, newest first; ?unread=true for unread ones only"""
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = NotificationCursorPagination
+
+    def get_queryset(self):
+        notifications = Notification.objects.filter(recipient=self.request.user).select_related('actor').only(
+            'kind', 'actor_id', 'chat_id', 'count', 'created_at', 'updated_at', 'read_at', 'actor__username'
+        )
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            notifications = notifications.filter(read_at__isnull=True)
+        return notifications
+
+
+class UnreadCountView(APIView):
+    """Get the current user's unread notification count"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': unread_count(request.user.id)})
+
+
+class NotificationReadView(APIView):
+    """Mark the current user's notifications read, up to an id or all of them"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = NotificationReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        marked, unread = mark_read(request.user.id, serializer.validated_data.get('up_to'))
+        return Response({'marked': marked, 'unread': unread}, status=status.HTTP_200_OK)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Profile, UserAnimeList, TempDeletedAnime
+from .models import AccountDeletion, Profile, UserAnimeList, TempDeletedAnime
 
 
 @admin.register(Profile)
@@ -20,4 +20,12 @@ class UserAnimeListAdmin(admin.ModelAdmin):
 class TempDeletedAnimeAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'time_deleted']
     search_fields = ['title', 'author__username']
-    list_filter = ['time_deleted']
\ No newline at end of file
+    list_filter = ['time_deleted']
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = ['username', 'user_id', 'requested_at', 'rows_deleted', 'rows_total', 'finished_at']
+    search_fields = ['username']
+    readonly_fields = ['user_id', 'username', 'requested_at', 'step', 'rows_total', 'rows_deleted', 'batches',
+                       'updated_at', 'finished_at']
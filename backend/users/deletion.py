@@ -0,0 +1,172 @@
+"""
+Account deletion in bounded batches.
+
+Deleting a User cascades through everything that references it in a single
+transaction, which holds SQLite's write lock for as long as the heaviest account
+takes. request_deletion() instead deactivates the account straight away and
+queues an AccountDeletion. purge_batch() then removes at most
+ACCOUNT_PURGE_BATCH_SIZE rows per transaction, one step of PURGE_STEPS at a
+time, and keeps the friend, follow and message counters of everyone else
+correct as it goes, along with the previews of chats whose last message goes
+and the unread counters of members who hadn't read it.
+Archived messages are dropped by re-indexing filtered copies of their blocks
+(see chat.archive). The User row is deleted last, once only a handful of rows
+are left to cascade. The purge_deleted_accounts command drives the batches.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from anime.models import Genre
+from blocks.models import Block
+from chat.archive import copy_without_senders, segments_sent_by
+from chat.models import Chat, ChatMessage, ChatReadState
+from chat.persistence import PREVIEW_LENGTH
+from follow.models import Follow, FollowEdge
+from friends.models import FriendList, FriendRequest
+from notifications.models import Notification, NotificationInbox
+
+from .models import AccountDeletion, SeenAnime, TasteBucket, TasteSignature, TempDeletedAnime, UserAnimeList
+
+
+def adjust_chat_summaries(batch):
+    for chat_id, count in batch.values('chat_id').annotate(count=Count('id')).values_list('chat_id', 'count'):
+        Chat.objects.filter(pk=chat_id).update(message_count=F('message_count') - count)
+    # Each other member stops counting the messages past their read pointer, one UPDATE for all of them
+    unread = (batch.filter(chat_id=OuterRef('chat_id'), id__gt=Coalesce(OuterRef('last_read_message_id'), 0))
+              .values('chat_id').annotate(count=Count('id')).values('count'))
+    ChatReadState.objects.filter(chat_id__in=batch.values('chat_id'), unread_count__gt=0).exclude(
+        user_id__in=batch.values('sender_id')
+    ).update(unread_count=Greatest(F('unread_count') - Coalesce(Subquery(unread), 0), 0))
+    # Previews of the sender's messages fall back to the latest message left from anyone else
+    sender_ids = batch.values('sender_id')
+    for chat in Chat.objects.filter(pk__in=batch.values('chat_id'), last_message_sender_id__in=sender_ids):
+        last = (ChatMessage.objects.filter(chat=chat).exclude(sender_id__in=sender_ids)
+                .order_by('-timestamp', '-id').only('content', 'sender_id', 'timestamp').first())
+        Chat.objects.filter(pk=chat.pk).update(
+            last_message_preview=last.content[:PREVIEW_LENGTH] if last else '',
+            last_message_sender_id=last.sender_id if last else None,
+            last_message_at=last.timestamp if last else None,
+        )
+
+
+def strip_archived_messages(batch):
+    # The segments don't say whose deletion this is, so drop every account being purged
+    purging = AccountDeletion.objects.filter(finished_at__isnull=True).values_list('user_id', flat=True)
+    for chat_id, count in copy_without_senders(batch, purging).items():
+        Chat.objects.filter(pk=chat_id).update(message_count=F('message_count') - count)
+
+
+def hand_over_groups(batch):
+    # The rows are still there, so the leaving user is excluded from the successors explicitly
+    leaving = set(batch.values_list('user_id', flat=True))
+    for chat in Chat.objects.filter(pk__in=batch.values('chat_id'), is_group=True, created_by_id__in=leaving):
+        chat.hand_over(leaving=leaving)
+
+
+def adjust_friend_counts(batch):
+    # Each row is a different friend list, so one decrement per list
+    FriendList.objects.filter(pk__in=batch.values('friendlist_id')).update(friend_count=F('friend_count') - 1)
+
+
+def adjust_follower_counts(batch):
+    Follow.objects.filter(user_id__in=batch.values('followee_id')).update(follower_count=F('follower_count') - 1)
+
+
+def adjust_following_counts(batch):
+    Follow.objects.filter(user_id__in=batch.values('follower_id')).update(following_count=F('following_count') - 1)
+
+
+def adjust_unread_notifications(batch):
+    unread = batch.filter(read_at__isnull=True).values('recipient_id').annotate(count=Count('id'))
+    for recipient_id, count in unread.values_list('recipient_id', 'count'):
+        NotificationInbox.objects.filter(user_id=recipient_id).update(unread_count=F('unread_count') - count)
+
+
+# (name, rows still to delete, counter fix-up run on a batch before it is deleted).
+# Taste and seen rows go first so deleting list entries doesn't rebuild or rewrite them.
+PURGE_STEPS = [
+    ('taste buckets', lambda user_id: TasteBucket.objects.filter(user_id=user_id), None),
+    ('taste signature', lambda user_id: TasteSignature.objects.filter(user_id=user_id), None),
+    ('seen anime', lambda user_id: SeenAnime.objects.filter(user_id=user_id), None),
+    ('anime list', lambda user_id: UserAnimeList.objects.filter(author_id=user_id), None),
+    ('deleted anime', lambda user_id: TempDeletedAnime.objects.filter(author_id=user_id), None),
+    ('genres', lambda user_id: Genre.objects.filter(author_id=user_id), None),
+    ('chat messages', lambda user_id: ChatMessage.objects.filter(sender_id=user_id), adjust_chat_summaries),
+    ('archived chat messages', segments_sent_by, strip_archived_messages),
+    ('chat read states', lambda user_id: ChatReadState.objects.filter(user_id=user_id), None),
+    ('chat memberships', lambda user_id: Chat.participants.through.objects.filter(user_id=user_id),
+     hand_over_groups),
+    ('sent friend requests', lambda user_id: FriendRequest.objects.filter(sender_id=user_id), None),
+    ('received friend requests', lambda user_id: FriendRequest.objects.filter(receiver_id=user_id), None),
+    ('in friend lists', lambda user_id: FriendList.friends.through.objects.filter(user_id=user_id),
+     adjust_friend_counts),
+    ('own friend list', lambda user_id: FriendList.friends.through.objects.filter(friendlist__user_id=user_id),
+     None),
+    ('following', lambda user_id: FollowEdge.objects.filter(follower_id=user_id), adjust_follower_counts),
+    ('followers', lambda user_id: FollowEdge.objects.filter(followee_id=user_id), adjust_following_counts),
+    ('notifications', lambda user_id: Notification.objects.filter(recipient_id=user_id), None),
+    ('notifications caused', lambda user_id: Notification.objects.filter(actor_id=user_id),
+     adjust_unread_notifications),
+    ('blocks', lambda user_id: Block.objects.filter(blocker_id=user_id), None),
+    ('blocked by', lambda user_id: Block.objects.filter(blocked_id=user_id), None),
+]
+
+
+def request_deletion(user):
+    """Deactivate the account and revoke its tokens now; the rows are purged later"""
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        Token.objects.filter(user_id=user.pk).delete()
+        deletion, _ = AccountDeletion.objects.get_or_create(user_id=user.pk, defaults={
+            'username': user.username,
+            'rows_total': sum(rows(user.pk).count() for _, rows, _ in PURGE_STEPS),
+        })
+    user.is_active = False
+    return deletion
+
+
+def purge_batch(deletion, batch_size=None):
+    """
+    Delete the next batch of one account's rows in its own transaction.
+    Returns the number of rows removed, or 0 once the account is gone.
+    """
+    if deletion.finished_at is not None:
+        return 0
+    batch_size = batch_size or settings.ACCOUNT_PURGE_BATCH_SIZE
+    while deletion.step < len(PURGE_STEPS):
+        _, rows, adjust = PURGE_STEPS[deletion.step]
+        with transaction.atomic():
+            queryset = rows(deletion.user_id)
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if ids:
+                batch = queryset.model.objects.filter(pk__in=ids)
+                if adjust is not None:
+                    adjust(batch)
+                batch.delete()
+                deletion.rows_deleted += len(ids)
+                deletion.batches += 1
+                deletion.save(update_fields=['rows_deleted', 'batches', 'updated_at'])
+                return len(ids)
+            deletion.step += 1
+            deletion.save(update_fields=['step', 'updated_at'])
+
+    # Only one-to-one rows and nullable references are left for the cascade
+    with transaction.atomic():
+        User.objects.filter(pk=deletion.user_id).delete()
+        deletion.finished_at = timezone.now()
+        deletion.batches += 1
+        deletion.save(update_fields=['finished_at', 'batches', 'updated_at'])
+    return 1
+
+
+def step_name(deletion):
+    if deletion.finished_at is not None:
+        return 'done'
+    if deletion.step < len(PURGE_STEPS):
+        return PURGE_STEPS[deletion.step][0]
+    return 'account'
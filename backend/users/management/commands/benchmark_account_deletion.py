@@ -0,0 +1,161 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from chat.models import Chat, ChatMessage
+from follow.models import Follow, FollowEdge
+from friends.models import FriendList, FriendRequest
+from users.deletion import purge_batch, request_deletion
+from users.models import TempDeletedAnime, UserAnimeList
+
+
+class Writer(threading.Thread):
+    """Small write transactions in a loop, recording how long each one waited for the lock"""
+
+    def __init__(self, user_id, interval):
+        super().__init__(daemon=True)
+        self.user_id = user_id
+        self.interval = interval
+        self.latencies = []
+        self.failures = 0
+        self.stopping = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopping.is_set():
+                started = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        Follow.objects.filter(user_id=self.user_id).update(following_count=F('following_count'))
+                except OperationalError:
+                    # "database is locked": the wait outlasted SQLite's busy timeout
+                    self.failures += 1
+                self.latencies.append(time.perf_counter() - started)
+                time.sleep(self.interval)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    help = "Compare write-lock hold times of a cascading account delete and the batched purge"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anime', type=int, default=5000, help='Anime list entries of the deleted user')
+        parser.add_argument('--messages', type=int, default=50000, help='Chat messages sent by the deleted user')
+        parser.add_argument('--friends', type=int, default=500)
+        parser.add_argument('--followers', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds between purge batches')
+
+    def handle(self, *args, **options):
+        # Lock behaviour needs a real file; the default sqlite test database lives in memory
+        path = os.path.join(tempfile.mkdtemp(), 'account_deletion_bench.sqlite3')
+        connection.settings_dict['TEST']['NAME'] = path
+        # Take the write lock at BEGIN, so a transaction that reads before writing waits
+        # for the lock instead of failing when the concurrent writer holds it
+        connection.settings_dict['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            others = self.create_others(max(options['friends'], options['followers']))
+            bystander = others[-1]
+            for name, delete in (('cascade', self.delete_cascade), ('batched', self.delete_batched)):
+                user = self.create_heavy_user(name, others, options)
+                writer = Writer(bystander, interval=0.002)
+                writer.start()
+                started = time.perf_counter()
+                holds = delete(user, options)
+                elapsed = time.perf_counter() - started
+                writer.stop()
+                waits = sorted(writer.latencies)
+                self.stdout.write(
+                    f"{name:>8}: {elapsed:6.2f}s total, {len(holds)} transactions, "
+                    f"max lock hold {max(holds) * 1000:8.1f}ms | concurrent writer: "
+                    f"p50 {statistics.median(waits) * 1000:6.1f}ms, max {waits[-1] * 1000:8.1f}ms, "
+                    f"{writer.failures} timed out"
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def delete_cascade(self, user, options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            user.delete()
+        return [time.perf_counter() - started]
+
+    def delete_batched(self, user, options):
+        deletion = request_deletion(user)
+        holds = []
+        while True:
+            started = time.perf_counter()
+            if not purge_batch(deletion, options['batch_size']):
+                break
+            holds.append(time.perf_counter() - started)
+            time.sleep(options['pause'])
+        return holds
+
+    def create_others(self, count):
+        User.objects.bulk_create([User(username=f'bench_other_{i}') for i in range(count)])
+        ids = list(User.objects.filter(username__startswith='bench_other_').values_list('id', flat=True))
+        FriendList.objects.bulk_create([FriendList(user_id=user_id) for user_id in ids])
+        Follow.objects.bulk_create([Follow(user_id=user_id) for user_id in ids])
+        return ids
+
+    def create_heavy_user(self, name, others, options):
+        user = User.objects.create_user(f'bench_heavy_{name}')
+        now = timezone.now()
+        UserAnimeList.objects.bulk_create([
+            UserAnimeList(author=user, title=f'Anime {i}', mal_id=i, watched=i % 2 == 0) for i in range(options['anime'])
+        ], batch_size=1000)
+        TempDeletedAnime.objects.bulk_create([
+            TempDeletedAnime(author=user, title=f'Dropped {i}', mal_id=i) for i in range(options['anime'] // 5)
+        ], batch_size=1000)
+
+        friends = others[:options['friends']]
+        lists = dict(FriendList.objects.filter(user_id__in=friends).values_list('user_id', 'id'))
+        Through = FriendList.friends.through
+        own_list = FriendList.objects.get(user=user)
+        Through.objects.bulk_create(
+            [Through(friendlist_id=own_list.id, user_id=friend) for friend in friends]
+            + [Through(friendlist_id=lists[friend], user_id=user.id) for friend in friends],
+            batch_size=1000,
+        )
+        FriendRequest.objects.bulk_create([
+            FriendRequest(sender=user, receiver_id=friend, is_active=False, is_accepted=True) for friend in friends
+        ], batch_size=1000)
+        FollowEdge.objects.bulk_create(
+            [FollowEdge(follower=user, followee_id=other) for other in others[:options['followers']]]
+            + [FollowEdge(follower_id=other, followee=user) for other in others[:options['followers']]],
+            batch_size=1000,
+        )
+
+        chats = [Chat.objects.get_or_create_pair(user, friend)[0] for friend in friends[:50]]
+        ChatMessage.objects.bulk_create([
+            ChatMessage(chat=chats[i % len(chats)], sender=user, content=f'message {i}', timestamp=now,
+                        seq=i // len(chats) + 1)
+            for i in range(options['messages'])
+        ], batch_size=1000)
+
+        # bulk_create skips the counter upkeep the app does, and the purge decrements them
+        for chat in chats:
+            Chat.objects.filter(pk=chat.pk).update(message_count=chat.messages.count(), last_seq=chat.messages.count())
+        FriendList.objects.filter(user_id__in=friends).update(friend_count=F('friend_count') + 1)
+        FriendList.objects.filter(pk=own_list.pk).update(friend_count=len(friends))
+        followed = others[:options['followers']]
+        Follow.objects.filter(user_id__in=followed).update(
+            follower_count=F('follower_count') + 1, following_count=F('following_count') + 1,
+        )
+        Follow.objects.filter(user=user).update(follower_count=len(followed), following_count=len(followed))
+        return user
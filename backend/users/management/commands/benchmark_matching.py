@@ -0,0 +1,77 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.matching import LSHIndex, RERANK_FACTOR, signature_for
+
+
+class Command(BaseCommand):
+    help = "Measure MinHash/LSH matching recall and latency against exact Jaccard on synthetic users"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--catalog', type=int, default=20000, help='Number of distinct titles')
+        parser.add_argument('--clusters', type=int, default=500, help='Number of taste clusters')
+        parser.add_argument('--list-size', type=int, default=60, help='Average titles per user')
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        catalog = options['catalog']
+        k = options['k']
+
+        # Each cluster favours a pool of titles; users mostly draw from their cluster's pool
+        pools = [rng.sample(range(1, catalog + 1), 150) for _ in range(options['clusters'])]
+        users = []
+        for _ in range(options['users']):
+            pool = rng.choice(pools)
+            size = max(5, int(rng.gauss(options['list_size'], options['list_size'] / 4)))
+            own = rng.sample(pool, min(len(pool), int(size * 0.8)))
+            noise = [rng.randint(1, catalog) for _ in range(size - len(own))]
+            users.append(frozenset(own + noise))
+        self.stdout.write(f"Generated {len(users)} users over {catalog} titles")
+
+        started = time.perf_counter()
+        index = LSHIndex()
+        signatures = []
+        for user_id, titles in enumerate(users):
+            signature = signature_for(titles)
+            signatures.append(signature)
+            index.add(user_id, signature)
+        self.stdout.write(f"Built index in {time.perf_counter() - started:.1f}s")
+
+        exact_times, lsh_times, recalls, reranked_recalls = [], [], [], []
+        for query_id in rng.sample(range(len(users)), options['queries']):
+            query = users[query_id]
+
+            started = time.perf_counter()
+            exact = sorted(
+                ((len(query & other) / len(query | other), other_id)
+                 for other_id, other in enumerate(users) if other_id != query_id),
+                key=lambda item: (-item[0], item[1]),
+            )[:k]
+            exact_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            approximate = index.query(signatures[query_id], k=k * RERANK_FACTOR, exclude=query_id)
+            reranked = sorted(
+                ((len(query & users[other_id]) / len(query | users[other_id]), other_id)
+                 for _, other_id in approximate),
+                key=lambda item: (-item[0], item[1]),
+            )[:k]
+            lsh_times.append(time.perf_counter() - started)
+
+            expected = {other_id for _, other_id in exact}
+            recalls.append(len(expected & {other_id for _, other_id in approximate[:k]}) / len(expected))
+            reranked_recalls.append(len(expected & {other_id for _, other_id in reranked}) / len(expected))
+
+        self.stdout.write(f"recall@{k} (estimated): {statistics.mean(recalls):.3f}")
+        self.stdout.write(f"recall@{k} (re-ranked): {statistics.mean(reranked_recalls):.3f}")
+        self.stdout.write(f"exact  p50 {statistics.median(exact_times) * 1000:.1f}ms "
+                          f"max {max(exact_times) * 1000:.1f}ms")
+        self.stdout.write(f"lsh    p50 {statistics.median(lsh_times) * 1000:.2f}ms "
+                          f"max {max(lsh_times) * 1000:.2f}ms")
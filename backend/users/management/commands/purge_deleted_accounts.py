@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.deletion import purge_batch, step_name
+from users.models import AccountDeletion
+
+
+class Command(BaseCommand):
+    help = "Purge deactivated accounts in bounded batches, reporting progress as it goes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows per transaction (default ACCOUNT_PURGE_BATCH_SIZE)')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches, leaving the write lock to other writers')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Keep running, checking for new deletions this often')
+
+    def handle(self, *args, **options):
+        batches = 0
+        while True:
+            pending = list(AccountDeletion.objects.filter(finished_at__isnull=True).order_by('requested_at'))
+            for deletion in pending:
+                step = None
+                while options['max_batches'] is None or batches < options['max_batches']:
+                    if not purge_batch(deletion, options['batch_size']):
+                        break
+                    batches += 1
+                    if step_name(deletion) != step:
+                        step = step_name(deletion)
+                        self.stdout.write(f"{deletion.username}: {step} ({deletion.progress:.0%})")
+                    if options['pause']:
+                        time.sleep(options['pause'])
+                else:
+                    self.stdout.write(f"Stopped after {batches} batches")
+                    return
+                self.stdout.write(self.style.SUCCESS(
+                    f"{deletion.username}: purged {deletion.rows_deleted} rows in {deletion.batches} batches"
+                ))
+            if options['watch'] is None:
+                return
+            time.sleep(options['watch'])
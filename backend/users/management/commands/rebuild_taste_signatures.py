@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from users.matching import rebuild_signature
+
+
+class Command(BaseCommand):
+    help = "Rebuild MinHash taste signatures and LSH buckets from users' anime lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild the given user ID (may be repeated)')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or list(User.objects.values_list('id', flat=True))
+        rebuilt = 0
+        for user_id in user_ids:
+            rebuild_signature(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} taste signatures'))
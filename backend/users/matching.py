@@ -0,0 +1,193 @@
+"""
+Approximate taste matching with MinHash signatures and an LSH band index.
+
+A user's anime list (the set of mal_ids) is summarised by NUM_PERM min-hashes.
+The fraction of equal positions between two signatures estimates the Jaccard
+similarity of the underlying sets. Signatures are split into BANDS bands of
+ROWS rows; users that share any band bucket become candidates, so a lookup only
+touches a few buckets instead of comparing against every user. The best
+candidates by estimate are then re-ranked on their exact weighted Jaccard.
+"""
+import random
+from array import array
+from collections import Counter, defaultdict
+from functools import lru_cache
+from hashlib import blake2b
+
+from django.db import transaction
+
+from .models import UserAnimeList, TasteSignature, TasteBucket
+from .taste import compatibility_scores
+
+NUM_PERM = 128
+BANDS = 64
+ROWS = NUM_PERM // BANDS
+MAX_CANDIDATES = 500
+RERANK_FACTOR = 5
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20250428)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+EMPTY_SIGNATURE = (_MAX_HASH,) * NUM_PERM
+
+
+@lru_cache(maxsize=65536)
+def item_hashes(mal_id):
+    """Hash values of one title under every permutation; the catalog is small enough to memoize"""
+    return tuple(((a * mal_id + b) % _PRIME) & _MAX_HASH for a, b in _PERMUTATIONS)
+
+
+def signature_for(mal_ids):
+    """MinHash signature of a set of mal_ids"""
+    vectors = [item_hashes(mal_id) for mal_id in set(mal_ids)]
+    if not vectors:
+        return EMPTY_SIGNATURE
+    if len(vectors) == 1:
+        return vectors[0]
+    return tuple(map(min, *vectors))
+
+
+def add_item(signature, mal_id):
+    """Fold one more title into an existing signature"""
+    return tuple(map(min, signature, item_hashes(mal_id)))
+
+
+def band_buckets(signature):
+    """One bucket key per band; the band index is mixed in so keys never collide across bands"""
+    buckets = []
+    for band in range(BANDS):
+        rows = array('I', signature[band * ROWS:(band + 1) * ROWS])
+        digest = blake2b(rows.tobytes(), digest_size=8, person=band.to_bytes(2, 'little')).digest()
+        buckets.append(int.from_bytes(digest, 'little', signed=True))
+    return buckets
+
+
+def estimate_similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity: share of positions where the min-hashes agree"""
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / NUM_PERM
+
+
+def pack_signature(signature):
+    return array('I', signature).tobytes()
+
+
+def unpack_signature(data):
+    return tuple(array('I', bytes(data)))
+
+
+class LSHIndex:
+    """
+    In-memory LSH index over signatures.
+    Mirrors the database-backed index and is used for benchmarking and offline jobs.
+    """
+
+    def __init__(self):
+        self.signatures = {}
+        self.buckets = defaultdict(set)
+
+    def add(self, key, signature):
+        if signature == EMPTY_SIGNATURE:
+            return
+        self.signatures[key] = signature
+        for bucket in band_buckets(signature):
+            self.buckets[bucket].add(key)
+
+    def query(self, signature, k=10, exclude=None):
+        candidates = Counter()
+        for bucket in band_buckets(signature):
+            candidates.update(self.buckets.get(bucket, ()))
+        candidates.pop(exclude, None)
+        scored = [
+            (estimate_similarity(signature, self.signatures[key]), key)
+            for key, _ in candidates.most_common(MAX_CANDIDATES)
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored[:k]
+
+
+def _store_signature(user_id, signature, previous=None):
+    """Persist a signature and rewrite only the band buckets that changed"""
+    TasteSignature.objects.update_or_create(
+        user_id=user_id,
+        defaults={'signature': pack_signature(signature)},
+    )
+    if signature == EMPTY_SIGNATURE:
+        TasteBucket.objects.filter(user_id=user_id).delete()
+        return
+
+    new_buckets = band_buckets(signature)
+    old_buckets = band_buckets(previous) if previous and previous != EMPTY_SIGNATURE else [None] * BANDS
+    changed = [band for band in range(BANDS) if new_buckets[band] != old_buckets[band]]
+    if not changed:
+        return
+    TasteBucket.objects.filter(user_id=user_id, band__in=changed).delete()
+    TasteBucket.objects.bulk_create([
+        TasteBucket(user_id=user_id, band=band, bucket=new_buckets[band]) for band in changed
+    ])
+
+
+def rebuild_signature(user_id):
+    """Recompute a user's signature from their full anime list"""
+    mal_ids = UserAnimeList.objects.filter(
+        author_id=user_id, mal_id__isnull=False
+    ).values_list('mal_id', flat=True)
+    with transaction.atomic():
+        current = TasteSignature.objects.filter(user_id=user_id).first()
+        previous = unpack_signature(current.signature) if current else None
+        _store_signature(user_id, signature_for(mal_ids), previous)
+
+
+def add_to_signature(user_id, mal_id):
+    """Incrementally fold a newly listed title into the user's signature"""
+    with transaction.atomic():
+        current = TasteSignature.objects.select_for_update().filter(user_id=user_id).first()
+        if current is None:
+            return rebuild_signature(user_id)
+        previous = unpack_signature(current.signature)
+        _store_signature(user_id, add_item(previous, mal_id), previous)
+
+
+def remove_from_signature(user_id, mal_id):
+    """
+    Drop a title from the user's signature.
+    Min-hashes can't be decremented, so this only rebuilds when the removed title
+    was the minimum for at least one permutation.
+    """
+    current = TasteSignature.objects.filter(user_id=user_id).first()
+    if current is None:
+        return
+    signature = unpack_signature(current.signature)
+    if any(a == b for a, b in zip(signature, item_hashes(mal_id))):
+        rebuild_signature(user_id)
+
+
+def find_matches(user_id, k=10, exclude=frozenset()):
+    """
+    Approximate top-k users by taste similarity, skipping the ids in `exclude`.
+    Returns a list of (user_id, estimated similarity) pairs, best first.
+    """
+    current = TasteSignature.objects.filter(user_id=user_id).first()
+    if current is None:
+        return []
+    signature = unpack_signature(current.signature)
+    if signature == EMPTY_SIGNATURE:
+        return []
+
+    candidates = Counter(
+        TasteBucket.objects.filter(bucket__in=band_buckets(signature))
+        .exclude(user_id=user_id)
+        .values_list('user_id', flat=True)
+    )
+    for excluded in exclude:
+        candidates.pop(excluded, None)
+    candidate_ids = [candidate for candidate, _ in candidates.most_common(MAX_CANDIDATES)]
+    rows = TasteSignature.objects.filter(user_id__in=candidate_ids).values_list('user_id', 'signature')
+    scored = [(estimate_similarity(signature, unpack_signature(data)), other_id) for other_id, data in rows]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+
+    shortlist = [other_id for _, other_id in scored[:k * RERANK_FACTOR]]
+    exact = compatibility_scores(user_id, shortlist)
+    shortlist.sort(key=lambda other_id: (-exact[other_id], other_id))
+    return [(other_id, exact[other_id]) for other_id in shortlist[:k] if exact[other_id] > 0]
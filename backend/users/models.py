@@ -43,4 +43,67 @@ class TempDeletedAnime(models.Model):
     time_deleted = models.DateTimeField(auto_now_add=True, blank=True, null=True)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+
+class TasteSignature(models.Model):
+    """MinHash signature of a user's anime list, used for approximate taste matching"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='taste_signature')
+    signature = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username}'s taste signature"
+
+
+class TasteBucket(models.Model):
+    """One LSH band bucket of a user's taste signature"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='taste_buckets')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.user_id} band {self.band}"
+
+    class Meta:
+        unique_together = ['user', 'band']
+        indexes = [models.Index(fields=['bucket', 'user'], name='users_taste_bucket_idx')]
+
+
+class SeenAnime(models.Model):
+    """Compressed bitmap of the mal_ids a user has listed or skipped (see users.seen)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='seen_anime')
+    bitmap = models.BinaryField(default=b'')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}'s seen anime"
+
+
+class AccountDeletion(models.Model):
+    """
+    A deactivated account whose rows are being purged in batches (see users.deletion).
+    Keyed by the plain user id so the record outlives the User row.
+    """
+    user_id = models.IntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    # Index into users.deletion.PURGE_STEPS of the step in progress
+    step = models.PositiveSmallIntegerField(default=0)
+    rows_total = models.PositiveBigIntegerField(default=0)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Deletion of {self.username} ({self.rows_deleted}/{self.rows_total} rows)"
+
+    @property
+    def progress(self):
+        """Fraction of the rows counted at request time that are gone"""
+        if self.finished_at is not None:
+            return 1.0
+        if not self.rows_total:
+            return 0.0
+        return min(self.rows_deleted / self.rows_total, 1.0)
@@ -0,0 +1,132 @@
+"""
+Per-user "seen" bitmaps for the swipe deck.
+
+Everything a user has added to their list or skipped (UserAnimeList and
+TempDeletedAnime) is kept as a compressed Bitmap of mal_ids in SeenAnime, so
+picking unseen titles never joins against either table. The bitmap is updated
+in the same transaction as the swipe that changes it (see users.signals) and
+cached; a user without a row is rebuilt from the source tables on first use,
+and `manage.py rebuild_seen_anime` rebuilds them all. The catalog of mal_ids is
+cached as a Bitmap too and dropped whenever an Anime row changes. Bitmaps
+only hold non-negative ids, so rows with a negative mal_id (which the API
+rejects, but older rows or the admin may have) are left out of both.
+"""
+import random
+
+from django.core.cache import cache
+from django.db import transaction
+
+from anime.models import Anime
+from core.bitmap import Bitmap
+
+from .models import SeenAnime, TempDeletedAnime, UserAnimeList
+
+SEEN_CACHE_TIMEOUT = 60 * 60
+CATALOG_CACHE_KEY = 'seen:catalog'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+# Below this share of the catalog seen, random probes find unseen titles quickly
+PROBE_MAX_SEEN_RATIO = 0.5
+
+_catalog = None
+
+
+def _cache_key(user_id):
+    return f'seen:user:{user_id}'
+
+
+def load_seen(user_id):
+    """The user's seen mal_ids straight from the list and skip tables"""
+    listed = UserAnimeList.objects.filter(author_id=user_id, mal_id__gte=0).values_list('mal_id', flat=True)
+    skipped = TempDeletedAnime.objects.filter(author_id=user_id, mal_id__gte=0).values_list('mal_id', flat=True)
+    return Bitmap([*listed, *skipped])
+
+
+def rebuild_seen(user_id):
+    """Recompute and store a user's bitmap from the source tables"""
+    bitmap = load_seen(user_id)
+    SeenAnime.objects.update_or_create(user_id=user_id, defaults={'bitmap': bitmap.to_bytes()})
+    transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+    return bitmap
+
+
+def seen_bitmap(user_id):
+    """The user's seen bitmap, from the cache, the stored blob or a rebuild, in that order"""
+    data = cache.get(_cache_key(user_id))
+    if data is None:
+        data = SeenAnime.objects.filter(user_id=user_id).values_list('bitmap', flat=True).first()
+        if data is None:
+            data = rebuild_seen(user_id).to_bytes()
+        cache.set(_cache_key(user_id), bytes(data), SEEN_CACHE_TIMEOUT)
+    return Bitmap.from_bytes(data)
+
+
+def _update_seen(user_id, change):
+    with transaction.atomic():
+        current = SeenAnime.objects.select_for_update().filter(user_id=user_id).first()
+        if current is None:
+            # Built from the source tables on first read, which will include this change
+            return
+        bitmap = Bitmap.from_bytes(current.bitmap)
+        if change(bitmap):
+            current.bitmap = bitmap.to_bytes()
+            current.save(update_fields=['bitmap', 'updated_at'])
+            transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+
+
+def mark_seen(user_id, mal_id):
+    """Add a swiped title to the user's bitmap"""
+    if mal_id < 0:
+        return
+    _update_seen(user_id, lambda bitmap: bitmap.add(mal_id))
+
+
+def unmark_seen(user_id, mal_id):
+    """Drop a title from the bitmap unless it is still listed or skipped"""
+    if mal_id < 0:
+        return
+    def discard(bitmap):
+        if (UserAnimeList.objects.filter(author_id=user_id, mal_id=mal_id).exists()
+                or TempDeletedAnime.objects.filter(author_id=user_id, mal_id=mal_id).exists()):
+            return False
+        return bitmap.discard(mal_id)
+    _update_seen(user_id, discard)
+
+
+def catalog():
+    """(sorted mal_ids, Bitmap) of every anime in the catalog"""
+    global _catalog
+    data = cache.get(CATALOG_CACHE_KEY)
+    if data is None:
+        data = Bitmap(Anime.objects.filter(mal_id__gte=0).values_list('mal_id', flat=True)).to_bytes()
+        cache.set(CATALOG_CACHE_KEY, data, CATALOG_CACHE_TIMEOUT)
+    # Decoding and listing the catalog is the costly part; redo it only when the blob changed
+    if _catalog is None or _catalog[0] != data:
+        bitmap = Bitmap.from_bytes(data)
+        _catalog = (data, list(bitmap), bitmap)
+    return _catalog[1], _catalog[2]
+
+
+def invalidate_catalog():
+    cache.delete(CATALOG_CACHE_KEY)
+
+
+def unseen_sample(user_id, k, rng=random):
+    """
+    Up to k random mal_ids from the catalog that the user has not seen.
+    While most of the catalog is unseen, random probes checked against the bitmap
+    find them in about k lookups; past that the full difference is taken instead.
+    """
+    mal_ids, catalog_bitmap = catalog()
+    if not mal_ids:
+        return []
+    seen = seen_bitmap(user_id)
+    if len(seen) <= len(mal_ids) * PROBE_MAX_SEEN_RATIO:
+        picked = set()
+        for _ in range(k * 4):
+            mal_id = rng.choice(mal_ids)
+            if mal_id not in seen:
+                picked.add(mal_id)
+                if len(picked) == k:
+                    return list(picked)
+    unseen = list(catalog_bitmap.difference(seen))
+    return rng.sample(unseen, min(k, len(unseen)))
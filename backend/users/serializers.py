@@ -1,7 +1,8 @@
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import UserAnimeList, Profile, TempDeletedAnime
+from .deletion import step_name
+from .models import AccountDeletion, UserAnimeList, Profile, TempDeletedAnime
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -48,14 +49,22 @@ class UserAnimeSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserAnimeList
         fields = ['id', 'author', 'username', 'title', 'image_url', 'mal_id', 'watched', 'plan_to_watch', 'add_time']
-        extra_kwargs = {'author': {'read_only': True}}
+        # MAL ids are positive; the seen bitmaps (users.seen) only hold non-negative ids
+        extra_kwargs = {'author': {'read_only': True}, 'mal_id': {'min_value': 0}}
+
+
+class UserAnimeUpdateSerializer(UserAnimeSerializer):
+    """Changes to a list entry; which title it is stays fixed, as counts and bitmaps are keyed on it"""
+
+    class Meta(UserAnimeSerializer.Meta):
+        read_only_fields = ['mal_id']
 
 
 class TempDeletedAnimeSerializer(serializers.ModelSerializer):
     class Meta:
         model = TempDeletedAnime
         fields = ['id', 'author', 'title', 'image_url', 'mal_id', 'time_deleted']
-        extra_kwargs = {'author': {'read_only': True}}
+        extra_kwargs = {'author': {'read_only': True}, 'mal_id': {'min_value': 0}}
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -67,4 +76,25 @@ class ProfileSerializer(serializers.ModelSerializer):
 class AllUsersSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
-        fields = ['id', 'username', 'profile_image', 'user_id']
\ No newline at end of file
+        fields = ['id', 'username', 'profile_image', 'user_id']
+
+
+class TasteMatchSerializer(serializers.Serializer):
+    """A user matched by anime taste with their estimated similarity"""
+    user_id = serializers.IntegerField()
+    username = serializers.CharField()
+    profile_image = serializers.ImageField(allow_null=True)
+    similarity = serializers.FloatField()
+
+
+class AccountDeletionSerializer(serializers.ModelSerializer):
+    """Progress of an account's purge"""
+    step = serializers.SerializerMethodField()
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = AccountDeletion
+        fields = ['user_id', 'requested_at', 'step', 'rows_total', 'rows_deleted', 'progress', 'finished_at']
+
+    def get_step(self, obj):
+        return step_name(obj)
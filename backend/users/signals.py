@@ -1,7 +1,14 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from anime.models import Anime
+from anime.popularity import adjust_watch_count
+from anime.trending import record_add
+from .models import Profile, TempDeletedAnime, UserAnimeList
+from .taste import invalidate_taste
+from .matching import add_to_signature, remove_from_signature
+from .seen import invalidate_catalog, mark_seen, unmark_seen
 
 
 @receiver(post_save, sender=User)
@@ -17,4 +24,75 @@ def create_user_profile(sender, instance, created, **kwargs):
 def save_user_profile(sender, instance, **kwargs):
     """Save the Profile when the User is saved"""
     if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+        instance.profile.save()
+
+@receiver(post_save, sender=UserAnimeList)
+@receiver(post_delete, sender=UserAnimeList)
+def invalidate_user_taste(sender, instance, **kwargs):
+    """Drop cached compatibility scores when a user's anime list changes"""
+    if instance.author_id:
+        invalidate_taste(instance.author_id)
+
+
+@receiver(post_save, sender=UserAnimeList)
+def add_to_taste_signature(sender, instance, created, **kwargs):
+    """Fold a newly listed title into the user's MinHash signature"""
+    if created and instance.author_id and instance.mal_id is not None:
+        author_id, mal_id = instance.author_id, instance.mal_id
+        transaction.on_commit(lambda: add_to_signature(author_id, mal_id))
+
+
+@receiver(post_delete, sender=UserAnimeList)
+def remove_from_taste_signature(sender, instance, **kwargs):
+    """
+    Drop a removed title from the user's MinHash signature.
+    Deferred to commit so a cascading user delete never re-creates signature rows.
+    """
+    if instance.author_id and instance.mal_id is not None:
+        author_id, mal_id = instance.author_id, instance.mal_id
+        transaction.on_commit(lambda: remove_from_signature(author_id, mal_id))
+
+
+@receiver(post_save, sender=UserAnimeList)
+@receiver(post_save, sender=TempDeletedAnime)
+def mark_swipe_seen(sender, instance, created, **kwargs):
+    """Record a listed or skipped title in the user's seen bitmap, in the swipe's transaction"""
+    if created and instance.author_id and instance.mal_id is not None:
+        mark_seen(instance.author_id, instance.mal_id)
+
+
+@receiver(post_delete, sender=UserAnimeList)
+@receiver(post_delete, sender=TempDeletedAnime)
+def unmark_swipe_seen(sender, instance, **kwargs):
+    """Return a title to the deck once it is neither listed nor skipped"""
+    if instance.author_id and instance.mal_id is not None:
+        unmark_seen(instance.author_id, instance.mal_id)
+
+
+@receiver(post_save, sender=Anime)
+@receiver(post_delete, sender=Anime)
+def invalidate_seen_catalog(sender, instance, **kwargs):
+    """Drop the cached catalog bitmap when titles are added, changed or removed"""
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=UserAnimeList)
+def count_trending_add(sender, instance, created, **kwargs):
+    """Count a newly listed title towards the trending rankings once the add commits"""
+    if created and instance.mal_id is not None:
+        mal_id = instance.mal_id
+        transaction.on_commit(lambda: record_add(mal_id))
+
+
+@receiver(post_save, sender=UserAnimeList)
+def count_new_watch(sender, instance, created, **kwargs):
+    """Count an entry that is listed as already watched in its genres' popularity"""
+    if created and instance.watched:
+        adjust_watch_count(instance.mal_id, 1)
+
+
+@receiver(post_delete, sender=UserAnimeList)
+def uncount_watch(sender, instance, **kwargs):
+    """Take a removed watched entry out of its genres' popularity"""
+    if instance.watched:
+        adjust_watch_count(instance.mal_id, -1)
@@ -0,0 +1,180 @@
+"""
+Anime-taste compatibility between users.
+
+Each user's list is reduced to a sorted array of mal_ids with a parallel array of
+weights, so a pairwise score is a single linear merge instead of a query per pair.
+Scores and per-user arrays are cached under a per-user version token that is
+rotated whenever that user's list changes.
+"""
+from array import array
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from .models import UserAnimeList
+
+WATCHED_WEIGHT = 1.0
+PLAN_TO_WATCH_WEIGHT = 0.5
+SCORE_CACHE_TIMEOUT = 60 * 60 * 24
+ARRAY_CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(user_id):
+    return f'taste:version:{user_id}'
+
+
+def _pair_key(user_a, version_a, user_b, version_b):
+    if user_a > user_b:
+        user_a, version_a, user_b, version_b = user_b, version_b, user_a, version_a
+    return f'taste:score:{user_a}:{version_a}:{user_b}:{version_b}'
+
+
+def invalidate_taste(user_id):
+    """Rotate the user's version token so every cached score involving them is skipped"""
+    cache.set(_version_key(user_id), uuid4().hex[:12], None)
+
+
+def get_taste_versions(user_ids):
+    """Return the current version token for each user, creating missing ones"""
+    keys = {_version_key(user_id): user_id for user_id in user_ids}
+    found = cache.get_many(keys.keys())
+    versions = {}
+    for key, user_id in keys.items():
+        if key not in found:
+            cache.add(key, uuid4().hex[:12], None)
+            found[key] = cache.get(key)
+        versions[user_id] = found[key]
+    return versions
+
+
+def entry_weight(watched):
+    """Weight of a list entry: watched titles count more than plan-to-watch ones"""
+    return WATCHED_WEIGHT if watched else PLAN_TO_WATCH_WEIGHT
+
+
+def load_weighted_lists(user_ids):
+    """
+    Load the anime lists of several users in one query.
+    Returns {user_id: (sorted mal_ids, weights)}; duplicate entries keep the higher weight.
+    """
+    weights = {user_id: {} for user_id in user_ids}
+    rows = UserAnimeList.objects.filter(
+        author_id__in=user_ids, mal_id__isnull=False
+    ).values_list('author_id', 'mal_id', 'watched')
+    for author_id, mal_id, watched in rows.iterator():
+        user_weights = weights[author_id]
+        weight = entry_weight(watched)
+        if weight > user_weights.get(mal_id, 0.0):
+            user_weights[mal_id] = weight
+
+    lists = {}
+    for user_id, user_weights in weights.items():
+        mal_ids = sorted(user_weights)
+        lists[user_id] = (mal_ids, [user_weights[mal_id] for mal_id in mal_ids])
+    return lists
+
+
+def weighted_jaccard(list_a, list_b):
+    """
+    Weighted Jaccard similarity of two (sorted mal_ids, weights) arrays:
+    sum of min weights over sum of max weights across the union.
+    """
+    ids_a, weights_a = list_a
+    ids_b, weights_b = list_b
+    i = j = 0
+    shared = total = 0.0
+    while i < len(ids_a) and j < len(ids_b):
+        if ids_a[i] == ids_b[j]:
+            shared += min(weights_a[i], weights_b[j])
+            total += max(weights_a[i], weights_b[j])
+            i += 1
+            j += 1
+        elif ids_a[i] < ids_b[j]:
+            total += weights_a[i]
+            i += 1
+        else:
+            total += weights_b[j]
+            j += 1
+    total += sum(weights_a[i:]) + sum(weights_b[j:])
+    return shared / total if total else 0.0
+
+
+def compatibility_scores(user_id, other_ids):
+    """
+    Compute taste compatibility between a user and many others in batch.
+    Cached pairs are served directly; the rest are scored from a single list query.
+    """
+    other_ids = [other_id for other_id in other_ids if other_id != user_id]
+    if not other_ids:
+        return {}
+
+    versions = get_taste_versions([user_id, *other_ids])
+    pair_keys = {
+        other_id: _pair_key(user_id, versions[user_id], other_id, versions[other_id])
+        for other_id in other_ids
+    }
+    cached = cache.get_many(pair_keys.values())
+    scores = {other_id: cached[key] for other_id, key in pair_keys.items() if key in cached}
+
+    missing = [other_id for other_id in other_ids if other_id not in scores]
+    if missing:
+        lists = load_weighted_lists([user_id, *missing])
+        computed = {
+            other_id: round(weighted_jaccard(lists[user_id], lists[other_id]), 4)
+            for other_id in missing
+        }
+        cache.set_many({pair_keys[other_id]: score for other_id, score in computed.items()},
+                       SCORE_CACHE_TIMEOUT)
+        scores.update(computed)
+
+    return scores
+
+
+def plan_to_watch_arrays(user_ids):
+    """
+    Sorted arrays of the mal_ids each user plans to watch and hasn't watched yet.
+    Served from the cache where possible; misses are loaded together in one query.
+    """
+    versions = get_taste_versions(user_ids)
+    keys = {user_id: f'taste:ptw:{user_id}:{versions[user_id]}' for user_id in user_ids}
+    cached = cache.get_many(keys.values())
+    arrays = {user_id: array('i', cached[key]) for user_id, key in keys.items() if key in cached}
+
+    missing = [user_id for user_id in user_ids if user_id not in arrays]
+    if missing:
+        loaded = {user_id: set() for user_id in missing}
+        rows = UserAnimeList.objects.filter(
+            author_id__in=missing, plan_to_watch=True, watched=False, mal_id__isnull=False
+        ).values_list('author_id', 'mal_id')
+        for author_id, mal_id in rows.iterator():
+            loaded[author_id].add(mal_id)
+        for user_id, mal_ids in loaded.items():
+            arrays[user_id] = array('i', sorted(mal_ids))
+        cache.set_many({keys[user_id]: arrays[user_id].tobytes() for user_id in missing}, ARRAY_CACHE_TIMEOUT)
+
+    return arrays
+
+
+def intersect_sorted(arrays):
+    """
+    Intersect sorted integer arrays, smallest first.
+    Each survivor is looked up by binary search, so cost is bounded by the smallest array.
+    """
+    if not arrays:
+        return []
+    arrays = sorted(arrays, key=len)
+    common = list(arrays[0])
+    for other in arrays[1:]:
+        survivors = []
+        low = 0
+        for value in common:
+            low = bisect_left(other, value, low)
+            if low == len(other):
+                break
+            if other[low] == value:
+                survivors.append(value)
+        common = survivors
+        if not common:
+            break
+    return common
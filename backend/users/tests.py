@@ -1,3 +1,159 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from anime.models import Anime, AnimeListGenres, GenrePopularity
+from chat.archive import archive_chat, read_archived
+from chat.models import Chat, ChatMessage, ChatReadState
+from chat.persistence import persist_messages
+from friends.models import FriendRequest
+
+from .deletion import purge_batch, request_deletion
+from .models import TempDeletedAnime, UserAnimeList
+from .seen import rebuild_seen, seen_bitmap
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class SeenAnimeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='x')
+        self.client.force_authenticate(self.user)
+        rebuild_seen(self.user.id)
+
+    def test_negative_mal_ids_are_rejected(self):
+        for url in ('/api/users/anime/', '/api/users/anime/temp-deleted/'):
+            response = self.client.post(url, {'title': 'Bad', 'mal_id': -3})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('mal_id', response.data)
+
+    def test_swipes_are_marked_seen(self):
+        self.client.post('/api/users/anime/', {'title': 'Listed', 'mal_id': 1})
+        self.client.post('/api/users/anime/temp-deleted/', {'title': 'Skipped', 'mal_id': 70000})
+
+        self.assertEqual(list(seen_bitmap(self.user.id)), [1, 70000])
+
+    def test_rows_with_negative_mal_ids_are_left_out_of_the_bitmap(self):
+        UserAnimeList.objects.create(author=self.user, title='Legacy', mal_id=-3)
+        TempDeletedAnime.objects.create(author=self.user, title='Legacy', mal_id=-4)
+        UserAnimeList.objects.create(author=self.user, title='Listed', mal_id=5)
+
+        self.assertEqual(list(seen_bitmap(self.user.id)), [5])
+        self.assertEqual(list(rebuild_seen(self.user.id)), [5])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class UserAnimeUpdateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='x')
+        self.client.force_authenticate(self.user)
+        genre = AnimeListGenres.objects.create(name='Drama')
+        for mal_id in (1, 2):
+            Anime.objects.create(title=f'Anime {mal_id}', mal_id=mal_id).genres.add(genre)
+        UserAnimeList.objects.create(author=self.user, title='Anime 1', mal_id=1, watched=True)
+
+    def watches(self):
+        return dict(GenrePopularity.objects.values_list('anime__mal_id', 'watch_count'))
+
+    def test_watched_flips_move_the_count(self):
+        self.assertEqual(self.watches(), {1: 1})
+
+        self.client.put('/api/users/anime/update/1/', {'watched': False})
+        self.assertEqual(self.watches(), {1: 0})
+        self.client.put('/api/users/anime/update/1/', {'watched': True})
+        self.client.put('/api/users/anime/update/1/', {'watched': True})
+        self.assertEqual(self.watches(), {1: 1})
+
+    def test_mal_id_cannot_be_changed(self):
+        response = self.client.put('/api/users/anime/update/1/', {'mal_id': 2, 'watched': False})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(UserAnimeList.objects.filter(author=self.user, mal_id=1, watched=False).exists())
+        self.assertEqual(self.watches(), {1: 0})
+
+
+@override_settings(CHAT_ARCHIVE_ROOT=tempfile.mkdtemp(prefix='purge-tests-'))
+class AccountPurgeTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.chat, _ = Chat.objects.get_or_create_pair(self.alice.id, self.bob.id)
+
+    def purge(self, user):
+        deletion = request_deletion(user)
+        while purge_batch(deletion, batch_size=2):
+            pass
+
+    def test_purge_drops_archived_messages_and_stale_previews(self):
+        old = timezone.now() - timedelta(days=200)
+        persist_messages([
+            ChatMessage(chat=self.chat, sender=self.alice if i % 2 else self.bob, content=f'x{i}',
+                        timestamp=old + timedelta(seconds=i))
+            for i in range(6)
+        ])
+        archive_chat(self.chat.id, timezone.now() - timedelta(days=90), batch_size=4)
+        persist_messages([ChatMessage(chat=self.chat, sender=self.bob, content='hello'),
+                          ChatMessage(chat=self.chat, sender=self.alice, content='bye')])
+
+        self.purge(self.alice)
+
+        self.chat.refresh_from_db()
+        self.assertEqual((self.chat.last_message_preview, self.chat.last_message_sender_id), ('hello', self.bob.id))
+        self.assertEqual(self.chat.message_count, 4)
+        archived = read_archived(self.chat.id, limit=10)
+        self.assertEqual([message.content for message in archived], ['x4', 'x2', 'x0'])
+
+    def test_purge_drops_unread_messages_from_other_members_counters(self):
+        carol = User.objects.create_user('carol')
+        group = Chat.objects.create_group(self.alice, [self.bob.id, carol.id])
+        first, *_ = persist_messages([ChatMessage(chat=group, sender=self.alice, content=content) for content in 'abc'])
+        persist_messages([ChatMessage(chat=group, sender=carol, content='d')])
+        group.mark_read(self.bob, first.id)
+
+        self.purge(self.alice)
+
+        unread = dict(ChatReadState.objects.filter(chat=group).values_list('user__username', 'unread_count'))
+        self.assertEqual(unread, {'bob': 1, 'carol': 0})
+
+
+class WatchTogetherTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob).accept()
+        for mal_id in (1, 2):
+            Anime.objects.create(title=f'Anime {mal_id}', mal_id=mal_id)
+            for user in (self.alice, self.bob):
+                UserAnimeList.objects.create(author=user, title=f'Anime {mal_id}', mal_id=mal_id, plan_to_watch=True)
+        self.client.force_authenticate(self.alice)
+
+    def test_limit_is_clamped_to_at_least_one(self):
+        for limit in (-1, 0):
+            response = self.client.get('/api/users/watch-together/', {'ids': self.bob.id, 'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.data['count'], len(response.data['results'])), (2, 1))
+
+
+class UserMatchesTests(APITestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for user, mal_ids in ((self.alice, (1, 2, 3)), (self.bob, (1, 2, 3)), (self.carol, (1, 2, 4))):
+                for mal_id in mal_ids:
+                    UserAnimeList.objects.create(author=user, title=f'Anime {mal_id}', mal_id=mal_id)
+        self.client.force_authenticate(self.alice)
+
+    def test_k_is_clamped_to_at_least_one(self):
+        self.assertEqual(len(self.client.get('/api/users/matches/', {'k': 5}).data), 2)
+        for k in (-1, 0):
+            response = self.client.get('/api/users/matches/', {'k': k})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([match['username'] for match in response.data], ['bob'])
@@ -19,6 +19,8 @@ urlpatterns = [
     path('profile/<int:id>/', views.UserProfileView.as_view(), name='profile'),
     path('profile/<int:id>/update/', views.UserProfileUpdateView.as_view(), name='profile_update'),
     path('all/', views.AllUsersView.as_view(), name='all_users'),
+    path('matches/', views.UserMatchesView.as_view(), name='user_matches'),
+    path('watch-together/', views.WatchTogetherView.as_view(), name='watch_together'),
 
     # Anime list management
     path('anime/', views.UserAnimeView.as_view(), name='user_anime'),
@@ -1,4 +1,6 @@
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
 from rest_framework import generics, status
 from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -10,10 +12,20 @@ from core.permissions import IsOwnerOrReadOnly, IsSelfOrReadOnly
 from django.contrib.auth import authenticate, login, logout
 from rest_framework.authtoken.models import Token
 
+from anime.models import Anime
+from anime.popularity import adjust_watch_count
+from blocks.blocklist import request_blocklist
+from anime.serializers import AnimeSerializer
+from friends.models import FriendList
+
+from .deletion import request_deletion
+from .matching import find_matches
+from .taste import plan_to_watch_arrays, intersect_sorted
 from .models import Profile, UserAnimeList, TempDeletedAnime
 from .serializers import (
-    UserSerializer, ProfileSerializer, UserAnimeSerializer,
-    AllUsersSerializer, TempDeletedAnimeSerializer, LoginSerializer
+    UserSerializer, ProfileSerializer, UserAnimeSerializer, UserAnimeUpdateSerializer,
+    AllUsersSerializer, TempDeletedAnimeSerializer, LoginSerializer,
+    TasteMatchSerializer, AccountDeletionSerializer
 )
 
 
@@ -127,8 +139,8 @@ class UserAnimeDeleteView(generics.DestroyAPIView):
 
 
 class UserAnimeUpdateView(generics.UpdateAPIView):
-    """Update a user's anime entry by MAL ID"""
-    serializer_class = UserAnimeSerializer
+    """Update a user's anime entry by MAL ID; the MAL ID itself can't be changed"""
+    serializer_class = UserAnimeUpdateSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -136,12 +148,17 @@ class UserAnimeUpdateView(generics.UpdateAPIView):
 
     def put(self, request, mal_id):
         try:
-            user_anime = UserAnimeList.objects.get(mal_id=mal_id, author=request.user)
-            serializer = self.get_serializer(user_anime, data=request.data, partial=True)
-            if serializer.is_valid():
+            with transaction.atomic():
+                # Locked so concurrent updates can't both see the old status and count the flip twice
+                user_anime = UserAnimeList.objects.select_for_update().get(mal_id=mal_id, author=request.user)
+                was_watched = user_anime.watched
+                serializer = self.get_serializer(user_anime, data=request.data, partial=True)
+                if not serializer.is_valid():
+                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
                 serializer.save()
-                return Response({'message': 'Anime status updated successfully'}, status=status.HTTP_200_OK)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                if user_anime.watched != was_watched:
+                    adjust_watch_count(user_anime.mal_id, 1 if user_anime.watched else -1)
+            return Response({'message': 'Anime status updated successfully'}, status=status.HTTP_200_OK)
         except UserAnimeList.DoesNotExist:
             return Response({'error': 'Anime not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -162,10 +179,17 @@ class TempDeletedAnimeView(generics.ListCreateAPIView):
 
 class AllUsersView(generics.ListAPIView):
     """List all users with basic profile information"""
-    queryset = Profile.objects.all()
     serializer_class = AllUsersSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        # Accounts awaiting deletion disappear as soon as they are deactivated
+        profiles = Profile.objects.filter(user__is_active=True)
+        blocked = request_blocklist(self.request)
+        if blocked:
+            profiles = profiles.exclude(user_id__in=blocked)
+        return profiles
+
 
 class DeleteTempDeletedAnimeView(generics.DestroyAPIView):
     """Delete a single temporarily deleted anime entry"""
@@ -237,10 +261,76 @@ class LogoutView(APIView):
         return Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)
 
 
-class UserDetailsView(generics.RetrieveAPIView):
-    """Get currently authenticated user details"""
+class UserDetailsView(generics.RetrieveDestroyAPIView):
+    """Get currently authenticated user details, or delete the account"""
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
\ No newline at end of file
+        return self.request.user
+
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate now and purge the account's data in the background"""
+        deletion = request_deletion(request.user)
+        return Response(AccountDeletionSerializer(deletion).data, status=status.HTTP_202_ACCEPTED)
+
+
+class UserMatchesView(APIView):
+    """Get the users whose anime taste is most similar to the current user's"""
+    permission_classes = [IsAuthenticated]
+    max_matches = 50
+
+    def get(self, request, *args, **kwargs):
+        try:
+            k = max(1, min(int(request.query_params.get('k', 10)), self.max_matches))
+        except ValueError:
+            return Response({'error': 'k must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        matches = find_matches(request.user.id, k, exclude=request_blocklist(request))
+        profiles = Profile.objects.in_bulk([user_id for user_id, _ in matches], field_name='user_id')
+        data = [
+            {
+                'user_id': user_id,
+                'username': profiles[user_id].username,
+                'profile_image': profiles[user_id].profile_image,
+                'similarity': round(similarity, 4),
+            }
+            for user_id, similarity in matches if user_id in profiles
+        ]
+        serializer = TasteMatchSerializer(data, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class WatchTogetherView(APIView):
+    """Rank titles that the current user and the given friends all plan to watch"""
+    permission_classes = [IsAuthenticated]
+    max_group_size = 16
+    max_results = 100
+
+    def get(self, request, *args, **kwargs):
+        try:
+            ids = {int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()}
+            limit = max(1, min(int(request.query_params.get('limit', 20)), self.max_results))
+        except ValueError:
+            return Response({'error': 'ids and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids.discard(request.user.id)
+        if not ids:
+            return Response({'error': 'Provide at least one friend ID in ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) >= self.max_group_size:
+            return Response({'error': f'Groups are limited to {self.max_group_size} users'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        friend_ids = set(FriendList.objects.filter(
+            user=request.user, friends__id__in=ids
+        ).values_list('friends__id', flat=True))
+        if friend_ids != ids:
+            return Response({'error': 'You can only plan with your friends'}, status=status.HTTP_403_FORBIDDEN)
+
+        arrays = plan_to_watch_arrays([request.user.id, *ids])
+        common = intersect_sorted(list(arrays.values()))
+        anime = Anime.objects.filter(mal_id__in=common).prefetch_related('genres').order_by(
+            F('score').desc(nulls_last=True), 'id'
+        )[:limit]
+        serializer = AnimeSerializer(anime, many=True)
+        return Response({'count': len(common), 'results': serializer.data}, status=status.HTTP_200_OK)
@@ -10,6 +10,11 @@ const Chat = ({currentUserId}) => {
     const [messages, setMessages] = useState([]);
     const [newMessage, setNewMessage] = useState("");
     const socketRef = useRef(null);
+    // Every seq up to resumeSeqRef has been received, so a dropped socket resumes from there.
+    // Seqs can arrive out of order, so later ones are kept in seenSeqsRef until the gap fills.
+    const resumeSeqRef = useRef(0);
+    const seenSeqsRef = useRef(new Set());
+    const closingRef = useRef(false);
     const messageContainerRef = useRef(null);
     const [profileData, setProfileData] = useState({});
     const [loading, setLoading] = useState(true);
@@ -27,21 +32,52 @@ const Chat = ({currentUserId}) => {
         setOtherUserId(otherId);
 
         // Initialize data
+        closingRef.current = false;
+        resumeSeqRef.current = 0;
+        seenSeqsRef.current = new Set();
         fetchMessages();
         fetchProfileData(otherId);
         fetchProfileData(currentUserId);
         initializeWebSocket();
 
         return () => {
+            closingRef.current = true;
             if (socketRef.current) {
                 socketRef.current.close();
             }
         };
     }, [currentUserId, roomName]);
 
-    const initializeWebSocket = () => {
+    // Record a seq; returns false if it was already received
+    const noteSeq = (seq) => {
+        if (seq <= resumeSeqRef.current || seenSeqsRef.current.has(seq)) return false;
+        seenSeqsRef.current.add(seq);
+        advanceResumeSeq(resumeSeqRef.current);
+        return true;
+    };
+
+    // Move the resume point to at least `seq`, then past any seqs received after it
+    const advanceResumeSeq = (seq) => {
+        const seen = seenSeqsRef.current;
+        let next = Math.max(resumeSeqRef.current, seq);
+        while (seen.has(next + 1)) next += 1;
+        seen.forEach(received => received <= next && seen.delete(received));
+        resumeSeqRef.current = next;
+    };
+
+    // Messages from different senders can be numbered out of arrival order
+    const insertBySeq = (messages, message) => {
+        let index = messages.length;
+        while (index > 0 && messages[index - 1].seq > message.seq) index -= 1;
+        return [...messages.slice(0, index), message, ...messages.slice(index)];
+    };
+
+    const initializeWebSocket = (resumeFrom = null) => {
         const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${wsProtocol}//${window.location.host.split(':')[0]}:8000/ws/chat/${roomName}/`;
+        // Browsers can't set headers on a websocket handshake, so the API token goes in the query
+        const params = new URLSearchParams({token: localStorage.getItem('token') || ''});
+        if (resumeFrom !== null) params.set('resume_from', resumeFrom);
+        const wsUrl = `${wsProtocol}//${window.location.host.split(':')[0]}:8000/ws/chat/${roomName}/?${params}`;
 
         socketRef.current = new WebSocket(wsUrl);
 
@@ -53,15 +89,28 @@ const Chat = ({currentUserId}) => {
             const data = JSON.parse(event.data);
             console.log("Received message:", data);
 
+            if (data.type === 'resumed') {
+                // Everything up to data.seq has been replayed, including across settled gaps;
+                // seqs above it may still fill in, so later reconnects resume from there
+                advanceResumeSeq(data.seq);
+                // Too much was missed to replay; fall back to the history endpoint
+                if (!data.complete) fetchMessages();
+                return;
+            }
+            if (data.type) return;
+            // Replayed and live messages can overlap after a reconnect
+            if (!noteSeq(data.seq)) return;
+
             const newMsg = {
                 id: data.timestamp,
+                seq: data.seq,
                 sender: data.sender,
                 receiver: data.receiver,
                 content: data.message,
                 timestamp: data.timestamp
             };
 
-            setMessages(prevMessages => [...prevMessages, newMsg]);
+            setMessages(prevMessages => insertBySeq(prevMessages, newMsg));
             scrollToBottom();
         };
 
@@ -72,6 +121,9 @@ const Chat = ({currentUserId}) => {
 
         socketRef.current.onclose = () => {
             console.log("WebSocket connection closed");
+            if (!closingRef.current) {
+                setTimeout(() => initializeWebSocket(resumeSeqRef.current), 1000);
+            }
         };
     };
 
@@ -79,8 +131,14 @@ const Chat = ({currentUserId}) => {
         setLoading(true);
         try {
             const response = await api.get(`chat/messages/${roomName}/`);
-            if (Array.isArray(response.data)) {
-                setMessages(response.data);
+            const results = Array.isArray(response.data) ? response.data : response.data.results;
+            if (Array.isArray(results)) {
+                setMessages(results);
+                // Resume from just before the page; a gap in it may still fill in, and the
+                // next replay's 'resumed' frame moves past the ones that will not
+                const seqs = results.map(message => message.seq).filter(Boolean);
+                if (seqs.length) advanceResumeSeq(Math.min(...seqs) - 1);
+                seqs.forEach(noteSeq);
             } else {
                 console.error("Response is not an array:", response.data);
                 setError("Failed to load messages");